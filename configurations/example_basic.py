@@ -13,6 +13,15 @@ configuration = {
     "output_dir_date": True,  # OPTIONAL, default: True
     "webpage_generate": True,  # OPTIONAL, default: False
     "webpage_display": True,  # OPTIONAL, default : False
+    # Errors of all pairs of test cases, not only against references
+    "webpage_pairwise_errors": False,  # OPTIONAL, default: False
+    "cache_dir": "cache",  # OPTIONAL, default: cache
+    "cache_size": 10,  # OPTIONAL, default: 10 (gigabytes)
+    # Checkpoints of reference test cases (merged chunks)
+    "reference_checkpoint_dir": "reference_checkpoints",  # OPTIONAL
+    # Results are indexed in the database (True - results/lteval.sqlite)
+    # queried by ltevaldb.py
+    "results_database": False,  # OPTIONAL, default: False
 }
 
 # MANDATORY - List of scenes
@@ -24,6 +33,7 @@ renderers = {
         "type": "mitsuba_0_5",  # MANDATORY
         "path": "data/renderers/mitsuba_0_5/mitsuba.exe",  # MANDATORY
         "options": "",  # OPTIONAL
+        "templates": False,  # OPTIONAL, default: False (Mitsuba only)
     },
 }
 
@@ -50,6 +60,39 @@ test_cases = [
         "description": "Fast preview rendering",  # OPTIONAL
         "renderer": "mitsubaRenderer_0_5",  # MANDATORY
         "params": {"base": ["mitsubaLQ"]},  # OPTIONAL
+        # Equal-time mode - sample count is calibrated to fit the time budget
+        # "time_budget": 30,  # OPTIONAL, seconds
+        # Convergence mode - rendered with a ladder of sample counts (1, 2,
+        # 4, ... 64), errors of the steps are plotted in the webpage
+        # "convergence": {"max_samples": 64},  # OPTIONAL
+        # (optional keys: "min_samples", default: 1, "factor", default: 2)
+        # Reference mode - rendered by independent chunks with different
+        # seeds merged by their sample counts, merged chunks are kept
+        # in a checkpoint (reference_checkpoint_dir) and following runs
+        # only add missing chunks (e.g. after "chunks" is increased)
+        # "reference": {"chunks": 16, "chunk_samples": 1024},  # OPTIONAL
+        # (optional keys: "seed_parameter" - [element, name, type] if the
+        # renderer does not define it, "install" - complete reference
+        # replaces reference.exr of the scene if lteval.py is run
+        # with --install-references, default: False)
+        # Variance mode - rendered with several seeds, their per pixel mean
+        # and variance give variance, squared bias and efficiency
+        # (1 / (relMSE * time)) of a single rendering compared to reference
+        # "variance": {"seeds": 8},  # OPTIONAL
+        # (optional key: "seed_parameter" - as of the reference mode)
+        # Sweep - test cases generated from this one (as their template)
+        # by setting its parameters to values of the axes, test cases are
+        # created one by one while they are rendered
+        # "sweep": {  # OPTIONAL
+        #     "axes": [  # [element, parameter name, type, values]
+        #         ["integrator", "maxDepth", "integer", range(1, 33)],
+        #         ["sampler", "type", "", ["independent", "stratified"]],
+        #     ],
+        #     "mode": "product",  # OPTIONAL, "product" or "zip"
+        #     "name": "LQ_d{maxDepth}_{type}",  # OPTIONAL
+        # },
+        # (test cases are named <name>_<parameter><value>... by default,
+        # e.g. LQ_test_case_maxDepth1_typeindependent)
     },
     {
         "name": "HQ_test_case",
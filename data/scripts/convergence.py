@@ -0,0 +1,61 @@
+import pathlib
+
+import data.scripts.metrics as metrics
+
+
+class ConvergenceStep:
+    # Part of a job rendering a step of the ladder of the test case
+
+    def __init__(self, test_case):
+        self.test_case = test_case
+
+
+def sample_count_ladder(convergence: dict) -> list:
+    # Geometric sequence of sample counts from min_samples to max_samples
+    # (both included), each step multiplies the sample count by factor
+    min_samples = convergence.get("min_samples", 1)
+    max_samples = convergence["max_samples"]
+    factor = convergence.get("factor", 2)
+
+    sample_counts = []
+    sample_count = float(min_samples)
+    while round(sample_count) < max_samples:
+        if not sample_counts or round(sample_count) > sample_counts[-1]:
+            sample_counts.append(round(sample_count))
+        sample_count *= factor
+    sample_counts.append(max_samples)
+
+    return sample_counts
+
+
+def check_convergence(convergence) -> str:
+    # Returns description of the problem of an invalid specification
+    if not isinstance(convergence, dict) or "max_samples" not in convergence:
+        return 'must be a dictionary with "max_samples" at least'
+
+    min_samples = convergence.get("min_samples", 1)
+    max_samples = convergence["max_samples"]
+    factor = convergence.get("factor", 2)
+
+    if not (
+        isinstance(min_samples, int)
+        and isinstance(max_samples, int)
+        and 1 <= min_samples <= max_samples
+    ):
+        return (
+            "sample counts must be integers, 1 <= min_samples <= max_samples"
+        )
+    if not isinstance(factor, (int, float)) or factor <= 1:
+        return "factor must be a number greater than 1"
+
+    return None
+
+
+def image_errors(image_path: pathlib.Path, reference_path: pathlib.Path):
+    # Errors of the image compared to the reference image
+    # (mean squared error and relative mean squared error)
+    errors = metrics.compute_metrics(
+        *metrics.read_image_pair(image_path, reference_path),
+        ["l2", "relmse"],
+    )
+    return {"mse": errors["l2"], "relmse": errors["relmse"]}
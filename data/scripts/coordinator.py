@@ -0,0 +1,324 @@
+import collections
+import http.server
+import itertools
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from data.scripts.supervisor import ProcessUsage
+
+# Workers report every running job in this interval (seconds), jobs
+# of workers which did not report for LEASE_TIMEOUT are handed out again
+HEARTBEAT_INTERVAL = 5.0
+LEASE_TIMEOUT = 30.0
+# Job is failed if its workers stopped responding this many times
+MAX_ATTEMPTS = 3
+# Number of jobs handed out to workers at once (unless --jobs is given)
+DEFAULT_DISPATCHED_JOBS = 32
+
+
+def parse_address(address: str) -> tuple:
+    # "host:port" or just "port" (all interfaces)
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+
+class _RemoteJob:
+    # Job handed out to workers and its lease
+
+    def __init__(self, job_id: int, job):
+        self.id = job_id
+        self.job = job
+        self.worker = None
+        self.heartbeat_time = None
+        self.attempts = 0
+
+        # Report of the worker which finished the job
+        self.report = None
+        self.done = threading.Event()
+
+
+class Coordinator:
+    # Hands out scene x test case jobs to pull-based workers
+    # (ltevalworker.py) over HTTP and collects their results.
+    # Its render_batch replaces local rendering of the Scheduler - every
+    # scheduled job waits until a worker uploads its result image and
+    # report. Jobs are leased to workers, jobs of workers which stop
+    # sending heartbeats are handed out again.
+    # There is no authentication - use it on trusted networks only.
+
+    def __init__(self, address: str, cfg_path: pathlib.Path):
+        self.cfg_path = cfg_path
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._queue = collections.deque()
+        self._jobs = {}  # id -> _RemoteJob
+        self._finished = False
+
+        handler = type(
+            "_Handler", (_CoordinatorHandler,), {"coordinator": self}
+        )
+        try:
+            self._server = http.server.ThreadingHTTPServer(
+                parse_address(address), handler
+            )
+        except (OSError, ValueError) as e:
+            print(f'Coordinator could not listen at: "{address}" ({e})!')
+            exit(1)
+        self._server.daemon_threads = True
+
+        self._stop = threading.Event()
+        threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        ).start()
+        threading.Thread(target=self._monitor_leases, daemon=True).start()
+
+        host, port = self._server.server_address[:2]
+        self.url = f"http://{host}:{port}"
+        print(f"Coordinator is waiting for workers at: {self.url}")
+
+    def close(self):
+        # Workers asking for new jobs are told that the run is finished
+        # until the server is shut down
+        with self._lock:
+            self._finished = True
+        self._stop.set()
+        time.sleep(HEARTBEAT_INTERVAL / 5)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def render_batch(self, batch: list, render_local=None):
+        # Render callable of the Scheduler - jobs are rendered by workers,
+        # blocks until all jobs of the batch are finished
+        remote_jobs = []
+        with self._lock:
+            for job in batch:
+                remote_job = _RemoteJob(next(self._ids), job)
+                self._jobs[remote_job.id] = remote_job
+                self._queue.append(remote_job)
+                remote_jobs.append(remote_job)
+
+        for remote_job in remote_jobs:
+            remote_job.done.wait()
+            self._apply_report(remote_job)
+
+    def _apply_report(self, remote_job: _RemoteJob):
+        job = remote_job.job
+        report = remote_job.report
+
+        # Output of the worker becomes the output of the job (its log)
+        if report.get("log"):
+            print(report["log"], end="")
+
+        job.cached = report.get("cached", False)
+        if report.get("usage"):
+            job.usage = ProcessUsage.from_dict(report["usage"])
+        job.sample_count = report.get("sample_count", job.sample_count)
+
+        if report.get("error") is not None or not job.result_path.is_file():
+            job.error = RuntimeError(
+                f"Rendering of {job} by worker: "
+                f'"{report.get("worker")}" failed: {report.get("error")}'
+            )
+            return
+
+        # Results are post-processed by the Scheduler of the coordinator
+        print(f'Rendered by worker: "{report["worker"]}".\n')
+
+    def _monitor_leases(self):
+        while not self._stop.wait(1.0):
+            now = time.monotonic()
+            with self._lock:
+                for remote_job in list(self._jobs.values()):
+                    if (
+                        remote_job.worker is None
+                        or now - remote_job.heartbeat_time < LEASE_TIMEOUT
+                    ):
+                        continue
+
+                    print(
+                        f'Worker: "{remote_job.worker}" stopped responding, '
+                        f"rendering of {remote_job.job} is handed out again."
+                    )
+                    lost_worker = remote_job.worker
+                    remote_job.worker = None
+
+                    if remote_job.attempts >= MAX_ATTEMPTS:
+                        self._finish(
+                            remote_job,
+                            {
+                                "worker": lost_worker,
+                                "error": f"{MAX_ATTEMPTS} workers "
+                                f"stopped responding",
+                            },
+                        )
+                        continue
+
+                    # Requeued jobs go first - they waited the longest
+                    self._queue.appendleft(remote_job)
+
+    def _finish(self, remote_job: _RemoteJob, report: dict):
+        # Called with the lock held
+        del self._jobs[remote_job.id]
+        remote_job.report = report
+        remote_job.done.set()
+
+    def _leased_job(self, job_id: int, worker: str) -> _RemoteJob:
+        # Job leased to the worker, None if the lease was lost
+        remote_job = self._jobs.get(job_id)
+        if remote_job is None or remote_job.worker != worker:
+            return None
+        return remote_job
+
+    def claim(self, worker: str) -> tuple:
+        # Returns HTTP status and the claimed job
+        with self._lock:
+            if self._queue:
+                remote_job = self._queue.popleft()
+                remote_job.worker = worker
+                remote_job.heartbeat_time = time.monotonic()
+                remote_job.attempts += 1
+
+                # Worker creates the job from its definition
+                job = remote_job.job
+                return 200, {
+                    "id": remote_job.id,
+                    "scene": job.scene.name,
+                    "case": job.test_case.name,
+                    "renderer": job.test_case.renderer,
+                    "params": job.test_case.parameter_set.parameters,
+                    "time_budget": job.test_case.time_budget,
+                    "sample_count": job.sample_count,
+                }
+
+            # Gone - all jobs are done, no content - wait for more jobs
+            return (410 if self._finished else 204), None
+
+    def heartbeat(self, job_id: int, worker: str) -> int:
+        with self._lock:
+            remote_job = self._leased_job(job_id, worker)
+            if remote_job is None:
+                return 409
+
+            remote_job.heartbeat_time = time.monotonic()
+            return 200
+
+    def store_result(self, job_id: int, worker: str, rfile, length: int):
+        with self._lock:
+            remote_job = self._leased_job(job_id, worker)
+        if remote_job is None:
+            return 409
+
+        # Result is written into a temporary file first so that a failed
+        # upload never leaves a partial image in the output directory
+        result_path = remote_job.job.result_path
+        try:
+            fd, tmp_path_str = tempfile.mkstemp(
+                suffix=".tmp", dir=str(result_path.parent)
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    while length > 0:
+                        chunk = rfile.read(min(length, 1 << 20))
+                        if not chunk:
+                            raise ConnectionError("Upload was interrupted.")
+                        f.write(chunk)
+                        length -= len(chunk)
+                os.replace(tmp_path_str, result_path)
+            except Exception:
+                os.unlink(tmp_path_str)
+                raise
+        except OSError as e:
+            print(f"Result of {remote_job.job} could not be stored: {e}")
+            return 500
+
+        return 200
+
+    def finish(self, job_id: int, report: dict) -> int:
+        with self._lock:
+            remote_job = self._leased_job(job_id, report.get("worker"))
+            if remote_job is None:
+                return 409
+
+            self._finish(remote_job, report)
+            return 200
+
+
+class _CoordinatorHandler(http.server.BaseHTTPRequestHandler):
+    # GET  /cfg                      - configuration file of the run
+    # POST /claim                    - {"worker"} -> {"id", "scene", "case",
+    #                                  "renderer", "params", "time_budget",
+    #                                  "sample_count"}
+    # POST /jobs/<id>/heartbeat      - {"worker"}
+    # PUT  /jobs/<id>/result?worker= - result image
+    # POST /jobs/<id>/finish         - report of the worker
+    coordinator = None
+
+    def do_GET(self):
+        if self.path != "/cfg":
+            return self._respond(404)
+
+        self._respond(200, self.coordinator.cfg_path.read_bytes())
+
+    def do_POST(self):
+        path = self.path.strip("/").split("/")
+        data = json.loads(
+            self.rfile.read(int(self.headers.get("Content-Length", 0))) or "{}"
+        )
+
+        if path == ["claim"]:
+            status, claim = self.coordinator.claim(data["worker"])
+            return self._respond(
+                status, json.dumps(claim).encode() if claim else None
+            )
+
+        if len(path) == 3 and path[0] == "jobs" and path[1].isdigit():
+            if path[2] == "heartbeat":
+                return self._respond(
+                    self.coordinator.heartbeat(int(path[1]), data["worker"])
+                )
+            if path[2] == "finish":
+                return self._respond(
+                    self.coordinator.finish(int(path[1]), data)
+                )
+
+        self._respond(404)
+
+    def do_PUT(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.strip("/").split("/")
+        worker = urllib.parse.parse_qs(url.query).get("worker", [""])[0]
+
+        if not (
+            len(path) == 3
+            and path[0] == "jobs"
+            and path[1].isdigit()
+            and path[2] == "result"
+        ):
+            return self._respond(404)
+
+        self._respond(
+            self.coordinator.store_result(
+                int(path[1]),
+                worker,
+                self.rfile,
+                int(self.headers.get("Content-Length", 0)),
+            )
+        )
+
+    def _respond(self, status: int, body: bytes = None):
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Requests are not logged
+        pass
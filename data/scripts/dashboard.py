@@ -0,0 +1,261 @@
+import functools
+import http.server
+import json
+import os
+import pathlib
+import queue
+import re
+import threading
+import time
+import urllib.parse
+import webbrowser
+
+import data.scripts.metrics as metrics
+from data.scripts.webdisplay import CachingHTTPRequestHandler
+
+# Open event streams are kept alive by comments sent in this interval
+_KEEPALIVE_INTERVAL = 15.0
+
+# Progress bars of renderers, e.g. "Rendering: [+++++     ] (1.2s|3.4s)"
+_PROGRESS_RE = re.compile(r"\[(\+*)( *)\]")
+
+
+def parse_progress(text: str) -> float:
+    # Progress (0 - 1) of the last progress bar in the output of a renderer,
+    # None if there is none
+    matches = _PROGRESS_RE.findall(text)
+    if not matches:
+        return None
+
+    done, remaining = matches[-1]
+    length = len(done) + len(remaining)
+    return len(done) / length if length else None
+
+
+class Dashboard:
+    # Live state of the run served over HTTP while the jobs are rendered.
+    # The page (ltevaldashboard.html) receives states of queued, running,
+    # done and failed jobs via Server-Sent Events (/events), finished
+    # images are shown by the JERI viewer (files of the output directory
+    # are served as well). Jobs are reported by the Scheduler.
+
+    def __init__(self, output_dir_path: pathlib.Path, port: int = 8000):
+        self.output_dir_path = output_dir_path
+
+        self._lock = threading.Lock()
+        self._jobs = {}  # job id -> state of the job
+        self._subscribers = []  # queues of encoded events
+        self._run = {"started": time.time(), "finished": None, "webpage": None}
+
+        handler = type("_Handler", (_DashboardHandler,), {"dashboard": self})
+        try:
+            self._server = http.server.ThreadingHTTPServer(
+                ("localhost", port),
+                functools.partial(handler, directory=str(output_dir_path)),
+            )
+        except OSError as e:
+            print(f"Dashboard could not listen at port: {port} ({e})!")
+            exit(1)
+        self._server.daemon_threads = True
+
+        threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        ).start()
+
+        self.url = f"http://localhost:{self._server.server_address[1]}/"
+        print(f"Live results of the run are at: {self.url}")
+        webbrowser.open(self.url)
+
+    def close(self):
+        with self._lock:
+            for events in self._subscribers:
+                events.put(None)
+            self._subscribers = []
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        # Blocks until the server is stopped (e.g. by Ctrl+C)
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+
+    def jobs_queued(self, jobs: list):
+        for job in jobs:
+            self._update(job, state="queued", queued=time.time())
+
+    def job_skipped(self, job, reference_path: pathlib.Path = None):
+        # Done by the resumed run
+        self._update(
+            job,
+            state="done",
+            skipped=True,
+            progress=1.0,
+            **self._results(job, reference_path),
+        )
+
+    def job_started(self, job):
+        self._update(job, state="running", started=time.time(), progress=0.0)
+
+    def job_output(self, jobs: list, text: str):
+        # Output of the renderer of the jobs (of a batch)
+        progress = parse_progress(text)
+        if progress is None:
+            return
+
+        for job in jobs:
+            with self._lock:
+                state = self._jobs.get(_job_id(job))
+                # Only changes by at least one percent are sent
+                changed = (
+                    state is not None
+                    and abs(progress - (state["progress"] or 0)) >= 0.01
+                )
+            if changed:
+                self._update(job, progress=progress)
+
+    def job_finished(self, job, reference_path: pathlib.Path = None):
+        self._update(
+            job,
+            state="done" if job.error is None else "failed",
+            finished=time.time(),
+            progress=1.0 if job.error is None else None,
+            wall_time=job.wall_time,
+            cached=job.cached,
+            error=None if job.error is None else str(job.error),
+            **(self._results(job, reference_path) if not job.error else {}),
+        )
+
+    def run_finished(self, webpage_path: pathlib.Path = None):
+        with self._lock:
+            self._run["finished"] = time.time()
+            if webpage_path is not None and webpage_path.is_file():
+                self._run["webpage"] = self._url(webpage_path)
+            self._publish("run", self._run)
+
+    def _update(self, job, **values):
+        with self._lock:
+            job_id = _job_id(job)
+            state = self._jobs.setdefault(
+                job_id,
+                {
+                    "id": job_id,
+                    "scene": job.scene.name,
+                    "case": job.test_case.name,
+                    "progress": None,
+                },
+            )
+            state.update(values)
+            self._publish("job", state)
+
+    def _results(self, job, reference_path: pathlib.Path = None) -> dict:
+        # Result image, its reference and error metrics (once they exist)
+        results = {
+            "image": self._url(job.result_path),
+            "reference": self._url(reference_path),
+            "metrics": job.errors,
+        }
+        if job.result_path.is_file():
+            results["metrics"] = (
+                metrics.load_metrics(job.result_path) or job.errors
+            )
+        return results
+
+    def _url(self, file_path: pathlib.Path) -> str:
+        # URL of the file relative to the output directory versioned
+        # by its size and modification time (as URLs of the webpage)
+        if file_path is None or not file_path.is_file():
+            return None
+
+        url = urllib.parse.quote(
+            pathlib.Path(
+                os.path.relpath(file_path, self.output_dir_path)
+            ).as_posix()
+        )
+        stat = file_path.stat()
+        return (
+            f"{url}?v={stat.st_size:x}-{stat.st_mtime_ns:x}{file_path.suffix}"
+        )
+
+    def _publish(self, event: str, data: dict):
+        # Called with the lock held
+        encoded = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        for events in self._subscribers:
+            events.put(encoded)
+
+    def subscribe(self) -> queue.Queue:
+        # Queue of events starting with the snapshot of the whole run
+        events = queue.Queue()
+        with self._lock:
+            snapshot = {"run": self._run, "jobs": list(self._jobs.values())}
+            events.put(
+                f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n".encode()
+            )
+            self._subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events: queue.Queue):
+        with self._lock:
+            if events in self._subscribers:
+                self._subscribers.remove(events)
+
+
+class _DashboardHandler(CachingHTTPRequestHandler):
+    # Dashboard page, its event stream, JERI files and files
+    # of the output directory (result images, generated webpage)
+    dashboard = None
+
+    _data_dir_path = pathlib.Path(__file__).parent.parent
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == "/events":
+            self._send_events()
+            return
+        super().do_GET()
+
+    def translate_path(self, path: str) -> str:
+        url_path = urllib.parse.unquote(urllib.parse.urlsplit(path).path)
+        if url_path == "/":
+            return str(self._data_dir_path / "web" / "ltevaldashboard.html")
+        if url_path.startswith("/jeri/"):
+            return str(
+                self._data_dir_path
+                / "jeri"
+                / pathlib.PurePosixPath(url_path).name
+            )
+        return super().translate_path(path)
+
+    def _send_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        events = self.dashboard.subscribe()
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    event = b": keepalive\n\n"
+                if event is None:
+                    break
+                self.wfile.write(event)
+                self.wfile.flush()
+        except OSError:
+            # Closed by the browser
+            pass
+        finally:
+            self.dashboard.unsubscribe(events)
+
+    def log_message(self, format, *args):
+        # Requests of the browser would mix with the output of the run
+        pass
+
+
+def _job_id(job) -> str:
+    return f"{job.scene.name}/{job.test_case.name}"
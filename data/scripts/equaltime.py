@@ -0,0 +1,116 @@
+import math
+import pathlib
+import tempfile
+import time
+
+from data.scripts.scene import Scene
+from data.scripts.tcase import TestCase
+
+# Rendering time is modelled as a fixed cost (e.g. scene loading) plus
+# cost per sample. Calibration renderings start with one sample and grow
+# until the cost of samples is measurable - a fraction of the time budget.
+_CALIBRATION_GROWTH = 4
+_CALIBRATION_STEPS = 8
+_CALIBRATION_BUDGET_FRACTION = 0.05
+
+
+def with_sample_count(
+    renderer, test_case: TestCase, sample_count: int, name: str = None
+) -> TestCase:
+    # Test case with its sample count set to the given value
+    element, param_name, param_type = renderer.sample_count_parameter
+    return test_case.derive(
+        name if name is not None else test_case.name,
+        {element: [[param_name, param_type, sample_count]]},
+    )
+
+
+def sample_count(renderer, test_case: TestCase) -> int:
+    # Sample count set by the test case, None if it is not known
+    if renderer.sample_count_parameter is None:
+        return None
+
+    element, param_name, _ = renderer.sample_count_parameter
+    for param in test_case.parameter_set.parameters.get(element, []):
+        if param[0] == param_name and isinstance(param[2], int):
+            return param[2]
+    return None
+
+
+def calibrate_sample_count(renderer, scene: Scene, test_case: TestCase) -> int:
+    # Sample count which renders the scene within the time budget
+    # of the test case, estimated from short calibration renderings
+    if renderer.sample_count_parameter is None:
+        raise RuntimeError(
+            f'Renderer of test case: "{test_case.name}" does not support '
+            f"equal-time rendering (time budget)."
+        )
+
+    sample_counts = []
+    times = []
+    with tempfile.TemporaryDirectory(prefix="lteval-calib-") as tmp_dir:
+        sample_count = 1
+        for _ in range(_CALIBRATION_STEPS):
+            sample_counts.append(sample_count)
+            times.append(
+                _render_calibration(
+                    renderer,
+                    scene,
+                    with_sample_count(
+                        renderer,
+                        test_case,
+                        sample_count,
+                        f"{test_case.name}__calib_{sample_count}",
+                    ),
+                    pathlib.Path(tmp_dir),
+                )
+            )
+
+            if times[-1] - times[0] >= (
+                _CALIBRATION_BUDGET_FRACTION * test_case.time_budget
+            ):
+                break
+            sample_count *= _CALIBRATION_GROWTH
+        else:
+            raise RuntimeError(
+                f'Rendering time of test case: "{test_case.name}" does not '
+                f"depend on its sample count, it can not be calibrated."
+            )
+
+    # Linear fit through the first and the last calibration point
+    time_per_sample = (times[-1] - times[0]) / (
+        sample_counts[-1] - sample_counts[0]
+    )
+    fixed_time = max(times[0] - time_per_sample * sample_counts[0], 0.0)
+
+    sample_count = max(
+        1,
+        math.floor((test_case.time_budget - fixed_time) / time_per_sample),
+    )
+
+    print(
+        f'Calibration of test case: "{test_case.name}": '
+        f"{fixed_time:.2f} s + {time_per_sample:.4f} s per sample, "
+        f"{sample_count} samples fit the time budget "
+        f"of {test_case.time_budget} s.\n"
+    )
+
+    return sample_count
+
+
+def _render_calibration(
+    renderer,
+    scene: Scene,
+    test_case: TestCase,
+    output_dir_path: pathlib.Path,
+) -> float:
+    try:
+        renderer.prepare_scene_case(scene, test_case)
+        start_time = time.perf_counter()
+        usage = renderer.render_scene_case(scene, test_case, output_dir_path)
+    finally:
+        renderer.clear_scene_case(scene, test_case)
+        renderer.release_scene_case(scene, test_case)
+
+    # Time of the renderer process is preferred if it is known
+    return usage.wall_time if usage else time.perf_counter() - start_time
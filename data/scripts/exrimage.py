@@ -0,0 +1,175 @@
+# Reading and writing of EXR images as numpy arrays.
+# numpy and OpenEXR are optional dependencies - they are imported only
+# when images are really evaluated (not for plain rendering).
+
+
+def is_available() -> bool:
+    try:
+        import numpy
+        import OpenEXR
+        import Imath
+    except ImportError:
+        return False
+
+    return True
+
+
+def read_exr(file_path):
+    # Returns image as float32 array of shape (height, width, channels).
+    # RGB channels are read if present, otherwise all channels of the image.
+    import numpy
+    import OpenEXR
+    import Imath
+
+    exr_file = OpenEXR.InputFile(str(file_path))
+    try:
+        header = exr_file.header()
+        data_window = header["dataWindow"]
+        width = data_window.max.x - data_window.min.x + 1
+        height = data_window.max.y - data_window.min.y + 1
+
+        channels = [c for c in ("R", "G", "B") if c in header["channels"]]
+        if not channels:
+            channels = sorted(header["channels"])
+
+        pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+        return numpy.stack(
+            [
+                numpy.frombuffer(
+                    exr_file.channel(channel, pixel_type), dtype=numpy.float32
+                ).reshape(height, width)
+                for channel in channels
+            ],
+            axis=-1,
+        )
+    finally:
+        exr_file.close()
+
+
+def write_exr(file_path, image, half: bool = True):
+    # Writes array of shape (height, width, channels) as RGB image
+    # (or Y image with a single channel) of half or single precision floats
+    import numpy
+    import OpenEXR
+    import Imath
+
+    height, width, channel_count = image.shape
+    channels = "Y" if channel_count == 1 else "RGB"[:channel_count]
+    pixel_type = Imath.PixelType(
+        Imath.PixelType.HALF if half else Imath.PixelType.FLOAT
+    )
+    dtype = numpy.float16 if half else numpy.float32
+    if half:
+        # Values out of the range of half floats would become infinities
+        image = numpy.clip(image, -65504, 65504)
+
+    header = OpenEXR.Header(width, height)
+    header["channels"] = {c: Imath.Channel(pixel_type) for c in channels}
+    header["compression"] = Imath.Compression(
+        Imath.Compression.ZIP_COMPRESSION
+    )
+
+    exr_file = OpenEXR.OutputFile(str(file_path), header)
+    try:
+        exr_file.writePixels(
+            {
+                channel: numpy.ascontiguousarray(
+                    image[..., index], dtype=dtype
+                ).tobytes()
+                for index, channel in enumerate(channels)
+            }
+        )
+    finally:
+        exr_file.close()
+
+
+def read_exr_rows(file_path, row_count: int):
+    # Yields the image in blocks of rows as float32 arrays of shape
+    # (rows, width, channels), channels are selected as by read_exr.
+    # Only one block is kept in memory.
+    import numpy
+    import OpenEXR
+    import Imath
+
+    exr_file = OpenEXR.InputFile(str(file_path))
+    try:
+        header = exr_file.header()
+        data_window = header["dataWindow"]
+        width = data_window.max.x - data_window.min.x + 1
+
+        channels = [c for c in ("R", "G", "B") if c in header["channels"]]
+        if not channels:
+            channels = sorted(header["channels"])
+
+        pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+        for first_row in range(
+            data_window.min.y, data_window.max.y + 1, row_count
+        ):
+            last_row = min(first_row + row_count, data_window.max.y + 1) - 1
+            yield numpy.stack(
+                [
+                    numpy.frombuffer(
+                        exr_file.channel(
+                            channel, pixel_type, first_row, last_row
+                        ),
+                        dtype=numpy.float32,
+                    ).reshape(last_row - first_row + 1, width)
+                    for channel in channels
+                ],
+                axis=-1,
+            )
+    finally:
+        exr_file.close()
+
+
+def read_exr_size(file_path) -> tuple:
+    # Width and height of the image
+    import OpenEXR
+
+    exr_file = OpenEXR.InputFile(str(file_path))
+    try:
+        data_window = exr_file.header()["dataWindow"]
+        return (
+            data_window.max.x - data_window.min.x + 1,
+            data_window.max.y - data_window.min.y + 1,
+        )
+    finally:
+        exr_file.close()
+
+
+def write_exr_rows(file_path, width: int, height: int, blocks):
+    # Writes blocks of rows (arrays of shape (rows, width, channels))
+    # one after another as single precision float RGB (or Y) image
+    import numpy
+    import OpenEXR
+    import Imath
+
+    exr_file = None
+    try:
+        for block in blocks:
+            channels = (
+                "Y" if block.shape[-1] == 1 else "RGB"[: block.shape[-1]]
+            )
+            if exr_file is None:
+                pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+                header = OpenEXR.Header(width, height)
+                header["channels"] = {
+                    c: Imath.Channel(pixel_type) for c in channels
+                }
+                header["compression"] = Imath.Compression(
+                    Imath.Compression.ZIP_COMPRESSION
+                )
+                exr_file = OpenEXR.OutputFile(str(file_path), header)
+
+            exr_file.writePixels(
+                {
+                    channel: numpy.ascontiguousarray(
+                        block[..., index], dtype=numpy.float32
+                    ).tobytes()
+                    for index, channel in enumerate(channels)
+                },
+                block.shape[0],
+            )
+    finally:
+        if exr_file is not None:
+            exr_file.close()
@@ -1,6 +1,7 @@
 import inspect
 import sys
-import importlib
+import importlib.machinery
+import importlib.util
 
 from data.scripts.renderers.abstractrenderer import AbstractRenderer
 
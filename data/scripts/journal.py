@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from datetime import datetime
+
+
+class Journal:
+    # Append-only record of scene x test case jobs of one output directory.
+    # Each line is a JSON object with scene and test case names, state of
+    # the job (started/done/failed) and a digest of the test case definition.
+    # Jobs which are done (with an unchanged definition) are skipped
+    # when the run is resumed.
+
+    def __init__(self, file_path: pathlib.Path, append: bool = False):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._done = {}  # (scene name, test case name) -> digest
+
+        # Only resumed runs continue the journal of the previous run,
+        # others (reusing the output directory) start a new one
+        if append and self.file_path.exists():
+            self._load()
+
+        # One line buffered file, lines are flushed to the disk immediately
+        self._file = self.file_path.open("a" if append else "w", buffering=1)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def is_done(self, job) -> bool:
+        # Every job is checked once (before it is started), only jobs
+        # of the resumed run which were not checked yet are kept
+        key = (job.scene.name, job.test_case.name)
+        return (
+            self._done.pop(key, None) == self._digest(job)
+            and job.result_path.is_file()
+        )
+
+    def record(self, job, state: str):
+        entry = {
+            "scene": job.scene.name,
+            "case": job.test_case.name,
+            "state": state,
+            "digest": self._digest(job),
+            "time": datetime.now().isoformat(timespec="seconds"),
+        }
+
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _load(self):
+        with self.file_path.open("r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Partially written line (e.g. after a power cut)
+                    continue
+                self._apply(entry)
+
+    def _apply(self, entry: dict):
+        key = (entry["scene"], entry["case"])
+        if entry["state"] == "done":
+            self._done[key] = entry["digest"]
+        else:
+            self._done.pop(key, None)
+
+    def _digest(self, job) -> str:
+        # Changed test case definition means that the job has to be redone
+        definition = [
+            job.test_case.renderer,
+            job.test_case.parameter_set.parameters,
+        ]
+        if job.test_case.time_budget is not None:
+            definition.append(job.test_case.time_budget)
+
+        return hashlib.sha256(
+            json.dumps(
+                definition,
+                sort_keys=True,
+                default=str,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def __del__(self):
+        self.close()
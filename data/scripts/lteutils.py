@@ -1,23 +1,50 @@
 import argparse
+import contextlib
+import contextvars
+import hashlib
+import json
 import pathlib
-import shutil
 import sys
+import threading
 from datetime import datetime
 
 import data.scripts.outputconst as out
+import data.scripts.exrimage as exrimage
 import data.scripts.futils as futils
+import data.scripts.refbuild as refbuild
+import data.scripts.tcase as tcase
+from data.scripts.dashboard import Dashboard
+from data.scripts.journal import Journal
+from data.scripts.references import ReferenceStore
+from data.scripts.rendercache import RenderCache
+from data.scripts.resultsdb import ResultsDatabase
 from data.scripts.scene import load_scenes_from_directory
+from data.scripts.scratch import ScratchDirectory
+from data.scripts.scheduler import (
+    SceneCaseJob,
+    Scheduler,
+    convergence_jobs,
+    reference_chunk_jobs,
+    variance_jobs,
+)
+from data.scripts.usagelog import UsageLog
 
 
 class Logger(object):
     # Redirecting of print() into both stdout and logging file
 
-    def __init__(self, file_path: pathlib.Path):
+    def __init__(self, file_path: pathlib.Path, append: bool = False):
         # One line buffered file
-        self.file = file_path.open("w", buffering=1)
+        self.file = file_path.open("a" if append else "w", buffering=1)
         self.stdout = sys.stdout
         sys.stdout = self
 
+        # Output of scheduled jobs (threads or asyncio tasks - by their
+        # context) can be redirected into their own files, writes into
+        # shared outputs are serialized.
+        self._lock = threading.Lock()
+        self._output = contextvars.ContextVar("output", default=None)
+
     def close(self):
         if self.stdout is not None:
             sys.stdout = self.stdout
@@ -26,23 +53,118 @@ class Logger(object):
             self.file.close()
             self.file = None
 
+    @contextlib.contextmanager
+    def redirect_thread(
+        self, file_paths: list, echo: bool = False, listener=None
+    ):
+        # Output of the current thread (or task and threads it runs code
+        # in with its context) is written into its own files and, if echo
+        # is set, into the shared outputs as well.
+        # Listener (if any) is called with every written text.
+        with contextlib.ExitStack() as stack:
+            token = self._output.set(
+                _ThreadOutput(
+                    self,
+                    [
+                        stack.enter_context(file_path.open("w"))
+                        for file_path in file_paths
+                    ],
+                    echo,
+                    listener,
+                )
+            )
+            try:
+                yield
+            finally:
+                self._output.reset(token)
+
+    def thread_output(self):
+        # Output of the current thread, it can be written from other threads
+        # (e.g. by the supervisor of renderer processes)
+        return self._output.get() or self
+
     def write(self, data):
-        self.file.write(data)
-        self.stdout.write(data)
+        thread_output = self._output.get()
+        if thread_output:
+            thread_output.write(data)
+            return
+
+        self._write_shared(data)
 
     def flush(self):
-        self.file.flush()
-        self.stdout.flush()
+        thread_output = self._output.get()
+        if thread_output:
+            thread_output.flush()
+            return
+
+        self._flush_shared()
+
+    def _write_shared(self, data):
+        with self._lock:
+            self.file.write(data)
+            self.stdout.write(data)
+
+    def _flush_shared(self):
+        with self._lock:
+            self.file.flush()
+            self.stdout.flush()
 
     def __del__(self):
         self.close()
 
 
+class _ThreadOutput:
+    # Redirected output of a single thread of the Logger
+
+    def __init__(self, logger: Logger, files: list, echo: bool, listener=None):
+        self.logger = logger
+        self.files = files
+        self.echo = echo
+        self.listener = listener
+
+    def write(self, data):
+        for file in self.files:
+            file.write(data)
+        if self.echo:
+            self.logger._write_shared(data)
+        if self.listener is not None:
+            self.listener(data)
+
+    def flush(self):
+        for file in self.files:
+            file.flush()
+        if self.echo:
+            self.logger._flush_shared()
+
+
 def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser("Light transport evaluation framework.")
 
     parser.add_argument(
-        "cfg", type=str, default="", help="Evaluation configuration file."
+        "cfg",
+        type=str,
+        nargs="?",
+        default="",
+        help=(
+            "Evaluation configuration file. "
+            "Can be omitted when a run is resumed, configuration file "
+            "of the resumed output directory is used then."
+        ),
+    )
+
+    parser.add_argument(
+        "-r",
+        "--r",
+        "--resume",
+        dest="resume",
+        type=str,
+        default="",
+        help=(
+            "Resume - output directory of a previous (interrupted or failed) "
+            "run which should be completed. Jobs recorded as done in its "
+            "journal are skipped, only missing or failed scenes "
+            "and test cases are rendered."
+        ),
     )
 
     parser.add_argument(
@@ -84,14 +206,158 @@ def create_parser() -> argparse.ArgumentParser:
         help="(default) End on failure - whenever execution of the evaluation "
         "script should be stopped if rendering of the scene fails.",
     )
-    eof_parser.add_argument("--no-eof", dest="cache", action="store_false")
+    eof_parser.add_argument("--no-eof", dest="eof", action="store_false")
     parser.set_defaults(eof=True)
 
+    parser.add_argument(
+        "-s",
+        "--s",
+        "--scratch",
+        dest="scratch",
+        type=str,
+        default="",
+        help=(
+            "Scratch - directory in which a per-run scratch directory "
+            "for generated scene files and unfinished result images "
+            "is created (default: system temporary directory). "
+            "A directory on a fast file system (e.g. tmpfs - /dev/shm) "
+            "makes the temporary I/O cheap."
+        ),
+    )
+
+    parser.add_argument(
+        "-nc",
+        "--nc",
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help=(
+            "No cache - render all scenes and test cases even if "
+            "their results are available in the render cache. "
+            "Results of the rendering are not stored in the cache either."
+        ),
+    )
+
+    parser.add_argument(
+        "-b",
+        "--b",
+        "--batch",
+        dest="batch",
+        action="store_true",
+        help=(
+            "Batch - all test cases of a scene rendered by the same "
+            "renderer are rendered by a single renderer process "
+            "(if the renderer supports it). Saves process startup "
+            "and initialization of the renderer for every test case."
+        ),
+    )
+
+    parser.add_argument(
+        "-j",
+        "--j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=None,
+        help=(
+            "Jobs - number of scene and test case combinations "
+            "rendered at the same time (default 1, with distributed "
+            "rendering number of jobs handed out to workers at once, "
+            "default 32). "
+            "Output of each rendering is saved into its own log file "
+            "in the logs directory of the output directory. "
+            "Consider limiting the number of threads used by each renderer "
+            "(e.g. via renderer options) when running multiple jobs."
+        ),
+    )
+
+    parser.add_argument(
+        "-l",
+        "--l",
+        "--live",
+        dest="live",
+        type=int,
+        nargs="?",
+        const=8000,
+        default=None,
+        help=(
+            "Live - dashboard with queued, running, done and failed jobs "
+            "and finished images is served at the given port "
+            "(default 8000) while the run is in progress. "
+            "With webpage_display set, the generated webpage is served "
+            "by it when the run is finished."
+        ),
+    )
+
+    parser.add_argument(
+        "-d",
+        "--d",
+        "--distribute",
+        dest="distribute",
+        type=str,
+        default="",
+        help=(
+            "Distribute - HOST:PORT at which the scenes and test cases "
+            "are handed out to workers (ltevalworker.py) which render them, "
+            "e.g. 0.0.0.0:8765. Workers need the same scenes "
+            "and renderers. Results and logs are collected "
+            "into the output directory. Intended for trusted networks only."
+        ),
+    )
+
+    parser.add_argument(
+        "-ir",
+        "--ir",
+        "--install-references",
+        dest="install_references",
+        action="store_true",
+        help=(
+            "Install references - complete references of test cases "
+            'with "install" in their reference mode replace reference.exr '
+            "files in the scenes directory. Without it they are only "
+            "results of their test cases."
+        ),
+    )
+
     return parser
 
 
-def create_logger(output_dir_path: pathlib.Path) -> Logger:
-    return Logger(output_dir_path / out.log_file)
+def create_logger(
+    output_dir_path: pathlib.Path, append: bool = False
+) -> Logger:
+    return Logger(output_dir_path / out.log_file, append)
+
+
+def create_journal(
+    output_dir_path: pathlib.Path, append: bool = False
+) -> Journal:
+    return Journal(output_dir_path / out.journal_file, append)
+
+
+def create_usage_log(
+    output_dir_path: pathlib.Path, append: bool = False
+) -> UsageLog:
+    return UsageLog(output_dir_path / out.metrics_file, append)
+
+
+def create_reference_store(output_dir_path: pathlib.Path) -> ReferenceStore:
+    return ReferenceStore(output_dir_path)
+
+
+def create_dashboard(output_dir_path: pathlib.Path, port: int) -> Dashboard:
+    return Dashboard(output_dir_path, port)
+
+
+def get_resumed_output_dir(resume_dir: str) -> pathlib.Path:
+    output_dir_path = pathlib.Path(resume_dir).resolve()
+    if not output_dir_path.is_dir():
+        print(
+            f'Resumed output directory "{output_dir_path}" '
+            f"is not a directory or does not exist!"
+        )
+        exit(1)
+
+    return output_dir_path
 
 
 def load_configuration_module(cfg_path: pathlib.Path):
@@ -134,6 +400,96 @@ def create_output_dir(cfg_mod, cfg_path: pathlib.Path) -> pathlib.Path:
     return output_dir_path
 
 
+def create_render_cache(cfg_mod) -> RenderCache:
+    cfg_config = cfg_mod.configuration
+
+    # Cache directory is relative to the lteval directory,
+    # its maximum size is specified in gigabytes.
+    lteval_dir_path = pathlib.Path(__file__).parents[2]
+    cache_dir_path = lteval_dir_path / cfg_config.get("cache_dir", "cache")
+    cache_size = int(cfg_config.get("cache_size", 10) * 1024**3)
+
+    return RenderCache(cache_dir_path, cache_size)
+
+
+def get_checkpoint_dir(cfg_mod) -> pathlib.Path:
+    # Checkpoints of reference test cases are kept between runs
+    # in the directory relative to the lteval directory
+    lteval_dir_path = pathlib.Path(__file__).parents[2]
+    return (
+        lteval_dir_path
+        / cfg_mod.configuration.get(
+            "reference_checkpoint_dir", "reference_checkpoints"
+        )
+    ).resolve()
+
+
+def create_results_database(db_path_str: str = "") -> ResultsDatabase:
+    # Database file is relative to the lteval directory
+    lteval_dir_path = pathlib.Path(__file__).parents[2]
+    db_path = lteval_dir_path / (db_path_str or "results/lteval.sqlite")
+
+    return ResultsDatabase(db_path.resolve())
+
+
+def ingest_results(cfg_mod, output_dir_path: pathlib.Path):
+    # Output directory is indexed in the results database
+    # if the configuration specifies it
+    db_path_str = cfg_mod.configuration.get("results_database")
+    if not db_path_str:
+        return
+
+    results_db = create_results_database(
+        db_path_str if isinstance(db_path_str, str) else ""
+    )
+    try:
+        results_db.ingest(output_dir_path)
+    finally:
+        results_db.close()
+
+
+def write_renderers_file(renderers: dict, output_dir_path: pathlib.Path):
+    # Executables of renderers used by the run (their versions are
+    # digests of the executables) for the results database
+    renderers_data = {}
+    for r_name, renderer in renderers.items():
+        digest = hashlib.sha256()
+        with renderer.executable_path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+        renderers_data[r_name] = {
+            "type": renderer.scene_type,
+            "path": str(renderer.executable_path),
+            "options": renderer.options,
+            "version": digest.hexdigest(),
+        }
+
+    with (output_dir_path / out.renderers_file).open("w") as f:
+        json.dump(renderers_data, f, indent=4, sort_keys=True)
+
+
+def create_scratch_dir(scratch_base_dir: str) -> ScratchDirectory:
+    base_dir_path = None
+    if scratch_base_dir:
+        base_dir_path = pathlib.Path(scratch_base_dir).resolve()
+        if not base_dir_path.is_dir():
+            print(
+                f'Scratch directory "{base_dir_path}" '
+                f"is not a directory or does not exist!"
+            )
+            exit(1)
+
+    return ScratchDirectory(base_dir_path)
+
+
+def set_renderers_scratch_dir(renderers: dict, scratch_dir: ScratchDirectory):
+    # Renderers generate files into the scratch directory
+    # instead of the shared scenes directory
+    for renderer in renderers.values():
+        renderer.scratch_dir = scratch_dir
+
+
 def load_renderers(cfg_mod) -> dict:
     lteval_dir_path = pathlib.Path(__file__).parents[2].absolute()
     renderer_scripts_dir_path = lteval_dir_path / "data/scripts/renderers"
@@ -171,6 +527,16 @@ def load_renderers(cfg_mod) -> dict:
         r_class = futils.get_renderer_class_from_file(str(r_module_path))
         if r_class:
             renderers[r_name] = r_class(r_exec_path, r_options)
+
+            # Optional rendering from parameterised scene files (templates)
+            if "templates" in r_data and r_data["templates"]:
+                if r_class.supports_templates:
+                    renderers[r_name].use_templates = True
+                else:
+                    print(
+                        f'Renderer: "{r_name}" does not support templates, '
+                        f"scene files are generated for every test case."
+                    )
         else:
             print(
                 f'Renderer module at: "{r_module_path}" does not contain '
@@ -197,53 +563,135 @@ def render_scene_cases(
     renderers: dict,
     test_cases: list,
     output_dir_path: pathlib.Path,
-    eof: bool,
-    clear: str,
-):
-    for scene in scenes:
-        output_scene_dir_path = output_dir_path / scene.name
-        output_scene_dir_path.mkdir(parents=True, exist_ok=True)
+    scheduler: Scheduler,
+    checkpoint_dir_path: pathlib.Path = None,
+) -> list:
+    templates = tcase.test_case_templates(test_cases)
+    _check_convergence_test_cases(renderers, templates)
+    _check_reference_test_cases(renderers, templates)
+    _check_variance_test_cases(renderers, templates)
+
+    # Jobs are created while they are scheduled, only the dashboard
+    # needs all of them (including all test cases of sweeps) at once
+    scene_case_jobs = create_scene_case_jobs(
+        scenes, renderers, test_cases, output_dir_path, checkpoint_dir_path
+    )
+    if scheduler.dashboard is not None:
+        scene_case_jobs = list(scene_case_jobs)
+        scheduler.dashboard.jobs_queued(scene_case_jobs)
 
-        for test_case in test_cases:
-            renderer = renderers[test_case.renderer]
+    # Returns list of failed jobs
+    return scheduler.run(scene_case_jobs)
 
-            # Generate scene file and render the scene
-            renderer.prepare_scene_case(scene, test_case)
 
-            try:
-                renderer.render_scene_case(
-                    scene, test_case, output_scene_dir_path
+def create_scene_case_jobs(
+    scenes: list,
+    renderers: dict,
+    test_cases: list,
+    output_dir_path: pathlib.Path,
+    checkpoint_dir_path: pathlib.Path = None,
+):
+    # Every combination of scene and test case is an independent job
+    # (a job per step of convergence test cases, per chunk
+    # of reference test cases and per seed of variance test cases),
+    # jobs are ordered by scenes first to keep the original order.
+    # Jobs are generated one by one, test cases of sweeps are created
+    # only when their jobs are.
+    for scene in scenes:
+        for test_case in tcase.iterate_test_cases(test_cases):
+            renderer = renderers[test_case.renderer]
+            if test_case.convergence is not None:
+                yield from convergence_jobs(
+                    scene, test_case, renderer, output_dir_path
                 )
-
-                # Delete generated scene file
-                if clear == "y":
-                    renderer.clear_scene_case(scene, test_case)
-            except Exception:
-                # Renderering failed (no result image was generated and
-                # as such it could not be copied to the output directory)
-                print(
-                    f'Rendering of scene: "{scene.name}", '
-                    f'for test case: "{test_case.name}" failed!\n'
+            elif test_case.reference is not None:
+                yield from reference_chunk_jobs(
+                    scene,
+                    test_case,
+                    renderer,
+                    output_dir_path,
+                    checkpoint_dir_path,
                 )
-                if clear == "fy":
-                    renderer.clear_scene_case(scene, test_case)
-                if eof:
-                    # Stop script on failure (with exception)
-                    raise
-
-            # Copy reference image (if it exists) next to the rendered image
-            reference_path = scene.path / renderer.scene_type / "reference.exr"
-
-            if reference_path.is_file():
-                shutil.copy(
-                    reference_path,
-                    output_scene_dir_path
-                    / (
-                        test_case.name
-                        + out.refimg_stem_suffix
-                        + reference_path.suffix
-                    ),
+            elif test_case.variance is not None:
+                yield from variance_jobs(
+                    scene, test_case, renderer, output_dir_path
                 )
+            else:
+                yield SceneCaseJob(scene, test_case, renderer, output_dir_path)
+
+
+def _check_convergence_test_cases(renderers: dict, test_cases: list):
+    convergence_test_cases = [
+        tc for tc in test_cases if tc.convergence is not None
+    ]
+    if not convergence_test_cases:
+        return
+
+    if not exrimage.is_available():
+        print(
+            "Convergence test cases require numpy and OpenEXR packages "
+            "to compute errors of rendered images!"
+        )
+        exit(1)
+
+    for test_case in convergence_test_cases:
+        if renderers[test_case.renderer].sample_count_parameter is None:
+            print(
+                f'Renderer of test case: "{test_case.name}" does not support '
+                f"convergence rendering (sample count can not be set)!"
+            )
+            exit(1)
+
+
+def _check_reference_test_cases(renderers: dict, test_cases: list):
+    reference_test_cases = [
+        tc for tc in test_cases if tc.reference is not None
+    ]
+    if not reference_test_cases:
+        return
+
+    if not exrimage.is_available():
+        print(
+            "Reference test cases require numpy and OpenEXR packages "
+            "to merge rendered chunks!"
+        )
+        exit(1)
+
+    for test_case in reference_test_cases:
+        renderer = renderers[test_case.renderer]
+        if (
+            renderer.sample_count_parameter is None
+            or refbuild.seed_parameter(renderer, test_case.reference) is None
+        ):
+            print(
+                f'Renderer of test case: "{test_case.name}" does not support '
+                f"rendering of reference chunks (sample count and seed "
+                f'can not be set, see "seed_parameter" of the reference)!'
+            )
+            exit(1)
+
+
+def _check_variance_test_cases(renderers: dict, test_cases: list):
+    variance_test_cases = [tc for tc in test_cases if tc.variance is not None]
+    if not variance_test_cases:
+        return
+
+    if not exrimage.is_available():
+        print(
+            "Variance test cases require numpy and OpenEXR packages "
+            "to compute statistics of rendered images!"
+        )
+        exit(1)
+
+    for test_case in variance_test_cases:
+        renderer = renderers[test_case.renderer]
+        if refbuild.seed_parameter(renderer, test_case.variance) is None:
+            print(
+                f'Renderer of test case: "{test_case.name}" does not support '
+                f"rendering with different seeds (seed can not be set, "
+                f'see "seed_parameter" of the variance)!'
+            )
+            exit(1)
 
 
 def clear_scenes_directory():
@@ -0,0 +1,301 @@
+import json
+import math
+import os
+import pathlib
+import tempfile
+
+import data.scripts.exrimage as exrimage
+import data.scripts.outputconst as out
+
+# Error metrics of rendered images (i) compared to their references (r),
+# averaged over pixels and channels. Named after error images of the JERI
+# viewer, but their definitions differ (e.g. epsilons, SSIM window), values
+# are not comparable with the ones shown by JERI.
+# diff  - mean of i - r (negative if the image is darker)
+# l1    - mean of |i - r|
+# l2    - mean of (i - r)^2 (MSE)
+# mape  - mean of |i - r| / (|r| + 1e-2)
+# smape - mean of 2 |i - r| / (|i| + |r| + 2e-2)
+# ssim  - mean structural similarity of luminance (1 for identical images),
+#         Gaussian window 11x11 (sigma 1.5), luminance clamped to [0, 1]
+#         and gamma corrected (2.2)
+# relmse - mean of (i - r)^2 / (r^2 + 1e-2)
+METRIC_NAMES = ["diff", "l1", "l2", "mape", "smape", "ssim", "relmse"]
+METRIC_TITLES = {
+    "diff": "Diff",
+    "l1": "L1",
+    "l2": "L2",
+    "mape": "MAPE",
+    "smape": "SMAPE",
+    "ssim": "SSIM",
+    "relmse": "relMSE",
+    "diff_relative": "DiffRelative",
+}
+
+# Error maps - images of per pixel errors of the metrics above
+# (diff and diff_relative are signed, see error_map)
+ERROR_MAP_NAMES = [
+    "diff",
+    "diff_relative",
+    "l1",
+    "l2",
+    "mape",
+    "smape",
+    "ssim",
+]
+
+# Small values added to denominators
+_MAPE_EPSILON = 1e-2
+_RELMSE_EPSILON = 1e-2
+
+# SSIM - Gaussian window of 11x11 pixels, default constants
+# for dynamic range 1 (images are clamped and gamma corrected)
+_SSIM_SIGMA = 1.5
+_SSIM_RADIUS = 5
+_SSIM_C1 = (0.01 * 1.0) ** 2
+_SSIM_C2 = (0.03 * 1.0) ** 2
+_SSIM_GAMMA = 2.2
+
+
+def read_image_pair(image_path: pathlib.Path, reference_path: pathlib.Path):
+    image = exrimage.read_exr(image_path)
+    reference = exrimage.read_exr(reference_path)
+
+    if image.shape != reference.shape:
+        raise ValueError(
+            f'Image "{image_path}" and its reference "{reference_path}" '
+            f"differ in size ({image.shape} != {reference.shape})."
+        )
+
+    return image, reference
+
+
+def compute_metrics(image, reference, metric_names: list = None) -> dict:
+    # Metrics of the image array compared to the reference array,
+    # metrics of images with NaNs or infinities are None
+    import numpy
+
+    metric_names = metric_names or METRIC_NAMES
+    difference = image - reference
+    abs_difference = numpy.abs(difference)
+    squared_difference = numpy.square(difference)
+
+    def mean(values):
+        return numpy.mean(values, dtype=numpy.float64)
+
+    functions = {
+        "diff": lambda: mean(difference),
+        "l1": lambda: mean(abs_difference),
+        "l2": lambda: mean(squared_difference),
+        "mape": lambda: mean(
+            abs_difference / (numpy.abs(reference) + _MAPE_EPSILON)
+        ),
+        "smape": lambda: mean(
+            2
+            * abs_difference
+            / (numpy.abs(reference) + numpy.abs(image) + 2 * _MAPE_EPSILON)
+        ),
+        "ssim": lambda: _ssim(image, reference),
+        "relmse": lambda: mean(
+            squared_difference * relative_weights(reference)
+        ),
+    }
+
+    metrics = {}
+    for name in metric_names:
+        value = float(functions[name]())
+        metrics[name] = value if math.isfinite(value) else None
+
+    return metrics
+
+
+def relative_weights(reference):
+    # Weights of squared differences of relative MSE
+    import numpy
+
+    return 1 / (numpy.square(reference) + _RELMSE_EPSILON)
+
+
+def image_metrics(
+    image_path: pathlib.Path, reference_path: pathlib.Path
+) -> dict:
+    # Metrics of the image compared to the reference, computed only once
+    # per version of both images and cached in a file next to the image
+    metrics_path = metrics_file_path(image_path)
+    signature = {
+        "image": _file_signature(image_path),
+        "reference": _file_signature(reference_path),
+    }
+
+    cached = _read_metrics_file(metrics_path)
+    if cached and cached.get("signature") == signature:
+        return cached["metrics"]
+
+    metrics = compute_metrics(*read_image_pair(image_path, reference_path))
+
+    # Written atomically, readers never see a partial file
+    fd, tmp_path_str = tempfile.mkstemp(
+        suffix=".tmp", dir=str(metrics_path.parent)
+    )
+    with os.fdopen(fd, "w") as f:
+        json.dump({"signature": signature, "metrics": metrics}, f, indent=4)
+    os.replace(tmp_path_str, metrics_path)
+
+    return metrics
+
+
+def error_map(image, reference, map_name: str):
+    # Per pixel errors of the image array compared to the reference array,
+    # signed differences are green (image is brighter) and red (darker)
+    import numpy
+
+    difference = image - reference
+    if map_name in ("diff", "diff_relative"):
+        if map_name == "diff_relative":
+            relative = numpy.where(reference == 0, 1, reference)
+            difference = 2 * difference / (relative + image)
+
+        total = numpy.sum(difference, axis=-1)
+        distance = numpy.sqrt(numpy.sum(numpy.square(difference), axis=-1))
+        zero = numpy.zeros_like(distance)
+        return numpy.stack(
+            [
+                numpy.where(total < 0, distance, zero),
+                numpy.where(total > 0, distance, zero),
+                zero,
+            ],
+            axis=-1,
+        )
+
+    if map_name == "l1":
+        return numpy.abs(difference)
+    if map_name == "l2":
+        return numpy.square(difference)
+    if map_name == "mape":
+        return numpy.abs(difference) / (numpy.abs(reference) + _MAPE_EPSILON)
+    if map_name == "smape":
+        return (
+            2
+            * numpy.abs(difference)
+            / (numpy.abs(reference) + numpy.abs(image) + 2 * _MAPE_EPSILON)
+        )
+    if map_name == "ssim":
+        dissimilarity = 1 - _ssim_map(image, reference)
+        return numpy.repeat(dissimilarity[..., numpy.newaxis], 3, axis=-1)
+
+    raise ValueError(f'Unknown error map: "{map_name}".')
+
+
+def write_error_maps(
+    image_path: pathlib.Path,
+    reference_path: pathlib.Path,
+    maps_dir_path: pathlib.Path,
+) -> dict:
+    # Error maps of the image compared to the reference saved as half float
+    # EXR images (<image>_<map>.exr), they are computed only if they
+    # are missing or older than the images. Returns map name -> path.
+    map_paths = {
+        name: maps_dir_path / f"{image_path.stem}_{name}.exr"
+        for name in ERROR_MAP_NAMES
+    }
+
+    images_time = max(
+        image_path.stat().st_mtime_ns, reference_path.stat().st_mtime_ns
+    )
+    if all(
+        path.is_file() and path.stat().st_mtime_ns >= images_time
+        for path in map_paths.values()
+    ):
+        return map_paths
+
+    # Both images are read once for all maps
+    image, reference = read_image_pair(image_path, reference_path)
+    maps_dir_path.mkdir(parents=True, exist_ok=True)
+    for name, path in map_paths.items():
+        exrimage.write_exr(path, error_map(image, reference, name))
+
+    return map_paths
+
+
+def load_metrics(image_path: pathlib.Path) -> dict:
+    # Cached metrics of the image (without checking the images),
+    # None if they were not computed
+    cached = _read_metrics_file(metrics_file_path(image_path))
+    return cached["metrics"] if cached else None
+
+
+def metrics_file_path(image_path: pathlib.Path) -> pathlib.Path:
+    return image_path.with_name(
+        image_path.stem + out.metrics_stem_suffix + ".json"
+    )
+
+
+def _read_metrics_file(metrics_path: pathlib.Path) -> dict:
+    try:
+        with metrics_path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _file_signature(file_path: pathlib.Path) -> list:
+    stat = file_path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _ssim(image, reference) -> float:
+    import numpy
+
+    return numpy.mean(_ssim_map(image, reference), dtype=numpy.float64)
+
+
+def _ssim_map(image, reference):
+    a = _ssim_luminance(image)
+    b = _ssim_luminance(reference)
+
+    # Local means, variances and covariance
+    a_mean = _gaussian_filter(a)
+    b_mean = _gaussian_filter(b)
+    a_variance = _gaussian_filter(a * a) - a_mean * a_mean
+    b_variance = _gaussian_filter(b * b) - b_mean * b_mean
+    covariance = _gaussian_filter(a * b) - a_mean * b_mean
+
+    return ((2 * a_mean * b_mean + _SSIM_C1) * (2 * covariance + _SSIM_C2)) / (
+        (a_mean * a_mean + b_mean * b_mean + _SSIM_C1)
+        * (a_variance + b_variance + _SSIM_C2)
+    )
+
+
+def _ssim_luminance(image):
+    # Gamma corrected luminance of the image clamped to [0, 1]
+    import numpy
+
+    if image.shape[-1] >= 3:
+        luminance = (
+            0.2126 * image[..., 0]
+            + 0.7152 * image[..., 1]
+            + 0.0722 * image[..., 2]
+        )
+    else:
+        luminance = image[..., 0]
+
+    return numpy.power(numpy.clip(luminance, 0, 1), 1 / _SSIM_GAMMA)
+
+
+def _gaussian_filter(values):
+    # Separable Gaussian filter - rows and columns are filtered
+    # by a 1D kernel one after another, borders are mirrored
+    import numpy
+
+    offsets = numpy.arange(-_SSIM_RADIUS, _SSIM_RADIUS + 1)
+    kernel = numpy.exp(-(offsets**2) / (2 * _SSIM_SIGMA**2))
+    kernel /= kernel.sum()
+
+    height, width = values.shape
+    padded = numpy.pad(values, _SSIM_RADIUS, mode="symmetric")
+    rows = sum(
+        weight * padded[i : i + height, :] for i, weight in enumerate(kernel)
+    )
+    return sum(
+        weight * rows[:, i : i + width] for i, weight in enumerate(kernel)
+    )
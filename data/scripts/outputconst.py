@@ -2,9 +2,24 @@
 # and files in the output directory.
 
 scenes_dir = "scenes"
+convergence_dir = "convergence"
+reference_chunks_dir = "reference_chunks"
+variance_dir = "variance"
+references_dir = "references"
 refimg_stem_suffix = "_lteref"
+metrics_stem_suffix = "_ltemetrics"
 
 web_dir = "web"
+error_maps_dir = "error_maps"
+web_data_dir = "data"
+web_manifest_file = "webgen.json"
 
 cfg_file = "cfg.py"
 log_file = "log.txt"
+journal_file = "journal.jsonl"
+metrics_file = "metrics.jsonl"
+references_file = "references.json"
+renderers_file = "renderers.json"
+
+logs_dir = "logs"
+log_suffix = ".txt"
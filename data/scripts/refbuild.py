@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+
+import data.scripts.exrimage as exrimage
+from data.scripts.scene import Scene
+
+# Reference test cases - the scene is rendered by independent chunks
+# (renderings with different seeds of the renderer and the same sample
+# count), results of the chunks are merged into a checkpoint weighted
+# by their sample counts. Checkpoints are kept between runs, further runs
+# extend them by rendering of chunks which were not merged yet.
+
+# Images are merged by blocks of rows, memory does not depend on their size
+_MERGE_ROWS = 64
+
+# Checkpoints are shared by jobs of all threads
+_checkpoint_locks = {}
+_checkpoint_locks_lock = threading.Lock()
+
+
+def check_reference(reference) -> str:
+    # Returns description of the problem of an invalid specification
+    if (
+        not isinstance(reference, dict)
+        or not {
+            "chunks",
+            "chunk_samples",
+        }
+        <= reference.keys()
+    ):
+        return 'must be a dictionary with "chunks" and "chunk_samples"'
+
+    for key in ("chunks", "chunk_samples"):
+        if not isinstance(reference[key], int) or reference[key] < 1:
+            return f"{key} must be a positive integer"
+
+    seed_parameter = reference.get("seed_parameter")
+    if seed_parameter is not None and not (
+        isinstance(seed_parameter, (list, tuple)) and len(seed_parameter) == 3
+    ):
+        return "seed_parameter must be a list: [element, name, type]"
+
+    return None
+
+
+def seed_parameter(renderer, specification: dict) -> tuple:
+    # Parameter seeding the renderer as (element, name, type), given
+    # by the specification (of reference or variance) or the renderer,
+    # None if the renderer can not be seeded
+    if specification.get("seed_parameter") is not None:
+        return tuple(specification["seed_parameter"])
+    return renderer.seed_parameter
+
+
+def with_seed(renderer, test_case, specification: dict, seed: int):
+    # Test case with its seed set to the given value
+    element, param_name, param_type = seed_parameter(renderer, specification)
+    return test_case.derive(
+        test_case.name, {element: [[param_name, param_type, seed]]}
+    )
+
+
+class ReferenceCheckpoint:
+    # Weighted mean of merged chunks (single precision EXR image) and its
+    # state (JSON file next to it) - sample counts of merged chunks by their
+    # seeds and definition of the reference. Checkpoint of a changed
+    # definition (test case, renderer or scene files) starts from zero.
+
+    def __init__(self, image_path: pathlib.Path, definition: str):
+        self.image_path = image_path
+        self.state_path = image_path.with_suffix(".json")
+        self.definition = definition
+
+        with _checkpoint_locks_lock:
+            self._lock = _checkpoint_locks.setdefault(
+                str(image_path), threading.Lock()
+            )
+
+        self._state = {"definition": definition, "chunks": {}}
+        try:
+            with self.state_path.open("r") as f:
+                state = json.load(f)
+            if state.get("definition") == definition:
+                self._state = state
+        except (OSError, ValueError):
+            pass
+
+    def merged_seeds(self) -> set:
+        with self._lock:
+            return {int(seed) for seed in self._state["chunks"]}
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return sum(self._state["chunks"].values())
+
+    def merge(
+        self, chunk_path: pathlib.Path, seed: int, sample_count: int
+    ) -> int:
+        # Chunk is merged into the checkpoint (only once), returns
+        # the number of merged chunks with it (None if it was merged before)
+        with self._lock:
+            if str(seed) in self._state["chunks"]:
+                return None
+
+            merged_count = sum(self._state["chunks"].values())
+            self.image_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path_str = tempfile.mkstemp(
+                suffix=".exr", dir=str(self.image_path.parent)
+            )
+            os.close(fd)
+            try:
+                if merged_count == 0:
+                    shutil.copy(chunk_path, tmp_path_str)
+                else:
+                    _merge_images(
+                        self.image_path,
+                        merged_count,
+                        chunk_path,
+                        sample_count,
+                        pathlib.Path(tmp_path_str),
+                    )
+                os.replace(tmp_path_str, self.image_path)
+            except BaseException:
+                os.remove(tmp_path_str)
+                raise
+
+            # State is written after the image, chunk merged into the image
+            # without being recorded is merged again by the next run
+            self._state["chunks"][str(seed)] = sample_count
+            _write_json(self.state_path, self._state)
+
+            return len(self._state["chunks"])
+
+    def export(self, file_path: pathlib.Path):
+        # Copy of the merged image (replaced atomically)
+        with self._lock:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path_str = tempfile.mkstemp(
+                suffix=".exr", dir=str(file_path.parent)
+            )
+            os.close(fd)
+            shutil.copy(self.image_path, tmp_path_str)
+            os.replace(tmp_path_str, file_path)
+
+
+class ReferenceChunk:
+    # Part of a job rendering a chunk of the reference of the test case:
+    # seed of the chunk, checkpoint it is merged into (None if chunks
+    # are not merged, e.g. on workers) and path of the merged result
+
+    def __init__(
+        self,
+        test_case,
+        seed: int,
+        checkpoint: ReferenceCheckpoint,
+        merged_result_path: pathlib.Path,
+    ):
+        self.test_case = test_case
+        self.seed = seed
+        self.checkpoint = checkpoint
+        self.merged_result_path = merged_result_path
+
+
+def checkpoint_path(
+    checkpoint_dir_path: pathlib.Path, scene: Scene, test_case, renderer
+) -> pathlib.Path:
+    return (
+        checkpoint_dir_path
+        / scene.name
+        / renderer.scene_type
+        / (test_case.name + ".exr")
+    )
+
+
+def reference_definition(scene: Scene, test_case, renderer) -> str:
+    # Digest of everything the reference depends on: renderer, resolved
+    # parameters of the test case and contents of the scene files
+    # of the renderer (as of the render cache)
+    # (render cache imports test cases, which import this module)
+    import data.scripts.rendercache as rendercache
+
+    definition = {
+        "renderer_type": renderer.scene_type,
+        "renderer_options": renderer.options,
+        "parameters": test_case.parameter_set.parameters,
+        "chunk_samples": test_case.reference["chunk_samples"],
+        "scene_files": [
+            [
+                os.path.relpath(file_path, scene.path),
+                rendercache.file_digest(file_path),
+            ]
+            for file_path in rendercache.scene_file_paths(scene, renderer)
+        ],
+    }
+    return hashlib.sha256(
+        json.dumps(definition, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _merge_images(
+    mean_path: pathlib.Path,
+    mean_weight: float,
+    image_path: pathlib.Path,
+    image_weight: float,
+    merged_path: pathlib.Path,
+):
+    # Weighted mean of two images, streamed by blocks of rows
+    width, height = exrimage.read_exr_size(mean_path)
+    if (width, height) != exrimage.read_exr_size(image_path):
+        raise ValueError(
+            f'Image "{image_path}" differs in size from the merged chunks.'
+        )
+
+    total_weight = mean_weight + image_weight
+    exrimage.write_exr_rows(
+        merged_path,
+        width,
+        height,
+        (
+            (mean_block * mean_weight + image_block * image_weight)
+            / total_weight
+            for mean_block, image_block in zip(
+                exrimage.read_exr_rows(mean_path, _MERGE_ROWS),
+                exrimage.read_exr_rows(image_path, _MERGE_ROWS),
+            )
+        ),
+    )
+
+
+def _write_json(file_path: pathlib.Path, data: dict):
+    fd, tmp_path_str = tempfile.mkstemp(
+        suffix=".tmp", dir=str(file_path.parent)
+    )
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=4, sort_keys=True)
+    os.replace(tmp_path_str, file_path)
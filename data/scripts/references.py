@@ -0,0 +1,90 @@
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+
+import data.scripts.outputconst as out
+
+
+class ReferenceStore:
+    # Reference images of one output directory. Each reference is stored
+    # once per scene and renderer (scene type) and shared by test cases
+    # rendered by the renderer, manifest maps test cases to the references:
+    # scene name -> test case name -> path relative to the output directory.
+    # Output directories without the manifest (or test cases missing in it)
+    # have copies of references next to results (<case>_lteref.exr).
+
+    def __init__(self, output_dir_path: pathlib.Path):
+        self.output_dir_path = output_dir_path
+        self.manifest_path = output_dir_path / out.references_file
+        self._lock = threading.Lock()
+
+        try:
+            with self.manifest_path.open("r") as f:
+                self._manifest = json.load(f)
+        except (OSError, ValueError):
+            self._manifest = {}
+
+    def store(
+        self,
+        scene_name: str,
+        case_name: str,
+        reference_path: pathlib.Path,
+        scene_type: str,
+    ) -> pathlib.Path:
+        # Shared copy of the reference is created (or updated) only if it
+        # differs from the original, returns its path
+        relative_path = pathlib.PurePosixPath(
+            out.references_dir, scene_name, scene_type + reference_path.suffix
+        )
+        stored_path = self.output_dir_path / relative_path
+
+        with self._lock:
+            if _file_signature(stored_path) != _file_signature(reference_path):
+                stored_path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path_str = tempfile.mkstemp(
+                    suffix=".tmp", dir=str(stored_path.parent)
+                )
+                os.close(fd)
+                # Modification time is kept, unchanged reference
+                # is not copied again by following runs
+                shutil.copy2(reference_path, tmp_path_str)
+                os.replace(tmp_path_str, stored_path)
+
+            scene_references = self._manifest.setdefault(scene_name, {})
+            if scene_references.get(case_name) != str(relative_path):
+                scene_references[case_name] = str(relative_path)
+                self._write()
+
+        return stored_path
+
+    def reference_path(self, scene_name: str, case_name: str) -> pathlib.Path:
+        # Path of the reference of the test case (it may not exist)
+        relative_path = self._manifest.get(scene_name, {}).get(case_name)
+        if relative_path:
+            return self.output_dir_path / relative_path
+
+        return (
+            self.output_dir_path
+            / out.scenes_dir
+            / scene_name
+            / (case_name + out.refimg_stem_suffix + ".exr")
+        )
+
+    def _write(self):
+        fd, tmp_path_str = tempfile.mkstemp(
+            suffix=".tmp", dir=str(self.manifest_path.parent)
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._manifest, f, indent=4, sort_keys=True)
+        os.replace(tmp_path_str, self.manifest_path)
+
+
+def _file_signature(file_path: pathlib.Path) -> tuple:
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import threading
+
+from data.scripts.scene import Scene
+from data.scripts.tcase import TestCase
+
+
+class RenderCache:
+    # Persistent content-addressed cache of rendered images.
+    # Key of a rendering is a hash of everything which affects its result:
+    # scene files of the renderer and files referenced by them, resolved
+    # parameters of the test case, renderer type, options and executable.
+    # Least recently used images are evicted when the size limit is exceeded,
+    # last use of an image is the modification time of its ".used" file
+    # (images are hard-linked into output directories, their modification
+    # times must not change).
+
+    def __init__(self, dir_path: pathlib.Path, max_size: int):
+        self.dir_path = dir_path.resolve()
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._entries = None  # path -> (size, last access time)
+        self._file_digests = {}  # path -> (mtime, size, digest)
+
+    def key(self, scene: Scene, test_case: TestCase, renderer) -> str:
+        key_hash = hashlib.sha256()
+
+        key_data = {
+            "renderer_type": renderer.scene_type,
+            "renderer_options": renderer.options,
+            "renderer_executable": self._file_digest(renderer.executable_path),
+            "parameters": test_case.parameter_set.parameters,
+            "scene_files": [
+                [os.path.relpath(path, scene.path), self._file_digest(path)]
+                for path in scene_file_paths(scene, renderer)
+            ],
+        }
+        key_hash.update(
+            json.dumps(key_data, sort_keys=True, default=str).encode("utf-8")
+        )
+
+        return key_hash.hexdigest()
+
+    def fetch(self, key: str, dst_path: pathlib.Path) -> bool:
+        # Link or copy cached image to the destination path if it exists
+        entry_path = self._entry_path(key)
+
+        # Entry is linked under the lock (it is not evicted meanwhile),
+        # entry evicted by another process sharing the cache is a miss
+        with self._lock:
+            if not entry_path.is_file():
+                return False
+
+            if dst_path.exists():
+                dst_path.unlink()
+
+            try:
+                try:
+                    os.link(entry_path, dst_path)
+                except FileNotFoundError:
+                    raise
+                except OSError:
+                    shutil.copy2(entry_path, dst_path)
+
+                self._load_entries()[entry_path] = (
+                    entry_path.stat().st_size,
+                    self._mark_used(entry_path),
+                )
+            except FileNotFoundError:
+                self._load_entries().pop(entry_path, None)
+                return False
+
+        return True
+
+    def fetch_metadata(self, key: str) -> dict:
+        # Metadata stored with the cached image (e.g. resource usage
+        # of its rendering), None if there are none
+        try:
+            with self._entry_path(key).with_suffix(".json").open("r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, src_path: pathlib.Path, metadata: dict = None):
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write into a temporary file first - other lteval processes
+        # sharing the cache must never see a partially written image.
+        fd, tmp_path_str = tempfile.mkstemp(
+            suffix=".tmp", dir=str(entry_path.parent)
+        )
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path_str)
+        shutil.copymode(src_path, tmp_path_str)
+
+        if metadata is not None:
+            fd, tmp_metadata_path_str = tempfile.mkstemp(
+                suffix=".tmp", dir=str(entry_path.parent)
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(metadata, f)
+            os.replace(tmp_metadata_path_str, entry_path.with_suffix(".json"))
+
+        os.replace(tmp_path_str, entry_path)
+
+        with self._lock:
+            self._load_entries()[entry_path] = (
+                entry_path.stat().st_size,
+                self._mark_used(entry_path),
+            )
+            self._evict()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.dir_path / key[:2] / (key + ".exr")
+
+    def _mark_used(self, entry_path: pathlib.Path) -> float:
+        # Returns the time of the use
+        used_path = entry_path.with_suffix(".used")
+        used_path.touch()
+        return used_path.stat().st_mtime
+
+    def _load_entries(self) -> dict:
+        # Index of cached images is created on the first use
+        if self._entries is None:
+            self._entries = {}
+            for entry_path in self.dir_path.glob("*/*.exr"):
+                try:
+                    used_time = entry_path.with_suffix(".used").stat().st_mtime
+                except FileNotFoundError:
+                    used_time = entry_path.stat().st_mtime
+                self._entries[entry_path] = (
+                    entry_path.stat().st_size,
+                    used_time,
+                )
+
+        return self._entries
+
+    def _evict(self):
+        entries = self._load_entries()
+        total_size = sum(size for size, _ in entries.values())
+
+        # Delete least recently used images until the cache fits its limit
+        for entry_path, (size, _) in sorted(
+            entries.items(), key=lambda e: e[1][1]
+        ):
+            if total_size <= self.max_size:
+                break
+
+            for path in (
+                entry_path,
+                entry_path.with_suffix(".json"),
+                entry_path.with_suffix(".used"),
+            ):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+            del entries[entry_path]
+            total_size -= size
+
+    def _file_digest(self, path: pathlib.Path) -> str:
+        # Digests are remembered as long as size and mtime of the file match
+        file_stat = path.stat()
+
+        with self._lock:
+            cached = self._file_digests.get(path)
+        if cached and cached[0:2] == (
+            file_stat.st_mtime_ns,
+            file_stat.st_size,
+        ):
+            return cached[2]
+
+        digest = file_digest(path)
+
+        with self._lock:
+            self._file_digests[path] = (
+                file_stat.st_mtime_ns,
+                file_stat.st_size,
+                digest,
+            )
+
+        return digest
+
+
+def scene_file_paths(scene: Scene, renderer) -> list:
+    # All files of the renderer scene directory (without the reference
+    # image and generated files) and files referenced from them
+    # via quoted relative paths (e.g. meshes).
+    scene_dir_path = scene.path / renderer.scene_type
+    file_paths = set()
+
+    for file_path in scene_dir_path.iterdir():
+        if (
+            not file_path.is_file()
+            or file_path.stem == "reference"
+            or file_path.name.startswith(("__lteval_", "__ltetpl_"))
+        ):
+            continue
+
+        file_paths.add(file_path)
+
+        if file_path.suffix != renderer.scene_suffix:
+            continue
+
+        content = file_path.read_text(errors="replace")
+        for quoted in re.findall(r'"([^"\n]+)"', content):
+            referenced_path = scene_dir_path / quoted
+            if referenced_path.is_file():
+                file_paths.add(referenced_path.resolve())
+
+    return sorted(file_paths)
+
+
+def file_digest(path: pathlib.Path) -> str:
+    file_hash = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
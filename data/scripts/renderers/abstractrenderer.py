@@ -2,10 +2,35 @@ import pathlib
 from abc import ABC, abstractmethod
 
 from data.scripts.scene import Scene
+from data.scripts.supervisor import ProcessUsage
 from data.scripts.tcase import TestCase
 
 
 class AbstractRenderer(ABC):
+    # Renderers which are able to render multiple scene files
+    # by a single process advertise it by overriding this attribute
+    # and render_scene_cases method.
+    supports_batch = False
+
+    # Renderers able to render test cases of the same structure
+    # from one parameterised scene file (template) advertise it
+    # by overriding this attribute and handling use_templates attribute.
+    supports_templates = False
+
+    # Renderers whose renderings can be awaited on the event loop
+    # of the process supervisor (without blocking a thread) advertise it
+    # by overriding this attribute and render_scene_case_async
+    # and render_scene_cases_async methods.
+    supports_async = False
+
+    # Parameter controlling the number of samples per pixel
+    # as (element, name, type) - used to calibrate equal-time test cases.
+    sample_count_parameter = None
+
+    # Parameter seeding random numbers of the renderer as (element, name,
+    # type) - used to render independent chunks of reference test cases.
+    seed_parameter = None
+
     @abstractmethod
     def __init__(
         self, executable_path: pathlib.Path = None, options: str = None
@@ -26,10 +51,57 @@ class AbstractRenderer(ABC):
     @abstractmethod
     def render_scene_case(
         self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
-    ):
+    ) -> ProcessUsage:
         # Render the scene with specific test case
         # and move the result to specified output.
         # prepare_scene_case is always called before this method.
+        # Returns resources used by the renderer process (None if unknown).
+        pass
+
+    def render_scene_cases(
+        self,
+        scene: Scene,
+        test_cases: list,
+        output_dir_path: pathlib.Path,
+    ) -> tuple:
+        # Render the scene with multiple test cases at once
+        # and move the results to specified output.
+        # prepare_scene_case is always called for all test cases before.
+        # Returns list of test cases which failed to render and dictionary
+        # of resources used for rendering of test cases (by their names).
+        failed_test_cases = []
+        usages = {}
+        for test_case in test_cases:
+            try:
+                usages[test_case.name] = self.render_scene_case(
+                    scene, test_case, output_dir_path
+                )
+            except Exception:
+                failed_test_cases.append(test_case)
+
+        return failed_test_cases, usages
+
+    async def render_scene_case_async(
+        self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
+    ) -> ProcessUsage:
+        # Coroutine of render_scene_case, runs on the loop of the supervisor
+        raise NotImplementedError
+
+    async def render_scene_cases_async(
+        self,
+        scene: Scene,
+        test_cases: list,
+        output_dir_path: pathlib.Path,
+    ) -> tuple:
+        # Coroutine of render_scene_cases, runs on the loop of the supervisor
+        raise NotImplementedError
+
+    def release_scene_case(self, scene: Scene, test_case: TestCase):
+        # Forget data prepared for rendering of the test case (it is
+        # prepared again if it is needed, e.g. for another scene).
+        # Called once for every call of prepare_scene_case (even a failed
+        # one) when the rendering is finished, so that prepared data
+        # of large sweeps are not kept.
         pass
 
     @abstractmethod
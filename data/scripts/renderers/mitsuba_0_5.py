@@ -1,15 +1,27 @@
+import asyncio
+import collections
 import copy
+import hashlib
+import io
 import pathlib
-import subprocess
+import shutil
 import shlex
+import threading
 from lxml import etree
 
 from data.scripts.renderers.abstractrenderer import AbstractRenderer
 from data.scripts.scene import Scene
+from data.scripts.settingscache import SettingsCache
+from data.scripts.supervisor import ProcessUsage, get_supervisor
 from data.scripts.tcase import TestCase
 
 
 class Mitsuba_0_5(AbstractRenderer):
+    supports_batch = True
+    supports_templates = True
+    supports_async = True
+    sample_count_parameter = ("sampler", "sampleCount", "integer")
+
     def __init__(
         self, executable_path: pathlib.Path = None, options: str = None
     ):
@@ -19,6 +31,23 @@ class Mitsuba_0_5(AbstractRenderer):
         self.options = options
         self._options_tokens = [] if options is None else shlex.split(options)
         self._test_cases = {}
+        # Prepared test cases are kept while their scenes are being rendered
+        self._test_case_users = collections.Counter()
+        self._test_cases_lock = threading.Lock()
+
+        # Parsed settings files of scenes, copied for every test case
+        self._settings_cache = SettingsCache(self._parse_settings)
+
+        # Per-run ScratchDirectory for generated files (if any)
+        self.scratch_dir = None
+
+        # Template mode - test cases of the same structure share one
+        # parameterised scene file, their values are passed to mitsuba
+        # as command line defines (-D name=value).
+        self.use_templates = False
+        self._test_case_templates = {}
+        self._written_templates = set()
+        self._templates_lock = threading.Lock()
 
     def scene_files_exist(self, scene: Scene) -> bool:
         # Check if all files for rendering of the scene exists
@@ -30,14 +59,46 @@ class Mitsuba_0_5(AbstractRenderer):
         )
 
     def prepare_scene_case(self, scene: Scene, test_case: TestCase):
-        self._prepare_test_case(test_case)
+        with self._test_cases_lock:
+            self._test_case_users[test_case.name] += 1
+            self._prepare_test_case(test_case)
+
+        if self.use_templates:
+            self._prepare_scene_template(scene, test_case)
+            return
+
+        case_content_string = self._get_case_content_string(
+            scene, self._test_cases[test_case.name]
+        )
+
+        with open(self._scene_case_path(scene, test_case), "wb") as f:
+            f.write(case_content_string)
+
+    def _prepare_scene_template(self, scene: Scene, test_case: TestCase):
+        # Template is generated only by the first of test cases sharing it
+        template_elements, _, _ = self._test_case_templates[test_case.name]
+        template_path = self._scene_template_path(scene, test_case)
+
+        with self._templates_lock:
+            if template_path in self._written_templates:
+                return
+
+            case_content_string = self._get_case_content_string(
+                scene, template_elements
+            )
+            with open(template_path, "wb") as f:
+                f.write(case_content_string)
+
+            self._written_templates.add(template_path)
 
+    def _get_case_content_string(
+        self, scene: Scene, test_case_native: dict
+    ) -> bytes:
         settings_path = self._scene_dir_path(scene) / (
             "settings" + self.scene_suffix
         )
 
-        parser = etree.XMLParser(remove_blank_text=True)
-        case_content = etree.parse(str(settings_path), parser)
+        case_content = copy.deepcopy(self._settings_cache.get(settings_path))
 
         tree = case_content.getroot()
         elem_film = tree.xpath("/scene/sensor/film")[-1]
@@ -46,7 +107,6 @@ class Mitsuba_0_5(AbstractRenderer):
         # are not expected - scenes should be properly defined.
         # Nonetheless mitsuba applies the last definition and so
         # we save test_case elements in position of their last definitons.
-        test_case_native = self._test_cases[test_case.name]
         for elem_name, elem_template in test_case_native.items():
             # Deepcopy of an element which is then inserted to the xml tree
             elem_native = copy.deepcopy(elem_template)
@@ -75,44 +135,105 @@ class Mitsuba_0_5(AbstractRenderer):
             etree.SubElement(tree, "include", {"filename": "description.xml"})
         )
 
-        case_content_string = etree.tostring(
+        return etree.tostring(
             case_content,
             encoding="utf-8",
             xml_declaration=True,
             pretty_print=True,
         )
 
-        with open(self._scene_case_path(scene, test_case), "wb") as f:
-            f.write(case_content_string)
-
     def render_scene_case(
         self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
-    ):
-        scene_case_path = self._scene_case_path(scene, test_case)
+    ) -> ProcessUsage:
+        return get_supervisor().call(
+            self.render_scene_case_async(scene, test_case, output_dir_path)
+        )
 
-        process = subprocess.Popen(
-            [str(self.executable_path)]
-            + self._options_tokens
-            + [str(scene_case_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
+    def render_scene_cases(
+        self,
+        scene: Scene,
+        test_cases: list,
+        output_dir_path: pathlib.Path,
+    ) -> tuple:
+        return get_supervisor().call(
+            self.render_scene_cases_async(scene, test_cases, output_dir_path)
         )
 
-        # Redictects output of subprocess stdout to the sys.stdout via print()
-        # sys.stdout can be changed to a customized object (e.g. log to a file)
-        for line in iter(process.stdout.readline, ""):
-            # 2 backspace characters are at the end of rendering progress lines
-            # These characters would otherwise be "printed" to the output file
-            # Lines contain endline characters already
-            print(line.replace("\b", ""), end="")
+    async def render_scene_case_async(
+        self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
+    ) -> ProcessUsage:
+        scene_case_path = self._scene_case_path(scene, test_case)
+
+        if self.use_templates:
+            # Values of the test case are defined on the command line,
+            # result is saved as if the case had its own scene file
+            _, defines, _ = self._test_case_templates[test_case.name]
+            define_args = []
+            for define in defines:
+                define_args.extend(["-D", define])
 
-        process.wait()
+            usage = await self._run(
+                define_args
+                + ["-o", str(scene_case_path.with_suffix(".exr"))]
+                + [str(self._scene_template_path(scene, test_case))]
+            )
+        else:
+            usage = await self._run([str(scene_case_path)])
+        self._check_return_code(usage)
 
         # Move resulting HDR image to the provided output directory
-        # Mitsuba saves result image next to the input file
-        result_path = scene_case_path.with_suffix(".exr")
-        result_path.replace(output_dir_path / (test_case.name + ".exr"))
+        await asyncio.to_thread(
+            self._move_result, scene_case_path, test_case, output_dir_path
+        )
+
+        return usage
+
+    async def render_scene_cases_async(
+        self,
+        scene: Scene,
+        test_cases: list,
+        output_dir_path: pathlib.Path,
+    ) -> tuple:
+        # Defines apply to all scene files of the command line,
+        # test cases using templates are rendered one by one.
+        if self.use_templates:
+            failed_test_cases = []
+            usages = {}
+            for test_case in test_cases:
+                try:
+                    usages[test_case.name] = (
+                        await self.render_scene_case_async(
+                            scene, test_case, output_dir_path
+                        )
+                    )
+                except Exception:
+                    failed_test_cases.append(test_case)
+
+            return failed_test_cases, usages
+
+        # Mitsuba renders all scene files given on its command line
+        # one after another (in a single process)
+        usage = await self._run(
+            [str(self._scene_case_path(scene, tc)) for tc in test_cases]
+        )
+        usage.process_cases = len(test_cases)
+
+        # Process fails (non-zero return code) if any of its test cases
+        # fails, only test cases without results are failed
+        failed_test_cases = []
+        for test_case in test_cases:
+            try:
+                await asyncio.to_thread(
+                    self._move_result,
+                    self._scene_case_path(scene, test_case),
+                    test_case,
+                    output_dir_path,
+                )
+            except FileNotFoundError:
+                failed_test_cases.append(test_case)
+
+        # Resources of the process are shared by all its test cases
+        return failed_test_cases, {tc.name: usage for tc in test_cases}
 
     def clear_scene_case(self, scene: Scene, test_case: TestCase):
         # Delete files which were generated for rendering
@@ -121,6 +242,16 @@ class Mitsuba_0_5(AbstractRenderer):
         if scene_case_path.exists():
             self._scene_case_path(scene, test_case).unlink()
 
+    def release_scene_case(self, scene: Scene, test_case: TestCase):
+        with self._test_cases_lock:
+            self._test_case_users[test_case.name] -= 1
+            if self._test_case_users[test_case.name] > 0:
+                return
+
+            del self._test_case_users[test_case.name]
+            self._test_cases.pop(test_case.name, None)
+            self._test_case_templates.pop(test_case.name, None)
+
     def clear_scene(self, scene: Scene):
         # Deletes all files from the scene folder
         # which are not necessary for future rendering.
@@ -137,16 +268,63 @@ class Mitsuba_0_5(AbstractRenderer):
             if file_path.stem != "reference":
                 file_path.unlink()
 
+    async def _run(self, arguments: list) -> ProcessUsage:
+        # Output of the subprocess is streamed by the shared supervisor
+        # into sys.stdout of the caller (e.g. log file of the job)
+        return await get_supervisor().run_async(
+            [str(self.executable_path)] + self._options_tokens + arguments
+        )
+
+    def _check_return_code(self, usage: ProcessUsage):
+        # Failure of a process rendering a single test case
+        if usage.return_code != 0:
+            raise RuntimeError(
+                f"Mitsuba exited with return code {usage.return_code}."
+            )
+
+    def _move_result(
+        self,
+        scene_case_path: pathlib.Path,
+        test_case: TestCase,
+        output_dir_path: pathlib.Path,
+    ):
+        # Mitsuba saves result image next to the input file
+        # (which may be on a different file system - scratch directory)
+        result_path = scene_case_path.with_suffix(".exr")
+        shutil.move(
+            str(result_path), str(output_dir_path / (test_case.name + ".exr"))
+        )
+
+    def _parse_settings(self, content: bytes) -> etree._ElementTree:
+        parser = etree.XMLParser(remove_blank_text=True)
+        return etree.parse(io.BytesIO(content), parser)
+
     def _scene_dir_path(self, scene: Scene) -> pathlib.Path:
         return scene.path / self.scene_type
 
+    def _scene_case_dir_path(self, scene: Scene) -> pathlib.Path:
+        # Generated files are written into the scratch directory if it is
+        # used, otherwise next to the original scene files.
+        if self.scratch_dir is None:
+            return self._scene_dir_path(scene)
+
+        return self.scratch_dir.scene_dir_path(scene) / self.scene_type
+
     def _scene_case_path(
         self, scene: Scene, test_case: TestCase
     ) -> pathlib.Path:
-        return self._scene_dir_path(scene) / (
+        return self._scene_case_dir_path(scene) / (
             "__lteval_" + test_case.name + self.scene_suffix
         )
 
+    def _scene_template_path(
+        self, scene: Scene, test_case: TestCase
+    ) -> pathlib.Path:
+        _, _, signature = self._test_case_templates[test_case.name]
+        return self._scene_case_dir_path(scene) / (
+            "__ltetpl_" + signature + self.scene_suffix
+        )
+
     def _prepare_test_case(self, test_case: TestCase):
         # Prepare test_case parameters for use in the native format
         # in mitsuba each parameter set represents one xml element
@@ -157,13 +335,24 @@ class Mitsuba_0_5(AbstractRenderer):
 
         # For each parameter set create corresponding xml element
         # e.g. integrator/sampler/rfilter
+        # In the template mode also its parameterised version, whose values
+        # are placeholders ($name) of mitsuba command line defines.
         param_subsets = {}
+        template_subsets = {}
+        defines = []
         for name, params in test_case.parameter_set.parameters.items():
             main_element = etree.Element(name)
+            template_element = etree.Element(name)
             for param in params:
+                # Placeholder names have the same length, so that
+                # none of them is a prefix of another one
+                define_name = f"lteval_p{len(defines):03d}"
+
                 if param[1] == "":
                     # Parameter with no type is an attribute
-                    main_element.set(str(param[0]), str(param[2]))
+                    value_str = str(param[2])
+                    main_element.set(str(param[0]), value_str)
+                    template_element.set(str(param[0]), "$" + define_name)
                 else:
                     # Parameter with type is a subelement,
                     # with attributes: "name" and "value"
@@ -181,8 +370,27 @@ class Mitsuba_0_5(AbstractRenderer):
                         param[1],
                         {"name": param[0], "value": value_str},
                     )
+                    etree.SubElement(
+                        template_element,
+                        param[1],
+                        {"name": param[0], "value": "$" + define_name},
+                    )
+
+                defines.append(f"{define_name}={value_str}")
 
             param_subsets[name] = main_element
+            template_subsets[name] = template_element
 
         # Add these test case data to the dictionary of all prepared test cases
         self._test_cases[test_case.name] = param_subsets
+
+        # Test cases with the same structure of elements share a template
+        if self.use_templates:
+            signature = hashlib.sha1(
+                b"".join(etree.tostring(e) for e in template_subsets.values())
+            ).hexdigest()[:16]
+            self._test_case_templates[test_case.name] = (
+                template_subsets,
+                defines,
+                signature,
+            )
@@ -1,14 +1,40 @@
+import asyncio
+import collections
 import pathlib
-import subprocess
+import shutil
 import shlex
 import re
+import threading
 
 from data.scripts.renderers.abstractrenderer import AbstractRenderer
 from data.scripts.scene import Scene
+from data.scripts.settingscache import SettingsCache
+from data.scripts.supervisor import ProcessUsage, get_supervisor
 from data.scripts.tcase import TestCase
 
+# Lexical tokens of the pbrt scene format (matched in this order):
+# comment, quoted string (possibly with escapes or unterminated),
+# whitespace, brackets and any other unquoted word (identifiers, numbers).
+_PBRT_TOKEN_RE = re.compile(
+    r"(?P<comment>#[^\n]*)"
+    r'|(?P<string>"(?:[^"\\]|\\.)*"?)'
+    r"|(?P<space>\s+)"
+    r"|(?P<bracket>[\[\]])"
+    r'|(?P<word>[^\s"#\[\]]+)',
+    re.DOTALL,
+)
+
+# Identifiers are unquoted words starting with a letter
+_PBRT_IDENTIFIER_START = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_"
+)
+
 
 class Pbrt_3(AbstractRenderer):
+    supports_batch = True
+    supports_async = True
+    sample_count_parameter = ("Sampler", "pixelsamples", "integer")
+
     def __init__(
         self, executable_path: pathlib.Path = None, options: str = None
     ):
@@ -18,6 +44,15 @@ class Pbrt_3(AbstractRenderer):
         self.options = options
         self._options_tokens = [] if options is None else shlex.split(options)
         self._test_cases = {}
+        # Prepared test cases are kept while their scenes are being rendered
+        self._test_case_users = collections.Counter()
+        self._test_cases_lock = threading.Lock()
+
+        # Tokenized settings files of scenes (shared by all test cases)
+        self._settings_cache = SettingsCache(self._parse_settings)
+
+        # Per-run ScratchDirectory for generated files (if any)
+        self.scratch_dir = None
 
     def scene_files_exist(self, scene: Scene) -> bool:
         # Check if all files for rendering of the scene exists
@@ -29,60 +64,95 @@ class Pbrt_3(AbstractRenderer):
         )
 
     def prepare_scene_case(self, scene: Scene, test_case: TestCase):
-        self._prepare_test_case(test_case)
+        with self._test_cases_lock:
+            self._test_case_users[test_case.name] += 1
+            self._prepare_test_case(test_case)
 
         settings_path = self._scene_dir_path(scene) / (
             "settings" + self.scene_suffix
         )
 
-        with open(settings_path, "r") as f:
-            settings_str = f.read()
+        statements = self._settings_cache.get(settings_path)
 
-        # Remove comment strings which would confuse our parsing
-        settings_no_comments_str = re.sub(r"#.*", "", settings_str)
-
-        # Split the settings into tokens
-        tokens = re.split(r"(\W+)", settings_no_comments_str)
-
-        # Find indices of indetifier tokens
-        identifier_indices = self._get_identifier_indices(tokens)
-
-        # Generate content of new scene file
+        # Generate content of new scene file, result image is saved
+        # next to it (--outfile cannot be used when rendering multiple
+        # scene files by one process, the film filename is set instead).
+        scene_case_path = self._scene_case_path(scene, test_case)
         case_content_string = self._get_case_content_string(
-            tokens, identifier_indices, test_case
+            statements,
+            test_case,
+            scene_case_path.with_suffix(".exr").as_posix(),
         )
 
-        with open(self._scene_case_path(scene, test_case), "w") as f:
+        with open(scene_case_path, "w") as f:
             f.write(case_content_string)
 
     def render_scene_case(
         self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
-    ):
+    ) -> ProcessUsage:
+        return get_supervisor().call(
+            self.render_scene_case_async(scene, test_case, output_dir_path)
+        )
+
+    def render_scene_cases(
+        self,
+        scene: Scene,
+        test_cases: list,
+        output_dir_path: pathlib.Path,
+    ) -> tuple:
+        return get_supervisor().call(
+            self.render_scene_cases_async(scene, test_cases, output_dir_path)
+        )
+
+    async def render_scene_case_async(
+        self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
+    ) -> ProcessUsage:
         scene_case_path = self._scene_case_path(scene, test_case)
 
         # Run the rendering, save the resulting file next to the scene file
         result_path = scene_case_path.with_suffix(".exr")
-
-        process = subprocess.Popen(
-            [str(self.executable_path)]
-            + self._options_tokens
-            + ["--outfile", str(result_path), str(scene_case_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+        usage = await self._run(
+            ["--outfile", str(result_path), str(scene_case_path)]
         )
-
-        # Redictects output of subprocess stdout to the sys.stdout via print()
-        # sys.stdout can be changed to a customized object (e.g. log to a file)
-        for line in iter(process.stdout.readline, ""):
-            # Lines contain endline characters already
-            print(line, end="")
-
-        process.wait()
+        self._check_return_code(usage)
 
         # Move resulting HDR image to the provided output directory
-        result_path.replace(output_dir_path / (test_case.name + ".exr"))
+        await asyncio.to_thread(
+            self._move_result, scene_case_path, test_case, output_dir_path
+        )
+
+        return usage
+
+    async def render_scene_cases_async(
+        self,
+        scene: Scene,
+        test_cases: list,
+        output_dir_path: pathlib.Path,
+    ) -> tuple:
+        # pbrt renders all scene files given on its command line one after
+        # another (in a single process), results are saved next to the scene
+        # files as specified by their film filename.
+        usage = await self._run(
+            [str(self._scene_case_path(scene, tc)) for tc in test_cases]
+        )
+        usage.process_cases = len(test_cases)
+
+        # Process fails (non-zero return code) if any of its test cases
+        # fails, only test cases without results are failed
+        failed_test_cases = []
+        for test_case in test_cases:
+            try:
+                await asyncio.to_thread(
+                    self._move_result,
+                    self._scene_case_path(scene, test_case),
+                    test_case,
+                    output_dir_path,
+                )
+            except FileNotFoundError:
+                failed_test_cases.append(test_case)
+
+        # Resources of the process are shared by all its test cases
+        return failed_test_cases, {tc.name: usage for tc in test_cases}
 
     def clear_scene_case(self, scene: Scene, test_case: TestCase):
         # Delete files which were generated for rendering
@@ -91,6 +161,15 @@ class Pbrt_3(AbstractRenderer):
         if scene_case_path.exists():
             self._scene_case_path(scene, test_case).unlink()
 
+    def release_scene_case(self, scene: Scene, test_case: TestCase):
+        with self._test_cases_lock:
+            self._test_case_users[test_case.name] -= 1
+            if self._test_case_users[test_case.name] > 0:
+                return
+
+            del self._test_case_users[test_case.name]
+            self._test_cases.pop(test_case.name, None)
+
     def clear_scene(self, scene: Scene):
         # Deletes all files from the scene folder
         # which are not necessary for future rendering.
@@ -107,13 +186,54 @@ class Pbrt_3(AbstractRenderer):
             if file_path.stem != "reference":
                 file_path.unlink()
 
+    def _parse_settings(self, content: bytes) -> tuple:
+        # Universal newlines as if the file was read in the text mode
+        settings_str = content.decode("utf-8").replace("\r\n", "\n")
+
+        return self._get_statements(settings_str)
+
+    async def _run(self, arguments: list) -> ProcessUsage:
+        # Output of the subprocess is streamed by the shared supervisor
+        # into sys.stdout of the caller (e.g. log file of the job)
+        return await get_supervisor().run_async(
+            [str(self.executable_path)] + self._options_tokens + arguments
+        )
+
+    def _check_return_code(self, usage: ProcessUsage):
+        # Failure of a process rendering a single test case
+        if usage.return_code != 0:
+            raise RuntimeError(
+                f"pbrt exited with return code {usage.return_code}."
+            )
+
+    def _move_result(
+        self,
+        scene_case_path: pathlib.Path,
+        test_case: TestCase,
+        output_dir_path: pathlib.Path,
+    ):
+        # Result image is saved next to the scene file
+        # (which may be on a different file system - scratch directory)
+        result_path = scene_case_path.with_suffix(".exr")
+        shutil.move(
+            str(result_path), str(output_dir_path / (test_case.name + ".exr"))
+        )
+
     def _scene_dir_path(self, scene: Scene) -> pathlib.Path:
         return scene.path / self.scene_type
 
+    def _scene_case_dir_path(self, scene: Scene) -> pathlib.Path:
+        # Generated files are written into the scratch directory if it is
+        # used, otherwise next to the original scene files.
+        if self.scratch_dir is None:
+            return self._scene_dir_path(scene)
+
+        return self.scratch_dir.scene_dir_path(scene) / self.scene_type
+
     def _scene_case_path(
         self, scene: Scene, test_case: TestCase
     ) -> pathlib.Path:
-        return self._scene_dir_path(scene) / (
+        return self._scene_case_dir_path(scene) / (
             "__lteval_" + test_case.name + self.scene_suffix
         )
 
@@ -177,60 +297,69 @@ class Pbrt_3(AbstractRenderer):
             # Value should be float (or integer)
             return f"[{param}]"
 
-    def _get_identifier_indices(self, tokens: list) -> list:
-        # Indetifier tokens are:
-        # Unquoted sequences of characters starting with a letter
-        identifier_indices = []
-        re_alpha = re.compile(r"[a-zA-Z_]")
-        quoted = False
-
-        for token_idx, token in enumerate(tokens):
-            quo_mark_count = token.count('"')
-            if quo_mark_count != 0:
-                if quo_mark_count % 2 == 1:
-                    # If token contains odd number of quotation marks
-                    # switch current quotation state
-                    quoted = not quoted
+    def _get_statements(self, settings_str: str) -> tuple:
+        # Single pass lexer splitting the settings into statements.
+        # Statement is a pair of its identifier and its source text
+        # (from the identifier up to the next one) without comments.
+        # Text preceding the first identifier is dropped.
+        statements = []
+        identifier = None
+        parts = []
+
+        for match in _PBRT_TOKEN_RE.finditer(settings_str):
+            kind = match.lastgroup
+            if kind == "comment":
                 continue
 
-            if not quoted and re_alpha.match(token):
-                # Not quoted and starts with a letter = identifier
-                identifier_indices.append(token_idx)
+            token = match.group()
+            if kind == "word" and token[0] in _PBRT_IDENTIFIER_START:
+                if identifier is not None:
+                    statements.append((identifier, "".join(parts)))
+                identifier = token
+                parts = []
 
-        return identifier_indices
+            if identifier is not None:
+                parts.append(token)
+
+        if identifier is not None:
+            statements.append((identifier, "".join(parts)))
+
+        return tuple(statements)
 
     def _get_case_content_string(
-        self, tokens: list, identifier_indices: list, test_case: TestCase
+        self, statements: tuple, test_case: TestCase, film_filename: str
     ) -> str:
         test_case_native = self._test_cases[test_case.name]
         identifiers_handled = set()
-        case_content_string = ""
+        film_filename_param = f'"string filename" "{film_filename}"'
 
-        for identifier_idx, token_idx in enumerate(identifier_indices):
-            identifier = tokens[token_idx]
+        # Parts of the content are joined at once in the end
+        content_parts = []
 
+        for identifier, statement in statements:
             if identifier in test_case_native:
                 # Write identifier definition from the test case
                 identifiers_handled.add(identifier)
-                case_content_string += f"{test_case_native[identifier]}\n"
+                content_parts.append(f"{test_case_native[identifier]}\n")
+                if identifier == "Film":
+                    content_parts.append(f"{film_filename_param}\n")
             else:
                 # Copy identifier from the source scene description
-                cpy_start = identifier_indices[identifier_idx]
-                if identifier_idx == len(identifier_indices) - 1:
-                    cpy_end = len(tokens)
-                else:
-                    cpy_end = identifier_indices[identifier_idx + 1]
-
-                case_content_string += f"{''.join(tokens[cpy_start:cpy_end])}"
+                content_parts.append(statement)
+                if identifier == "Film":
+                    # Last definition of the parameter is used by pbrt
+                    content_parts.append(f"\n{film_filename_param}\n")
 
         for identifier in test_case_native:
             # Add identifiers from the test which were not added yet
             if identifier in identifiers_handled:
                 continue
 
-            case_content_string += f"\n{test_case_native[identifier]}"
+            content_parts.append(f"\n{test_case_native[identifier]}")
+            if identifier == "Film":
+                content_parts.append(f" {film_filename_param}")
 
         # Include description of the scene
-        case_content_string += '\nInclude "description.pbrt"'
+        content_parts.append('\nInclude "description.pbrt"')
 
-        return case_content_string
+        return "".join(content_parts)
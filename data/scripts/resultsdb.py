@@ -0,0 +1,486 @@
+import csv
+import hashlib
+import json
+import pathlib
+import sqlite3
+from datetime import datetime
+
+import data.scripts.exrimage as exrimage
+import data.scripts.futils as futils
+import data.scripts.metrics as metrics
+import data.scripts.outputconst as out
+import data.scripts.tcase as tcase
+from data.scripts.references import ReferenceStore
+from data.scripts.usagelog import load_usages
+
+# Columns of results (besides the run, scene, test case and metrics)
+USAGE_COLUMNS = {
+    "wall_time": "REAL",
+    "user_time": "REAL",
+    "system_time": "REAL",
+    "peak_rss": "INTEGER",
+    "process_cases": "INTEGER",
+    "cached": "INTEGER",
+    "sample_count": "INTEGER",
+    "time_budget": "REAL",
+}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    description TEXT,
+    started TEXT,
+    cfg_hash TEXT,
+    signature TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS renderers (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT,
+    path TEXT,
+    options TEXT,
+    version TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS test_cases (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    renderer TEXT,
+    description TEXT,
+    parameters TEXT,
+    time_budget REAL,
+    convergence TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    scene TEXT NOT NULL,
+    test_case TEXT NOT NULL,
+    convergence_case TEXT,
+    {", ".join(f"{c} {t}" for c, t in USAGE_COLUMNS.items())},
+    {", ".join(f"{m} REAL" for m in metrics.METRIC_NAMES)},
+    PRIMARY KEY (run_id, scene, test_case)
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS runs_name ON runs(name);
+CREATE INDEX IF NOT EXISTS test_cases_renderer ON test_cases(renderer);
+CREATE INDEX IF NOT EXISTS results_scene_case ON results(scene, test_case);
+CREATE INDEX IF NOT EXISTS results_case ON results(test_case);
+"""
+
+# Joined results of all runs, test cases of convergence steps
+# are the test cases whose ladder the steps are
+_RESULTS_QUERY = f"""
+SELECT
+    runs.id AS run_id,
+    runs.name AS run,
+    runs.started AS started,
+    results.scene AS scene,
+    results.test_case AS test_case,
+    results.convergence_case AS convergence_case,
+    test_cases.renderer AS renderer,
+    renderers.type AS renderer_type,
+    renderers.version AS renderer_version,
+    test_cases.parameters AS parameters,
+    {", ".join(f"results.{c} AS {c}" for c in USAGE_COLUMNS)},
+    {", ".join(f"results.{m} AS {m}" for m in metrics.METRIC_NAMES)}
+FROM results
+JOIN runs ON runs.id = results.run_id
+LEFT JOIN test_cases ON test_cases.run_id = results.run_id
+    AND test_cases.name = COALESCE(
+        results.convergence_case, results.test_case
+    )
+LEFT JOIN renderers ON renderers.run_id = results.run_id
+    AND renderers.name = test_cases.renderer
+"""
+
+
+class ResultsDatabase:
+    # Index of output directories of lteval runs in a SQLite database:
+    # runs, renderers (their executables), test cases with resolved
+    # parameters and results with resources used for rendering and error
+    # metrics. Queries do not read images of the output directories.
+    # Unchanged output directories are not ingested again.
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(str(db_path))
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def ingest(self, output_dir_path: pathlib.Path, force: bool = False):
+        # Indexes the output directory (replaces its previous version),
+        # returns False if it did not change since the last ingest
+        output_dir_path = output_dir_path.resolve()
+        signature = _output_dir_signature(output_dir_path)
+
+        row = self._connection.execute(
+            "SELECT id, signature FROM runs WHERE path = ?",
+            (str(output_dir_path),),
+        ).fetchone()
+        if row and row["signature"] == signature and not force:
+            return False
+
+        # Metrics missing in the output directory are computed (and cached
+        # in it) while it is read, signature is taken afterwards
+        run = _read_output_dir(output_dir_path)
+        signature = _output_dir_signature(output_dir_path)
+        with self._connection:
+            if row:
+                self._connection.execute(
+                    "DELETE FROM runs WHERE id = ?", (row["id"],)
+                )
+
+            run_id = self._connection.execute(
+                "INSERT INTO runs (path, name, description, started, "
+                "cfg_hash, signature) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(output_dir_path),
+                    output_dir_path.name,
+                    run["description"],
+                    run["started"],
+                    run["cfg_hash"],
+                    signature,
+                ),
+            ).lastrowid
+
+            self._insert(run_id, "renderers", run["renderers"])
+            self._insert(run_id, "test_cases", run["test_cases"])
+            self._insert(run_id, "results", run["results"])
+
+        return True
+
+    def runs(self) -> list:
+        return [
+            dict(row)
+            for row in self._connection.execute(
+                "SELECT runs.*, COUNT(results.test_case) AS result_count "
+                "FROM runs LEFT JOIN results ON results.run_id = runs.id "
+                "GROUP BY runs.id ORDER BY runs.started, runs.id"
+            )
+        ]
+
+    def results(
+        self,
+        run: str = None,
+        scene: str = None,
+        test_case: str = None,
+        renderer: str = None,
+        parameter: str = None,
+        steps: bool = False,
+    ) -> list:
+        # Results (oldest runs first) filtered by the run (ID, name or path),
+        # scene, test case, renderer (name or type) and a text contained
+        # in resolved parameters of the test case (e.g. an integrator).
+        # Convergence steps are included only if steps is set.
+        conditions = []
+        values = []
+        if run is not None:
+            conditions.append("runs.id = ?")
+            values.append(self.run_id(run))
+        if scene is not None:
+            conditions.append("results.scene = ?")
+            values.append(scene)
+        if test_case is not None:
+            conditions.append(
+                "COALESCE(results.convergence_case, results.test_case) = ?"
+            )
+            values.append(test_case)
+        if renderer is not None:
+            conditions.append(
+                "(test_cases.renderer = ? OR renderers.type = ?)"
+            )
+            values.extend([renderer, renderer])
+        if parameter is not None:
+            conditions.append("test_cases.parameters LIKE ?")
+            values.append(f"%{parameter}%")
+        if not steps:
+            conditions.append("results.convergence_case IS NULL")
+
+        query = _RESULTS_QUERY
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += (
+            " ORDER BY runs.started, runs.id, results.scene, "
+            "results.test_case"
+        )
+
+        return [dict(row) for row in self._connection.execute(query, values)]
+
+    def diff(self, run_a: str, run_b: str) -> list:
+        # Results of scenes and test cases of both runs side by side
+        # (None for results missing in one of them)
+        results_a = {
+            (r["scene"], r["test_case"]): r for r in self.results(run_a)
+        }
+        results_b = {
+            (r["scene"], r["test_case"]): r for r in self.results(run_b)
+        }
+
+        return [
+            (key, results_a.get(key), results_b.get(key))
+            for key in sorted(results_a.keys() | results_b.keys())
+        ]
+
+    def run_id(self, run: str) -> int:
+        # Run given by its ID, path or name (the latest run of the name)
+        row = self._connection.execute(
+            "SELECT id FROM runs WHERE CAST(id AS TEXT) = ? OR path = ? "
+            "OR name = ? ORDER BY path = ? DESC, started DESC, id DESC",
+            (
+                str(run),
+                str(pathlib.Path(run).resolve()),
+                run,
+                str(pathlib.Path(run).resolve()),
+            ),
+        ).fetchone()
+        if row is None:
+            print(f'Run: "{run}" is not in the database!')
+            exit(1)
+        return row["id"]
+
+    def _insert(self, run_id: int, table: str, rows: list):
+        for row in rows:
+            columns = ["run_id", *row.keys()]
+            self._connection.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [run_id, *row.values()],
+            )
+
+
+def export_results(rows: list, file_path: pathlib.Path):
+    # CSV or Parquet file (by the suffix), Parquet requires pyarrow
+    columns = list(rows[0].keys()) if rows else ["run", "scene", "test_case"]
+
+    if file_path.suffix.lower() == ".parquet":
+        import pyarrow
+        import pyarrow.parquet
+
+        table = pyarrow.Table.from_pylist(rows) if rows else None
+        if table is None:
+            table = pyarrow.table({c: [] for c in columns})
+        pyarrow.parquet.write_table(table, str(file_path))
+        return
+
+    with file_path.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def find_output_dirs(dir_path: pathlib.Path) -> list:
+    # The output directory itself or output directories in it
+    # (e.g. the results directory)
+    if _is_output_dir(dir_path):
+        return [dir_path]
+    return sorted(p for p in dir_path.iterdir() if _is_output_dir(p))
+
+
+def _is_output_dir(dir_path: pathlib.Path) -> bool:
+    return (dir_path / out.scenes_dir).is_dir() and (
+        (dir_path / out.cfg_file).is_file()
+        or (dir_path / out.metrics_file).is_file()
+    )
+
+
+def _output_dir_signature(output_dir_path: pathlib.Path) -> str:
+    # Sizes and modification times of the files which are ingested
+    file_paths = [
+        output_dir_path / name
+        for name in (
+            out.cfg_file,
+            out.journal_file,
+            out.metrics_file,
+            out.references_file,
+            out.renderers_file,
+        )
+    ]
+    file_paths.extend(
+        sorted((output_dir_path / out.scenes_dir).glob("*/*.exr"))
+    )
+    file_paths.extend(
+        sorted((output_dir_path / out.scenes_dir).glob("*/*.json"))
+    )
+
+    signature = []
+    for file_path in file_paths:
+        try:
+            stat = file_path.stat()
+        except OSError:
+            continue
+        signature.append(
+            [
+                str(file_path.relative_to(output_dir_path)),
+                stat.st_size,
+                stat.st_mtime_ns,
+            ]
+        )
+
+    return hashlib.sha1(json.dumps(signature).encode()).hexdigest()
+
+
+def _read_output_dir(output_dir_path: pathlib.Path) -> dict:
+    run = {
+        "description": None,
+        "started": _started_time(output_dir_path),
+        "cfg_hash": None,
+        "renderers": [],
+        "test_cases": [],
+        "results": [],
+    }
+
+    cfg_path = output_dir_path / out.cfg_file
+    if cfg_path.is_file():
+        run["cfg_hash"] = hashlib.sha1(cfg_path.read_bytes()).hexdigest()
+        _read_configuration(cfg_path, run)
+
+    # Executables of renderers recorded by the run (if any)
+    recorded_renderers = _read_json(output_dir_path / out.renderers_file)
+    for renderer in run["renderers"]:
+        recorded = recorded_renderers.get(renderer["name"], {})
+        renderer["version"] = recorded.get("version")
+
+    usages = load_usages(output_dir_path / out.metrics_file)
+    references = ReferenceStore(output_dir_path)
+
+    # Results of test cases (images) and convergence steps (usages)
+    scenes_dir_path = output_dir_path / out.scenes_dir
+    for scene_dir_path in sorted(scenes_dir_path.iterdir()):
+        if not scene_dir_path.is_dir():
+            continue
+        scene_name = scene_dir_path.name
+        scene_usages = usages.get(scene_name, {})
+
+        for image_path in sorted(scene_dir_path.glob("*.exr")):
+            if image_path.stem.endswith(out.refimg_stem_suffix):
+                continue
+
+            result = _result_row(
+                scene_name, image_path.stem, scene_usages.get(image_path.stem)
+            )
+            result.update(
+                _image_metrics(
+                    image_path,
+                    references.reference_path(scene_name, image_path.stem),
+                )
+            )
+            run["results"].append(result)
+
+        for case_name, usage in sorted(scene_usages.items()):
+            if "convergence_case" not in usage:
+                continue
+            result = _result_row(scene_name, case_name, usage)
+            result["convergence_case"] = usage["convergence_case"]
+
+            # Errors of convergence steps computed at render time
+            errors = usage.get("errors") or {}
+            result["l2"] = errors.get("mse")
+            result["relmse"] = errors.get("relmse")
+            run["results"].append(result)
+
+    return run
+
+
+def _read_configuration(cfg_path: pathlib.Path, run: dict):
+    # Description, renderers and resolved test cases of the configuration
+    try:
+        cfg_mod = futils.import_module_from_file(str(cfg_path), True)
+        run["description"] = cfg_mod.configuration.get("description")
+        for name, data in getattr(cfg_mod, "renderers", {}).items():
+            run["renderers"].append(
+                {
+                    "name": name,
+                    "type": data.get("type"),
+                    "path": data.get("path"),
+                    "options": data.get("options"),
+                }
+            )
+        test_cases = tcase.load_test_cases(cfg_mod)
+    except (Exception, SystemExit) as e:
+        print(f'Configuration "{cfg_path}" could not be read ({e}).')
+        return
+
+    for test_case in tcase.iterate_test_cases(test_cases):
+        run["test_cases"].append(
+            {
+                "name": test_case.name,
+                "renderer": test_case.renderer,
+                "description": test_case.description,
+                "parameters": json.dumps(
+                    test_case.parameter_set.parameters, sort_keys=True
+                ),
+                "time_budget": test_case.time_budget,
+                "convergence": (
+                    json.dumps(test_case.convergence)
+                    if test_case.convergence is not None
+                    else None
+                ),
+            }
+        )
+
+
+def _result_row(scene_name: str, case_name: str, usage: dict) -> dict:
+    usage = usage or {}
+    return {
+        "scene": scene_name,
+        "test_case": case_name,
+        **{c: usage.get(c) for c in USAGE_COLUMNS},
+    }
+
+
+def _image_metrics(
+    image_path: pathlib.Path, reference_path: pathlib.Path
+) -> dict:
+    # Metrics cached next to the image, they are computed only if they
+    # are missing (and numpy and OpenEXR are available)
+    image_metrics = metrics.load_metrics(image_path)
+    if (
+        image_metrics is None
+        and reference_path.is_file()
+        and exrimage.is_available()
+    ):
+        try:
+            image_metrics = metrics.image_metrics(image_path, reference_path)
+        except Exception as e:
+            print(
+                f'Error metrics of "{image_path}" could not be computed: {e}'
+            )
+
+    return {m: (image_metrics or {}).get(m) for m in metrics.METRIC_NAMES}
+
+
+def _started_time(output_dir_path: pathlib.Path) -> str:
+    # Time of the first job of the journal, modification time
+    # of the configuration file otherwise
+    try:
+        with (output_dir_path / out.journal_file).open("r") as f:
+            return json.loads(f.readline())["time"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    for name in (out.cfg_file, out.log_file):
+        try:
+            mtime = (output_dir_path / name).stat().st_mtime
+        except OSError:
+            continue
+        return datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+
+    return None
+
+
+def _read_json(file_path: pathlib.Path) -> dict:
+    try:
+        with file_path.open("r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,978 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import pathlib
+import shutil
+import time
+
+import data.scripts.convergence as convergence
+import data.scripts.equaltime as equaltime
+import data.scripts.exrimage as exrimage
+import data.scripts.metrics as metrics
+import data.scripts.outputconst as out
+import data.scripts.refbuild as refbuild
+import data.scripts.variance as variance
+from data.scripts.scene import Scene
+from data.scripts.supervisor import ProcessUsage, get_supervisor
+from data.scripts.tcase import TestCase
+
+
+class SceneCaseJob:
+    # Rendering of one test case of one scene - the unit of scheduling
+
+    def __init__(
+        self,
+        scene: Scene,
+        test_case: TestCase,
+        renderer,
+        output_dir_path: pathlib.Path,
+        output_scene_dir_path: pathlib.Path = None,
+    ):
+        self.scene = scene
+        self.test_case = test_case
+        self.renderer = renderer
+        self.output_scene_dir_path = (
+            output_scene_dir_path
+            if output_scene_dir_path is not None
+            else output_dir_path / out.scenes_dir / scene.name
+        )
+        self.result_path = self.output_scene_dir_path / (
+            test_case.name + ".exr"
+        )
+        self.log_path = (
+            output_dir_path
+            / out.logs_dir
+            / scene.name
+            / (test_case.name + out.log_suffix)
+        )
+
+        # Result was taken from the render cache instead of rendering
+        self.cached = False
+        # Outcome of the job - exception if it failed, its wall time
+        # and resources used by the renderer (ProcessUsage)
+        self.error = None
+        self.wall_time = None
+        self.usage = None
+        # Sample count set by lteval (equal-time calibration, convergence)
+        self.sample_count = None
+
+        # Job may be a part of a test case rendered by several jobs:
+        # step of a convergence test case (ConvergenceStep), chunk
+        # of a reference (ReferenceChunk) or seed of a variance test case
+        # (VarianceSeed), its result may be the result of the whole test
+        # case (copied to final_result_path)
+        self.part = None
+        self.final_result_path = None
+        # Errors of the result compared to the reference (convergence)
+        self.errors = None
+
+    def __str__(self):
+        return (
+            f'scene: "{self.scene.name}", '
+            f'test case: "{self.test_case.name}"'
+        )
+
+
+class Scheduler:
+    # Runs independent scene x test case jobs as tasks on the event loop
+    # of the process supervisor. Rendering itself happens in renderer
+    # subprocesses which are awaited by the loop (if renderers support it),
+    # blocking steps - preparation of scene files, render cache,
+    # post-processing of results and renderers without async support -
+    # run in a pool of threads.
+    # With batching enabled, jobs of one scene rendered by the same renderer
+    # which supports it are rendered by a single renderer process.
+    # Rendering of batches can be replaced by render_batch callable
+    # (e.g. distributed rendering), it gets the batch and the local
+    # rendering function which it may use.
+    # Dashboard (if any) is informed about started and finished jobs
+    # and about the output of their renderers.
+    # Post-processing of results (errors of convergence steps, merging
+    # of reference chunks, statistics of variance seeds, references
+    # and error metrics in the output directory) can be disabled, e.g.
+    # on workers whose results are post-processed by the coordinator.
+
+    def __init__(
+        self,
+        job_count: int = 1,
+        *,
+        eof: bool = True,
+        clear: str = "y",
+        logger=None,
+        cache=None,
+        journal=None,
+        batch: bool = False,
+        usage_log=None,
+        render_batch=None,
+        references=None,
+        dashboard=None,
+        install_references: bool = False,
+        post_process: bool = True,
+    ):
+        self.job_count = max(1, job_count)
+        self.eof = eof
+        self.clear = clear
+        self.logger = logger
+        self.cache = cache
+        self.journal = journal
+        self.batch = batch
+        self.usage_log = usage_log
+        self.render_batch = render_batch
+        self.references = references
+        self.dashboard = dashboard
+        # Complete references of test cases with "install" replace
+        # references of their scenes only if it is enabled
+        self.install_references = install_references
+        self.post_process = post_process
+
+        self._skipped_count = 0
+        self._installed_references = []
+        self._executor = None
+
+    def run(self, jobs) -> list:
+        # Returns list of failed jobs.
+        # With eof set, no new jobs are started after the first failure,
+        # running jobs are finished and the failure is re-raised.
+        future = get_supervisor().submit(self._run(jobs))
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def _run(self, jobs) -> list:
+        failed_jobs = []
+        error = None
+        finished_count = 0
+        batches = self._batches(self._pending_jobs(jobs))
+
+        # Batch holds at most two threads at once (render_batch and its
+        # local rendering), one more takes the next batch
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2 * self.job_count + 1
+        )
+        running = {}  # task -> batch
+        next_batch = None
+        try:
+            while True:
+                # Next batch is taken in a thread (jobs may be created
+                # or claimed slowly) while running batches are being finished,
+                # at most job_count batches (of jobs) are in flight
+                if (
+                    next_batch is None
+                    and batches is not None
+                    and error is None
+                    and len(running) < self.job_count
+                ):
+                    next_batch = asyncio.ensure_future(
+                        self._in_thread(next, batches, None)
+                    )
+
+                waiting = set(running)
+                if next_batch is not None:
+                    waiting.add(next_batch)
+                if not waiting:
+                    break
+
+                done, _ = await asyncio.wait(
+                    waiting, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if next_batch in done:
+                    batch = next_batch.result()
+                    next_batch = None
+                    if batch is None:
+                        batches = None
+                    elif error is None:
+                        running[
+                            asyncio.ensure_future(self._run_batch(batch))
+                        ] = batch
+
+                for task in done & running.keys():
+                    # Errors of individual jobs are stored in the jobs,
+                    # exception of the batch is an unexpected failure
+                    # of its jobs which were not rendered (or cached)
+                    batch = running.pop(task)
+                    batch_error = task.exception()
+                    if batch_error is not None:
+                        print(f"Rendering of a batch failed: {batch_error}")
+
+                    for job in batch:
+                        finished_count += 1
+                        if (
+                            job.error is None
+                            and batch_error is not None
+                            and not job.result_path.is_file()
+                        ):
+                            job.error = batch_error
+
+                        if self.journal is not None:
+                            self.journal.record(
+                                job, "done" if job.error is None else "failed"
+                            )
+                        if self.usage_log is not None:
+                            self.usage_log.record(job)
+                        if self.dashboard is not None:
+                            self.dashboard.job_finished(
+                                job, self._dashboard_reference_path(job)
+                            )
+
+                        if job.error is None:
+                            self._print_progress(
+                                finished_count,
+                                job,
+                                "cached" if job.cached else "finished",
+                            )
+                            continue
+
+                        failed_jobs.append(job)
+                        self._print_progress(finished_count, job, "failed")
+                        if self.eof and error is None:
+                            error = job.error
+        finally:
+            # Running batches are finished even if taking of jobs failed
+            if running:
+                await asyncio.wait(running)
+            self._executor.shutdown(wait=False)
+
+        if self._skipped_count:
+            print(
+                f"{self._skipped_count} jobs were already done "
+                f"by the resumed run and were skipped."
+            )
+
+        for reference_path in self._installed_references:
+            print(f'Reference "{reference_path}" was replaced.')
+
+        if error is not None:
+            # Stop script on failure (with exception)
+            raise error
+
+        return failed_jobs
+
+    def _pending_jobs(self, jobs):
+        # Jobs finished by a previous (resumed) run are skipped
+        for job in jobs:
+            if self.journal is not None:
+                if self.journal.is_done(job):
+                    self._skipped_count += 1
+                    # Seed of the resumed run (without its time)
+                    self._finish_variance_seed(job)
+                    # Chunk finished but not merged by the previous run
+                    if job.result_path.is_file():
+                        self._merge_reference_chunk(job)
+                    if self.dashboard is not None:
+                        self.dashboard.job_skipped(
+                            job, self._dashboard_reference_path(job)
+                        )
+                    continue
+                self.journal.record(job, "started")
+
+            yield job
+
+    def _batches(self, jobs):
+        # Consecutive jobs of one scene rendered by the same renderer form
+        # a batch, if batching is enabled and the renderer supports it.
+        # Other jobs (and equal-time jobs, whose time must be measured
+        # separately) are batches of their own.
+        batch_scene = None
+        scene_batches = {}
+
+        for job in jobs:
+            if (
+                not (self.batch and job.renderer.supports_batch)
+                or job.test_case.time_budget is not None
+            ):
+                yield [job]
+                continue
+
+            if job.scene is not batch_scene:
+                yield from scene_batches.values()
+                batch_scene = job.scene
+                scene_batches = {}
+
+            scene_batches.setdefault(id(job.renderer), []).append(job)
+
+        yield from scene_batches.values()
+
+    async def _run_batch(self, batch: list):
+        for job in batch:
+            job.output_scene_dir_path.mkdir(parents=True, exist_ok=True)
+            job.log_path.parent.mkdir(parents=True, exist_ok=True)
+            if self.dashboard is not None:
+                self.dashboard.job_started(job)
+
+        start_time = time.perf_counter()
+        with self._job_output(batch):
+            try:
+                if self.render_batch is not None:
+                    await self._in_thread(
+                        self.render_batch, batch, self._render_batch_blocking
+                    )
+                else:
+                    await self._render_batch(batch)
+            finally:
+                if self.post_process:
+                    await self._in_thread(self._finish_results, batch)
+
+            await self._in_thread(
+                self._finish_jobs, batch, time.perf_counter() - start_time
+            )
+
+    def _finish_results(self, batch: list):
+        for job in batch:
+            self._finish_convergence_step(job)
+            self._merge_reference_chunk(job)
+            self._copy_first_seed(job)
+            self._copy_reference(job)
+
+    def _finish_jobs(self, batch: list, wall_time: float):
+        # Time of a batch is shared by its rendered jobs
+        shares = (
+            self._sample_shares([j for j in batch if not j.cached])
+            if len(batch) > 1
+            else {batch[0]: 1.0}
+        )
+        for job in batch:
+            job.wall_time = wall_time * shares.get(job, 0.0)
+            if not self.post_process:
+                continue
+            if job.error is None:
+                self._compute_metrics(job)
+            self._finish_variance_seed(job)
+
+    def _render_batch_blocking(self, batch: list):
+        # Local rendering for render_batch (called in a thread)
+        get_supervisor().call(self._render_batch(batch))
+
+    async def _render_batch(self, batch: list):
+        cache_keys, jobs, test_cases = await self._in_thread(
+            self._prepare_batch, batch
+        )
+        if not jobs:
+            return
+
+        # Render the scene
+        renderer = jobs[0].renderer
+        scene = jobs[0].scene
+        rendered_jobs = [job for job in jobs if job in test_cases]
+        if len(rendered_jobs) == 1:
+            job = rendered_jobs[0]
+            try:
+                job.usage = await self._render(
+                    renderer,
+                    "render_scene_case",
+                    scene,
+                    test_cases[job],
+                    job.output_scene_dir_path,
+                )
+                await self._in_thread(
+                    self._move_renamed_result, job, test_cases[job]
+                )
+            except Exception as e:
+                job.error = e
+        elif rendered_jobs:
+            try:
+                failed_test_cases, usages = await self._render(
+                    renderer,
+                    "render_scene_cases",
+                    scene,
+                    [test_cases[job] for job in rendered_jobs],
+                    rendered_jobs[0].output_scene_dir_path,
+                )
+            except Exception as e:
+                failed_test_cases, usages = list(test_cases.values()), {}
+                for job in rendered_jobs:
+                    job.error = e
+
+            shares = self._sample_shares(rendered_jobs)
+            for job in rendered_jobs:
+                job.usage = usages.get(test_cases[job].name)
+                if job.usage is not None and job.usage.process_cases > 1:
+                    job.usage = job.usage.share(shares[job])
+                if job.error is not None:
+                    continue
+                if test_cases[job] in failed_test_cases:
+                    job.error = RuntimeError(
+                        f"Result image of {job} was not created."
+                    )
+                    continue
+                try:
+                    await self._in_thread(
+                        self._move_renamed_result, job, test_cases[job]
+                    )
+                except OSError as e:
+                    job.error = e
+
+        await self._in_thread(
+            self._finish_rendering, jobs, cache_keys, test_cases
+        )
+
+    def _prepare_batch(self, batch: list) -> tuple:
+        # Unchanged renderings are taken from the render cache,
+        # scene files are generated for the others.
+        # Returns cache keys and test cases of the jobs to be rendered.
+        cache_keys = {}
+        jobs = []
+        for job in batch:
+            # Equal-time renderings depend on the machine, they are not cached
+            if self.cache is not None and job.test_case.time_budget is None:
+                cache_keys[job] = self.cache.key(
+                    job.scene, job.test_case, job.renderer
+                )
+                if self.cache.fetch(cache_keys[job], job.result_path):
+                    job.cached = True
+
+                    # Resources used by the original rendering
+                    metadata = self.cache.fetch_metadata(cache_keys[job])
+                    if metadata and "usage" in metadata:
+                        job.usage = ProcessUsage.from_dict(metadata["usage"])
+
+                    print(
+                        f'Rendering of scene: "{job.scene.name}", '
+                        f'for test case: "{job.test_case.name}" '
+                        f"was taken from the render cache.\n"
+                    )
+                    continue
+
+            jobs.append(job)
+
+        test_cases = {}
+        for job in jobs:
+            try:
+                test_case = self._render_test_case(job)
+            except Exception as e:
+                job.error = e
+                continue
+
+            try:
+                job.renderer.prepare_scene_case(job.scene, test_case)
+            except Exception as e:
+                job.error = e
+                job.renderer.release_scene_case(job.scene, test_case)
+                continue
+            test_cases[job] = test_case
+
+        return cache_keys, jobs, test_cases
+
+    def _finish_rendering(
+        self, jobs: list, cache_keys: dict, test_cases: dict
+    ):
+        renderer = jobs[0].renderer
+        scene = jobs[0].scene
+        for job in jobs:
+            if job.error is None:
+                if job in cache_keys:
+                    self.cache.store(
+                        cache_keys[job],
+                        job.result_path,
+                        {"usage": job.usage.to_dict()} if job.usage else None,
+                    )
+
+                if (
+                    job.test_case.time_budget is not None
+                    and job.usage is not None
+                ):
+                    print(
+                        f'Rendering of scene: "{scene.name}", '
+                        f'for test case: "{job.test_case.name}" took '
+                        f"{job.usage.wall_time:.2f} s of the time budget "
+                        f"{job.test_case.time_budget} s.\n"
+                    )
+
+                # Delete generated scene file
+                if self.clear in ("y", "fy"):
+                    renderer.clear_scene_case(scene, test_cases[job])
+                continue
+
+            # Renderering failed (no result image was generated and
+            # as such it could not be copied to the output directory)
+            print(
+                f'Rendering of scene: "{scene.name}", '
+                f'for test case: "{job.test_case.name}" failed!\n'
+            )
+            if self.clear == "fy" and job in test_cases:
+                renderer.clear_scene_case(scene, test_cases[job])
+
+        # Prepared data of test cases are not kept (sweeps may be large)
+        for test_case in test_cases.values():
+            renderer.release_scene_case(scene, test_case)
+
+    def _render(self, renderer, method_name: str, *args):
+        # Awaitable rendering - on the loop if the renderer supports it,
+        # in a thread otherwise
+        if renderer.supports_async:
+            return getattr(renderer, method_name + "_async")(*args)
+        return self._in_thread(getattr(renderer, method_name), *args)
+
+    def _in_thread(self, function, *args):
+        # Blocking function run in a thread of the scheduler (with the
+        # context of the caller, e.g. output of its job)
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(context.run, function, *args)
+        )
+
+    def _sample_shares(self, jobs: list) -> dict:
+        # Shares of jobs in the time of their rendering by one process
+        # (or batch) estimated by their sample counts - jobs of a batch
+        # render the same scene (the same number of pixels). Shares
+        # are equal if sample counts of some of the jobs are not known.
+        sample_counts = [
+            (
+                job.sample_count
+                if job.sample_count is not None
+                else equaltime.sample_count(job.renderer, job.test_case)
+            )
+            for job in jobs
+        ]
+        if None in sample_counts or not sum(sample_counts):
+            sample_counts = [1] * len(jobs)
+
+        total = sum(sample_counts)
+        return {
+            job: sample_count / total
+            for job, sample_count in zip(jobs, sample_counts)
+        }
+
+    def _render_test_case(self, job: SceneCaseJob) -> TestCase:
+        # Equal-time test cases are rendered with the sample count
+        # calibrated to fit their time budget
+        if job.test_case.time_budget is None:
+            return job.test_case
+
+        job.sample_count = equaltime.calibrate_sample_count(
+            job.renderer, job.scene, job.test_case
+        )
+        # Renderers keep prepared test cases by their names, calibrated
+        # test case is named by its scene and sample count
+        return equaltime.with_sample_count(
+            job.renderer,
+            job.test_case,
+            job.sample_count,
+            f"{job.test_case.name}__{job.scene.name}"
+            f"__spp{job.sample_count}",
+        )
+
+    def _move_renamed_result(
+        self, job: SceneCaseJob, rendered_test_case: TestCase
+    ):
+        # Result of a renamed (calibrated) test case is the result of the job
+        if rendered_test_case.name == job.test_case.name:
+            return
+
+        shutil.move(
+            str(
+                job.output_scene_dir_path / (rendered_test_case.name + ".exr")
+            ),
+            str(job.result_path),
+        )
+
+    def _finish_convergence_step(self, job: SceneCaseJob):
+        # Error of the step compared to the reference, result of the last
+        # step is the result of the whole test case
+        if (
+            not isinstance(job.part, convergence.ConvergenceStep)
+            or job.error is not None
+            or not job.result_path.is_file()
+        ):
+            return
+
+        reference_path = self._reference_path(job)
+        if reference_path.is_file():
+            try:
+                job.errors = convergence.image_errors(
+                    job.result_path, reference_path
+                )
+            except Exception as e:
+                print(f"Error of {job} could not be computed: {e}\n")
+
+        if job.final_result_path is not None:
+            job.final_result_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(job.result_path, job.final_result_path)
+
+    def _merge_reference_chunk(self, job: SceneCaseJob):
+        # Result of a reference chunk is merged into the checkpoint
+        # of its test case, the checkpoint is the result of the test case
+        chunk = job.part
+        if (
+            not isinstance(chunk, refbuild.ReferenceChunk)
+            or chunk.checkpoint is None
+            or job.error is not None
+        ):
+            return
+
+        reference = chunk.test_case.reference
+        try:
+            merged_count = chunk.checkpoint.merge(
+                job.result_path, chunk.seed, job.sample_count
+            )
+            chunk.checkpoint.export(chunk.merged_result_path)
+        except Exception as e:
+            job.error = e
+            print(f"Chunk of {job} could not be merged: {e}\n")
+            return
+
+        if merged_count is None:
+            return
+        print(
+            f"Chunk of {job} was merged into the reference "
+            f"({merged_count}/{reference['chunks']} chunks, "
+            f"{chunk.checkpoint.sample_count()} samples per pixel).\n"
+        )
+
+        # Complete reference replaces the reference of the scene (in the
+        # scenes directory) once - by the chunk completing it, replaced
+        # references are listed after the run
+        if not reference.get("install") or merged_count != reference["chunks"]:
+            return
+
+        reference_path = self._reference_path(job)
+        if not self.install_references:
+            print(
+                f'Reference of {job} is complete, "{reference_path}" '
+                f"is replaced by it only with --install-references.\n"
+            )
+            return
+
+        chunk.checkpoint.export(reference_path)
+        self._installed_references.append(reference_path)
+        print(f'Reference "{reference_path}" was replaced by {job}.\n')
+
+    def _copy_first_seed(self, job: SceneCaseJob):
+        # Result of the first seed is the result of the variance test case
+        if (
+            isinstance(job.part, variance.VarianceSeed)
+            and job.final_result_path is not None
+            and job.error is None
+            and job.result_path.is_file()
+        ):
+            job.final_result_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(job.result_path, job.final_result_path)
+
+    def _finish_variance_seed(self, job: SceneCaseJob):
+        # Statistics of all seeds are computed once the last one finishes
+        if not isinstance(
+            job.part, variance.VarianceSeed
+        ) or not job.part.group.finish(job):
+            return
+
+        test_case = job.part.test_case
+        jobs = job.part.group.jobs
+        reference_path = self._reference_path(job)
+        if any(j.error is not None for j in jobs) or not all(
+            j.result_path.is_file() for j in jobs
+        ):
+            print(
+                f'Statistics of scene: "{job.scene.name}", test case: '
+                f'"{test_case.name}" were not computed (failed seeds).\n'
+            )
+            return
+        if not reference_path.is_file():
+            return
+
+        try:
+            statistics = variance.seed_statistics(
+                [j.result_path for j in jobs],
+                reference_path,
+                [
+                    j.usage.wall_time if j.usage is not None else j.wall_time
+                    for j in jobs
+                ],
+            )
+            variance.write_statistics(
+                job.part.group.statistics_path, statistics
+            )
+        except Exception as e:
+            print(
+                f'Statistics of scene: "{job.scene.name}", test case: '
+                f'"{test_case.name}" could not be computed: {e}\n'
+            )
+            return
+
+        def format_value(value) -> str:
+            return "-" if value is None else f"{value:.4g}"
+
+        print(
+            f'Statistics of scene: "{job.scene.name}", test case: '
+            f'"{test_case.name}" ({statistics["seeds"]} seeds): '
+            f'relMSE {format_value(statistics["relmse"])}, '
+            f'variance {format_value(statistics["variance"])}, '
+            f'bias^2 {format_value(statistics["bias2"])}, '
+            f'efficiency {format_value(statistics["efficiency"])}.\n'
+        )
+
+    def _reference_path(self, job: SceneCaseJob) -> pathlib.Path:
+        return job.scene.path / job.renderer.scene_type / "reference.exr"
+
+    def _result_path(self, job: SceneCaseJob) -> pathlib.Path:
+        # Result of the test case, convergence steps and variance seeds
+        # share the result of their test case (it is set for one of them),
+        # reference chunks share the merged result
+        if isinstance(job.part, refbuild.ReferenceChunk):
+            return job.part.merged_result_path
+        if job.part is not None:
+            return job.final_result_path
+        return job.result_path
+
+    def _output_reference_path(
+        self, job: SceneCaseJob, result_path: pathlib.Path
+    ) -> pathlib.Path:
+        # Reference of the result in the output directory
+        if self.references is not None:
+            return self.references.reference_path(
+                job.scene.name, result_path.stem
+            )
+        return result_path.with_name(
+            result_path.stem + out.refimg_stem_suffix + ".exr"
+        )
+
+    def _copy_reference(self, job: SceneCaseJob):
+        # Reference image (if it exists) is stored once per scene
+        # and renderer in the output directory, without the reference store
+        # it is copied next to the rendered image
+        reference_path = self._reference_path(job)
+        result_path = self._result_path(job)
+        if result_path is None or not reference_path.is_file():
+            return
+
+        if self.references is not None:
+            self.references.store(
+                job.scene.name,
+                result_path.stem,
+                reference_path,
+                job.renderer.scene_type,
+            )
+            return
+
+        result_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(
+            reference_path, self._output_reference_path(job, result_path)
+        )
+
+    def _compute_metrics(self, job: SceneCaseJob):
+        # Errors of the result compared to the reference are computed
+        # once after the rendering (if numpy and OpenEXR are available)
+        # with the reference in the output directory
+        result_path = self._result_path(job)
+        if (
+            result_path is None
+            or not result_path.is_file()
+            or not exrimage.is_available()
+        ):
+            return
+
+        reference_path = self._output_reference_path(job, result_path)
+        if not reference_path.is_file():
+            return
+
+        try:
+            metrics.image_metrics(result_path, reference_path)
+        except Exception as e:
+            print(f"Error metrics of {job} could not be computed: {e}\n")
+
+    def _dashboard_reference_path(self, job: SceneCaseJob) -> pathlib.Path:
+        # Reference of the job result in the output directory
+        # (of the whole test case for convergence steps, reference chunks
+        # and variance seeds)
+        result_path = job.result_path
+        if job.part is not None:
+            result_path = result_path.with_name(
+                job.part.test_case.name + ".exr"
+            )
+        return self._output_reference_path(job, result_path)
+
+    def _job_output(self, batch: list):
+        # Each job has its own log file (output of a renderer process shared
+        # by a batch of jobs is written into log files of all of them),
+        # output of a single sequentially running job is shown
+        # in the main output as well.
+        if self.logger is None:
+            return contextlib.nullcontext()
+
+        return self.logger.redirect_thread(
+            [job.log_path for job in batch],
+            echo=self.job_count == 1,
+            listener=(
+                functools.partial(self.dashboard.job_output, batch)
+                if self.dashboard is not None
+                else None
+            ),
+        )
+
+    def _print_progress(
+        self,
+        finished_count: int,
+        job: SceneCaseJob,
+        state: str,
+    ):
+        # Summary lines are useful only when output of jobs is not shown
+        if self.job_count == 1:
+            return
+
+        message = f"[{finished_count}] Rendering of {job} {state}"
+        if job.wall_time is not None:
+            message += f" ({job.wall_time:.1f} s)"
+        if state == "failed":
+            message += f', see "{job.log_path}"'
+        print(message)
+
+
+def convergence_jobs(
+    scene: Scene,
+    test_case: TestCase,
+    renderer,
+    output_dir_path: pathlib.Path,
+) -> list:
+    # Independent jobs rendering the scene with a ladder of sample counts,
+    # their results are saved into a directory of the test case
+    steps_dir_path = (
+        output_dir_path / out.convergence_dir / scene.name / test_case.name
+    )
+
+    jobs = []
+    for sample_count in convergence.sample_count_ladder(test_case.convergence):
+        job = SceneCaseJob(
+            scene,
+            equaltime.with_sample_count(
+                renderer,
+                test_case,
+                sample_count,
+                f"{test_case.name}__spp{sample_count}",
+            ),
+            renderer,
+            output_dir_path,
+            steps_dir_path,
+        )
+        job.sample_count = sample_count
+        job.part = convergence.ConvergenceStep(test_case)
+        jobs.append(job)
+
+    jobs[-1].final_result_path = (
+        output_dir_path
+        / out.scenes_dir
+        / scene.name
+        / (test_case.name + ".exr")
+    )
+
+    return jobs
+
+
+def reference_chunk_jobs(
+    scene: Scene,
+    test_case: TestCase,
+    renderer,
+    output_dir_path: pathlib.Path,
+    checkpoint_dir_path: pathlib.Path = None,
+) -> list:
+    # Independent jobs rendering chunks of the reference with different
+    # seeds, their results are saved into a directory of the test case.
+    # Chunks already merged into the checkpoint (by previous runs)
+    # are not rendered again. Without the checkpoint directory (e.g.
+    # on workers) jobs of all chunks are created and nothing is merged.
+    reference = test_case.reference
+    merged_result_path = (
+        output_dir_path
+        / out.scenes_dir
+        / scene.name
+        / (test_case.name + ".exr")
+    )
+
+    checkpoint = None
+    merged_seeds = set()
+    if checkpoint_dir_path is not None:
+        checkpoint = refbuild.ReferenceCheckpoint(
+            refbuild.checkpoint_path(
+                checkpoint_dir_path, scene, test_case, renderer
+            ),
+            refbuild.reference_definition(scene, test_case, renderer),
+        )
+        merged_seeds = checkpoint.merged_seeds()
+
+    chunks_dir_path = (
+        output_dir_path
+        / out.reference_chunks_dir
+        / scene.name
+        / test_case.name
+    )
+    jobs = []
+    for seed in range(reference["chunks"]):
+        if seed in merged_seeds:
+            continue
+
+        chunk_test_case = refbuild.with_seed(
+            renderer,
+            equaltime.with_sample_count(
+                renderer,
+                test_case,
+                reference["chunk_samples"],
+                f"{test_case.name}__chunk{seed}",
+            ),
+            reference,
+            seed,
+        )
+        job = SceneCaseJob(
+            scene, chunk_test_case, renderer, output_dir_path, chunks_dir_path
+        )
+        job.sample_count = reference["chunk_samples"]
+        job.part = refbuild.ReferenceChunk(
+            test_case, seed, checkpoint, merged_result_path
+        )
+        jobs.append(job)
+
+    if not jobs and checkpoint is not None:
+        # Reference is complete, only its result is taken
+        checkpoint.export(merged_result_path)
+        print(
+            f'Reference of scene: "{scene.name}", test case: '
+            f'"{test_case.name}" has all {reference["chunks"]} chunks '
+            f"merged in its checkpoint.\n"
+        )
+
+    return jobs
+
+
+def variance_jobs(
+    scene: Scene,
+    test_case: TestCase,
+    renderer,
+    output_dir_path: pathlib.Path,
+) -> list:
+    # Independent jobs rendering the scene with different seeds, their
+    # results are saved into a directory of the test case and their
+    # statistics next to it
+    seeds_dir_path = (
+        output_dir_path / out.variance_dir / scene.name / test_case.name
+    )
+    seed_group = variance.SeedGroup(
+        test_case.variance["seeds"],
+        seeds_dir_path.with_suffix(".json"),
+    )
+
+    jobs = []
+    for seed in range(test_case.variance["seeds"]):
+        job = SceneCaseJob(
+            scene,
+            refbuild.with_seed(
+                renderer,
+                test_case.derive(f"{test_case.name}__seed{seed}", {}),
+                test_case.variance,
+                seed,
+            ),
+            renderer,
+            output_dir_path,
+            seeds_dir_path,
+        )
+        job.part = variance.VarianceSeed(test_case, seed, seed_group)
+        jobs.append(job)
+
+    jobs[0].final_result_path = (
+        output_dir_path
+        / out.scenes_dir
+        / scene.name
+        / (test_case.name + ".exr")
+    )
+
+    return jobs
@@ -0,0 +1,89 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+
+from data.scripts.scene import Scene
+
+
+class ScratchDirectory:
+    # Per-run directory for files generated for rendering (scene files
+    # of test cases and not yet moved result images).
+    # Scenes are mirrored into it: directories of the scene are created
+    # and their content is linked to the original files, so that relative
+    # paths (includes, meshes) of generated files resolve exactly as they
+    # would in the original scene directory.
+
+    def __init__(self, base_dir_path: pathlib.Path = None):
+        self.path = pathlib.Path(
+            tempfile.mkdtemp(
+                prefix="lteval-",
+                dir=str(base_dir_path) if base_dir_path else None,
+            )
+        ).resolve()
+
+        self._lock = threading.Lock()
+        self._mirrored_scenes = set()
+
+    def scene_dir_path(self, scene: Scene) -> pathlib.Path:
+        # Mirror of the scene directory, created on the first use
+        scene_dir_path = self.path / scene.name
+
+        with self._lock:
+            if scene.name not in self._mirrored_scenes:
+                self._mirror_scene(scene, scene_dir_path)
+                self._mirrored_scenes.add(scene.name)
+
+        return scene_dir_path
+
+    def remove_unused(self, keep: bool = False):
+        # Scratch directory is deleted unless it should be kept or generated
+        # files were left in it (e.g. scene files of failed renderings).
+        # Shared generated files (e.g. templates) do not count.
+        if keep or any(self.path.glob("*/*/__lteval_*")):
+            print(f'Generated files were kept in: "{self.path}"')
+            return
+
+        shutil.rmtree(str(self.path), ignore_errors=True)
+
+    def _mirror_scene(self, scene: Scene, scene_dir_path: pathlib.Path):
+        scene_dir_path.mkdir(parents=True, exist_ok=True)
+
+        for entry_path in scene.path.iterdir():
+            mirror_path = scene_dir_path / entry_path.name
+
+            if not entry_path.is_dir():
+                self._link(entry_path, mirror_path)
+                continue
+
+            # Subdirectories (e.g. renderer scene directories) are real
+            # directories so that generated files stay in the scratch
+            mirror_path.mkdir(exist_ok=True)
+            for sub_entry_path in entry_path.iterdir():
+                if sub_entry_path.name.startswith(("__lteval_", "__ltetpl_")):
+                    # Leftovers of runs which generated files in place
+                    continue
+                self._link(sub_entry_path, mirror_path / sub_entry_path.name)
+
+    def _link(self, target_path: pathlib.Path, link_path: pathlib.Path):
+        # Symbolic links are not always available (e.g. Windows without
+        # necessary privileges), hard links or copies are used instead.
+        try:
+            os.symlink(
+                str(target_path),
+                str(link_path),
+                target_is_directory=target_path.is_dir(),
+            )
+            return
+        except OSError:
+            pass
+
+        if target_path.is_dir():
+            shutil.copytree(str(target_path), str(link_path))
+            return
+
+        try:
+            os.link(str(target_path), str(link_path))
+        except OSError:
+            shutil.copy2(str(target_path), str(link_path))
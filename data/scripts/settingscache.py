@@ -0,0 +1,43 @@
+import hashlib
+import pathlib
+import threading
+
+
+class SettingsCache:
+    # In-memory cache of parsed scene settings files.
+    # Files are parsed by the given function (content bytes -> parsed data)
+    # once and re-parsed only if they change. Modification time and size
+    # are checked first, content hash decides if changed files really differ.
+    # Parsed data are shared - users must not modify them (clone them).
+
+    def __init__(self, parse):
+        self._parse = parse
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> [mtime, size, digest, parsed data]
+
+    def get(self, path: pathlib.Path):
+        path_stat = path.stat()
+
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0:2] == [path_stat.st_mtime_ns, path_stat.st_size]:
+            return entry[3]
+
+        content = path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+
+        # Touched but unchanged file does not have to be parsed again
+        if entry and entry[2] == digest:
+            parsed = entry[3]
+        else:
+            parsed = self._parse(content)
+
+        with self._lock:
+            self._entries[path] = [
+                path_stat.st_mtime_ns,
+                path_stat.st_size,
+                digest,
+                parsed,
+            ]
+
+        return parsed
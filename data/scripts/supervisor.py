@@ -0,0 +1,348 @@
+import asyncio
+import codecs
+import concurrent.futures
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    # Pipes of the subprocess must support overlapped I/O on Windows
+    from asyncio.windows_utils import Popen as _Popen
+else:
+    from subprocess import Popen as _Popen
+
+# Progress bars of renderers, e.g. "Rendering: [+++++     ] (1.2s|3.4s)"
+_PROGRESS_RE = re.compile(r"\[[+ ]*\]")
+
+# Ends of processes are polled in this interval (seconds) where they can
+# not be waited for by the event loop (process file descriptors)
+_EXIT_POLL_INTERVAL = 0.05
+
+
+class ProcessUsage:
+    # Resources used by a renderer process: wall time, CPU time (user,
+    # system) in seconds and peak resident set size in bytes.
+    # Process may render more test cases at once (process_cases).
+
+    def __init__(
+        self,
+        return_code: int,
+        wall_time: float,
+        user_time: float = None,
+        system_time: float = None,
+        peak_rss: int = None,
+        process_cases: int = 1,
+    ):
+        self.return_code = return_code
+        self.wall_time = wall_time
+        self.user_time = user_time
+        self.system_time = system_time
+        self.peak_rss = peak_rss
+        self.process_cases = process_cases
+
+    def share(self, fraction: float) -> "ProcessUsage":
+        # Estimate of resources used by one of test cases rendered
+        # by the process - given fraction of its times (peak resident
+        # set size is of the whole process)
+        return ProcessUsage(
+            self.return_code,
+            *(
+                None if t is None else t * fraction
+                for t in (self.wall_time, self.user_time, self.system_time)
+            ),
+            self.peak_rss,
+            self.process_cases,
+        )
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+
+class _OutputStream:
+    # Incrementally decodes output of a subprocess and writes it line by line.
+    # Progress bar lines are throttled - only the latest one is written
+    # once per progress_interval (and before any other line).
+
+    def __init__(self, output, progress_interval: float):
+        self.output = output
+        self.progress_interval = progress_interval
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._partial = ""
+        self._progress_line = None
+        self._progress_time = 0.0
+        self._in_progress = False
+
+    def feed(self, data: bytes):
+        text = self._partial + self._decoder.decode(data)
+
+        # Carriage returns of progress bars end lines as well
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        self._partial = lines.pop()
+
+        self._write_lines(lines)
+
+    def close(self):
+        text = self._partial + self._decoder.decode(b"", final=True)
+        self._write_lines([text] if text else [])
+        self._write_progress()
+        self.output.flush()
+
+    def _write_lines(self, lines: list):
+        written = []
+        for line in lines:
+            # Backspace characters are at the end of Mitsuba progress lines
+            line = line.replace("\b", "")
+
+            if _PROGRESS_RE.search(line):
+                self._in_progress = True
+                self._progress_line = line
+                if time.monotonic() - self._progress_time >= (
+                    self.progress_interval
+                ):
+                    written.append(line)
+                    self._progress_line = None
+                    self._progress_time = time.monotonic()
+                continue
+
+            if not line and self._in_progress:
+                # Empty lines between updates of progress bars (in any
+                # chunk), other empty lines are kept
+                continue
+            self._in_progress = False
+
+            if self._progress_line is not None:
+                written.append(self._progress_line)
+                self._progress_line = None
+            written.append(line)
+
+        if written:
+            self.output.write("\n".join(written) + "\n")
+
+    def _write_progress(self):
+        if self._progress_line is not None:
+            self.output.write(self._progress_line + "\n")
+            self._progress_line = None
+
+
+class _PipeProtocol(asyncio.Protocol):
+    def __init__(self, stream: _OutputStream, closed: asyncio.Future):
+        self.stream = stream
+        self.closed = closed
+
+    def data_received(self, data: bytes):
+        self.stream.feed(data)
+
+    def connection_lost(self, exc):
+        self.stream.close()
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class ProcessSupervisor:
+    # Manages renderer subprocesses in a single asyncio event loop running
+    # in its own thread. Outputs of all subprocesses are read in large
+    # chunks by the loop and their ends are waited for by the loop as well,
+    # no thread is blocked by a running subprocess. Coroutines (e.g. jobs
+    # of the Scheduler) are run on the loop by call or submit.
+
+    def __init__(self, progress_interval: float = 1.0):
+        self.progress_interval = progress_interval
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="lteval-supervisor",
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        # Runs the coroutine on the loop, returns future of its result.
+        # Context (e.g. redirected output of the caller) is copied.
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def call(self, coroutine):
+        # Runs the coroutine on the loop and waits for its result,
+        # must not be called by the loop itself
+        return self.submit(coroutine).result()
+
+    def run(self, arguments: list, output=None) -> ProcessUsage:
+        # Runs the subprocess and waits for it (blocks the calling thread),
+        # returns its return code and resources it used
+        return self.call(self.run_async(arguments, output))
+
+    async def run_async(self, arguments: list, output=None) -> ProcessUsage:
+        # Runs the subprocess, returns its return code and resources it used.
+        # Output is written into the current output of the caller
+        # (see Logger.thread_output) if not specified otherwise.
+        if output is None:
+            output = _thread_output()
+
+        start_time = time.perf_counter()
+        process = _Popen(
+            arguments,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+
+        closed = self._loop.create_future()
+        stream = _OutputStream(output, self.progress_interval)
+        transport, _ = await self._loop.connect_read_pipe(
+            lambda: _PipeProtocol(stream, closed), process.stdout
+        )
+
+        try:
+            # Output is closed when the process ends
+            await closed
+        finally:
+            transport.close()
+
+        usage = await self._wait(process)
+        usage.wall_time = time.perf_counter() - start_time
+
+        return usage
+
+    async def _wait(self, process) -> ProcessUsage:
+        # End of the process is signalled by its file descriptor (Linux),
+        # it is polled otherwise
+        if sys.platform == "win32":
+            while process.poll() is None:
+                await asyncio.sleep(_EXIT_POLL_INTERVAL)
+            return _wait_windows(process)
+
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            pidfd = None
+
+        if pidfd is not None:
+            exited = self._loop.create_future()
+            self._loop.add_reader(
+                pidfd, lambda: exited.done() or exited.set_result(None)
+            )
+            try:
+                await exited
+            finally:
+                self._loop.remove_reader(pidfd)
+                os.close(pidfd)
+
+        while True:
+            usage = _wait(process, os.WNOHANG)
+            if usage is not None:
+                return usage
+            await asyncio.sleep(_EXIT_POLL_INTERVAL)
+
+
+def _wait(process, options: int = 0) -> ProcessUsage:
+    # Reaps the finished process and gets its resource usage,
+    # None if it is still running (with os.WNOHANG)
+    pid, status, rusage = os.wait4(process.pid, options)
+    if pid == 0:
+        return None
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # Maximum resident set size is in kilobytes (bytes on macOS)
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+
+    return ProcessUsage(
+        process.returncode,
+        None,
+        rusage.ru_utime,
+        rusage.ru_stime,
+        rusage.ru_maxrss * rss_unit,
+    )
+
+
+if sys.platform == "win32":
+
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    _kernel32 = ctypes.WinDLL("kernel32")
+    _kernel32.GetProcessTimes.argtypes = [wintypes.HANDLE] + [
+        ctypes.POINTER(wintypes.FILETIME)
+    ] * 4
+    _kernel32.K32GetProcessMemoryInfo.argtypes = [
+        wintypes.HANDLE,
+        ctypes.POINTER(_ProcessMemoryCounters),
+        wintypes.DWORD,
+    ]
+
+    def _wait_windows(process) -> ProcessUsage:
+        process.wait()
+
+        # Handle of the process stays open until the Popen object is deleted
+        handle = wintypes.HANDLE(int(process._handle))
+        times = [wintypes.FILETIME() for _ in range(4)]
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+
+        if not _kernel32.GetProcessTimes(
+            handle, *[ctypes.byref(t) for t in times]
+        ) or not _kernel32.K32GetProcessMemoryInfo(
+            handle, ctypes.byref(counters), counters.cb
+        ):
+            return ProcessUsage(process.returncode, None)
+
+        # FILETIME is in 100 ns units
+        kernel_time, user_time = (
+            ((t.dwHighDateTime << 32) + t.dwLowDateTime) / 1e7
+            for t in times[2:]
+        )
+
+        return ProcessUsage(
+            process.returncode,
+            None,
+            user_time,
+            kernel_time,
+            counters.PeakWorkingSetSize,
+        )
+
+
+def _thread_output():
+    stdout = sys.stdout
+    if hasattr(stdout, "thread_output"):
+        return stdout.thread_output()
+    return stdout
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor() -> ProcessSupervisor:
+    # Supervisor shared by all renderers, created on the first use
+    global _supervisor
+
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = ProcessSupervisor()
+
+    return _supervisor
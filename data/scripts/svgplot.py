@@ -0,0 +1,122 @@
+import math
+from xml.sax.saxutils import escape
+
+_COLORS = [
+    "#1f77b4",
+    "#ff7f0e",
+    "#2ca02c",
+    "#d62728",
+    "#9467bd",
+    "#8c564b",
+    "#e377c2",
+    "#7f7f7f",
+]
+
+_MARGIN_LEFT = 70
+_MARGIN_RIGHT = 130
+_MARGIN_TOP = 20
+_MARGIN_BOTTOM = 50
+
+
+def loglog_plot(
+    series: dict,
+    x_label: str,
+    y_label: str,
+    width: int = 560,
+    height: int = 340,
+) -> str:
+    # SVG line plot of series (name -> list of (x, y) points)
+    # with logarithmic axes, points with non-positive values are skipped
+    series = {
+        name: [(x, y) for x, y in points if x and y and x > 0 and y > 0]
+        for name, points in series.items()
+    }
+    xs = [x for points in series.values() for x, _ in points]
+    ys = [y for points in series.values() for _, y in points]
+    if not xs:
+        return ""
+
+    plot_width = width - _MARGIN_LEFT - _MARGIN_RIGHT
+    plot_height = height - _MARGIN_TOP - _MARGIN_BOTTOM
+    x_range = _decade_range(xs)
+    y_range = _decade_range(ys)
+
+    def to_svg(x, y):
+        return (
+            _MARGIN_LEFT + _scale(x, x_range) * plot_width,
+            _MARGIN_TOP + (1 - _scale(y, y_range)) * plot_height,
+        )
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+        f'height="{height}" font-family="sans-serif" font-size="11">',
+        f'<rect x="{_MARGIN_LEFT}" y="{_MARGIN_TOP}" width="{plot_width}" '
+        f'height="{plot_height}" fill="none" stroke="#999"/>',
+    ]
+
+    # Decade grid lines with labels
+    for exponent in range(x_range[0], x_range[1] + 1):
+        x, _ = to_svg(10**exponent, 10 ** y_range[0])
+        parts.append(
+            f'<line x1="{x:.1f}" y1="{_MARGIN_TOP}" x2="{x:.1f}" '
+            f'y2="{_MARGIN_TOP + plot_height}" stroke="#ddd"/>'
+            f'<text x="{x:.1f}" y="{_MARGIN_TOP + plot_height + 15}" '
+            f'text-anchor="middle">1e{exponent}</text>'
+        )
+    for exponent in range(y_range[0], y_range[1] + 1):
+        _, y = to_svg(10 ** x_range[0], 10**exponent)
+        parts.append(
+            f'<line x1="{_MARGIN_LEFT}" y1="{y:.1f}" '
+            f'x2="{_MARGIN_LEFT + plot_width}" y2="{y:.1f}" stroke="#ddd"/>'
+            f'<text x="{_MARGIN_LEFT - 5}" y="{y + 4:.1f}" '
+            f'text-anchor="end">1e{exponent}</text>'
+        )
+
+    parts.append(
+        f'<text x="{_MARGIN_LEFT + plot_width / 2:.1f}" y="{height - 10}" '
+        f'text-anchor="middle">{escape(x_label)}</text>'
+        f'<text x="15" y="{_MARGIN_TOP + plot_height / 2:.1f}" '
+        f'text-anchor="middle" transform="rotate(-90 15 '
+        f'{_MARGIN_TOP + plot_height / 2:.1f})">{escape(y_label)}</text>'
+    )
+
+    # Series with their legend
+    for index, (name, points) in enumerate(series.items()):
+        color = _COLORS[index % len(_COLORS)]
+        svg_points = " ".join(
+            "{:.1f},{:.1f}".format(*to_svg(x, y)) for x, y in sorted(points)
+        )
+        parts.append(
+            f'<polyline points="{svg_points}" fill="none" '
+            f'stroke="{color}" stroke-width="2"/>'
+        )
+        for x, y in points:
+            svg_x, svg_y = to_svg(x, y)
+            parts.append(
+                f'<circle cx="{svg_x:.1f}" cy="{svg_y:.1f}" r="3" '
+                f'fill="{color}"/>'
+            )
+
+        legend_y = _MARGIN_TOP + 10 + index * 16
+        legend_x = _MARGIN_LEFT + plot_width + 10
+        parts.append(
+            f'<line x1="{legend_x}" y1="{legend_y}" x2="{legend_x + 20}" '
+            f'y2="{legend_y}" stroke="{color}" stroke-width="2"/>'
+            f'<text x="{legend_x + 25}" y="{legend_y + 4}">'
+            f"{escape(name)}</text>"
+        )
+
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def _decade_range(values: list) -> tuple:
+    # Exponents of decades enclosing all values
+    low = math.floor(math.log10(min(values)))
+    high = math.ceil(math.log10(max(values)))
+    return low, max(high, low + 1)
+
+
+def _scale(value: float, decade_range: tuple) -> float:
+    low, high = decade_range
+    return (math.log10(value) - low) / (high - low)
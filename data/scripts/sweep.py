@@ -0,0 +1,94 @@
+import itertools
+
+# Parameter sweeps - test cases generated from a template test case
+# by setting its parameters (axes) to all combinations of their values
+# ("product" mode) or to values at the same positions ("zip" mode).
+# Axis: [element, parameter name, parameter type, values], e.g.
+# ["integrator", "maxDepth", "integer", range(1, 33)].
+SWEEP_MODES = ["product", "zip"]
+
+
+def check_sweep(sweep) -> str:
+    # Returns description of the problem of an invalid specification
+    if not isinstance(sweep, dict) or not sweep.get("axes"):
+        return 'must be a dictionary with a non-empty list of "axes"'
+
+    for axis in sweep["axes"]:
+        if not isinstance(axis, (list, tuple)) or len(axis) != 4:
+            return (
+                "axes must be lists: "
+                "[element, parameter name, parameter type, values]"
+            )
+        try:
+            if not axis_values(axis):
+                return f'values of axis "{axis[1]}" must not be empty'
+        except TypeError:
+            return f'values of axis "{axis[1]}" must be iterable'
+
+    mode = sweep.get("mode", "product")
+    if mode not in SWEEP_MODES:
+        return f"mode must be one of: {', '.join(SWEEP_MODES)}"
+    if mode == "zip" and len(set(map(len, sweep_axes_values(sweep)))) > 1:
+        return 'axes of the "zip" mode must have the same number of values'
+
+    if "name" in sweep:
+        try:
+            point_name("", sweep, next(sweep_points(sweep)))
+        except (KeyError, IndexError, ValueError) as e:
+            return f'name "{sweep["name"]}" can not be formatted ({e})'
+
+    return None
+
+
+def axis_values(axis) -> tuple:
+    return tuple(axis[3])
+
+
+def sweep_axes_values(sweep: dict) -> list:
+    return [axis_values(axis) for axis in sweep["axes"]]
+
+
+def sweep_size(sweep: dict) -> int:
+    sizes = [len(values) for values in sweep_axes_values(sweep)]
+    if sweep.get("mode", "product") == "zip":
+        return min(sizes)
+
+    size = 1
+    for axis_size in sizes:
+        size *= axis_size
+    return size
+
+
+def sweep_points(sweep: dict, axes_values: list = None):
+    # Iterator of values of the axes of points of the sweep (one by one)
+    axes_values = axes_values or sweep_axes_values(sweep)
+    if sweep.get("mode", "product") == "zip":
+        return zip(*axes_values)
+    return itertools.product(*axes_values)
+
+
+def point_name(name: str, sweep: dict, values: tuple) -> str:
+    # Name of the test case of the point - formatted by the name
+    # of the sweep (values by position or by parameter names)
+    # or the name of the template followed by parameter names and values
+    if "name" in sweep:
+        return sweep["name"].format(
+            *values,
+            **{axis[1]: value for axis, value in zip(sweep["axes"], values)},
+        )
+
+    return "_".join(
+        [name]
+        + [f"{axis[1]}{value}" for axis, value in zip(sweep["axes"], values)]
+    )
+
+
+def point_parameters(sweep: dict, values: tuple) -> dict:
+    # Parameters of the point merged over parameters of the template
+    parameters = {}
+    for axis, value in zip(sweep["axes"], values):
+        element, param_name, param_type = axis[:3]
+        parameters.setdefault(element, []).append(
+            [param_name, param_type, value]
+        )
+    return parameters
@@ -1,19 +1,36 @@
 import copy
-from copy import deepcopy
+import hashlib
+
+from data.scripts.convergence import check_convergence
+from data.scripts.refbuild import check_reference
+from data.scripts.sweep import (
+    check_sweep,
+    point_name,
+    point_parameters,
+    sweep_axes_values,
+    sweep_points,
+    sweep_size,
+)
+from data.scripts.variance import check_variance
 
 
 class ParameterSet:
-    # Parameter set representation
+    # Parameter set representation.
+    # Parameters are a dictionary of element name -> tuple of parameters
+    # (name, type, value) without duplicates, sorted by their type.
+    # Parameter lists are never modified, merged sets share lists
+    # (and whole dictionaries) which were not changed by the merge.
 
     def __init__(self, params: dict = {}):
         self.base_unresolved = []
-        self.parameters = copy.deepcopy(params)
+        self.parameters = {}
         self._resolved = False
 
-        if "base" in self.parameters:
-            self.base_unresolved = self.parameters["base"]
-            del self.parameters["base"]
-        pass
+        for param_name, paramlist in params.items():
+            if param_name == "base":
+                self.base_unresolved = list(paramlist)
+            else:
+                self.parameters[param_name] = _resolve_paramlist(paramlist)
 
     def __str__(self):
         return (
@@ -25,77 +42,132 @@ class ParameterSet:
         # Parameter set is ready to be used if all of its bases were resolved
         return self._resolved and not self.base_unresolved
 
-    def resolve_base(self, paramset_dictionary: dict):
-        new_base_unresolved = []
-        current = ParameterSet()
-
-        # Iterate over unresolved bases, and merge them together in their order
-        for base_name in self.base_unresolved:
-            if base_name in paramset_dictionary:
-                # paramset_dictionary should not have unresolved baseS
-                assert paramset_dictionary[base_name].is_ready()
-                current.merge_with(paramset_dictionary[base_name])
-            else:
-                new_base_unresolved.append(base_name)
-
-        # Merge current with self (ParamSet object)
-        # Current represents its resolved bases
-        current.merge_with(self)
-
-        # Update this ParamSet object with resolved bases
-        self.base_unresolved = new_base_unresolved
-        self.parameters = current.parameters
+    def resolve_base(
+        self, paramset_dictionary: dict, merged_bases: dict = None
+    ):
+        # Bases are merged together in their order, merged bases are
+        # memoised by their names in merged_bases (if given)
+        base_names = tuple(self.base_unresolved)
+        if merged_bases is not None and base_names in merged_bases:
+            parameters, new_base_unresolved = merged_bases[base_names]
+        else:
+            parameters = {}
+            new_base_unresolved = []
+            for base_name in base_names:
+                if base_name in paramset_dictionary:
+                    # Unresolved bases of the base (not defined) are kept
+                    base = paramset_dictionary[base_name]
+                    parameters = _merge_parameters(parameters, base.parameters)
+                    new_base_unresolved.extend(base.base_unresolved)
+                else:
+                    new_base_unresolved.append(base_name)
+
+            if merged_bases is not None:
+                merged_bases[base_names] = (parameters, new_base_unresolved)
+
+        # Own parameters override parameters of the bases
+        self.base_unresolved = list(new_base_unresolved)
+        self.parameters = _merge_parameters(parameters, self.parameters)
         self._resolved = True
 
     def merge_with(self, paramset: "ParameterSet"):
-        self.base_unresolved.extend(paramset.base_unresolved)
-        self._merge_parameters_with(paramset.parameters)
-
-    def _merge_parameters_with(self, parameters: dict):
-        # Copy other parameter set - we will delete keys from it
-        parameters_cpy = copy.deepcopy(parameters)
-
-        # Go over all keys of current parameter set
-        for param_name, paramlist in self.parameters.items():
-            if param_name not in parameters_cpy:
-                continue
-
-            # If other set has same key - merge it
-            self.parameters[param_name] = self._merge_paramlists(
-                paramlist, parameters_cpy[param_name]
-            )
-            del parameters_cpy[param_name]  # And delete it from the other
+        self.base_unresolved = self.base_unresolved + paramset.base_unresolved
+        self.parameters = _merge_parameters(
+            self.parameters, paramset.parameters
+        )
 
-        # Resolve lists under other keys
-        # (resolves duplicate params and sorts them)
-        for param_name, paramlist in parameters_cpy.items():
-            parameters_cpy[param_name] = self._resolve_paramlist(paramlist)
 
-        # Update current parameter set with remaining keys
-        self.parameters.update(parameters_cpy)
+def _merge_parameters(a: dict, b: dict) -> dict:
+    # Parameters of b merged over parameters of a (new dictionary
+    # unless one of them is empty), lists of only one of them are shared
+    if not b:
+        return a
+    if not a:
+        return b
+
+    merged = dict(a)
+    for param_name, paramlist in b.items():
+        merged[param_name] = (
+            _resolve_paramlist(a[param_name] + paramlist)
+            if param_name in a
+            else paramlist
+        )
+    return merged
 
-    def _merge_paramlists(self, a: list, b: list) -> list:
-        return self._resolve_paramlist(a + b)
 
-    def _resolve_paramlist(self, paramlist: list) -> list:
-        dic = {}
-        res = []
+def _resolve_paramlist(paramlist) -> tuple:
+    # Last parameter of name & type is kept (at the position of the first),
+    # list is sorted based on the second (type) column
+    dic = {}
+    for param in paramlist:
+        dic[tuple(param[0:2])] = param[2]
 
-        # Last parameter of name & value should be saved
-        for param in paramlist:
-            key = tuple(param[0:2])
-            dic[key] = param[2]
+    return tuple(
+        sorted(
+            (key + (value,) for key, value in dic.items()),
+            key=lambda x: x[1],
+        )
+    )
 
-        # Convert dictionary back to a parameter list
-        for key, val in dic.items():
-            param = list(key)
-            param.append(val)
-            res.append(param)
 
-        # Sort list based on the second (type) column
-        res.sort(key=lambda x: x[1])
+def resolve_parameter_sets(sets_data: dict) -> dict:
+    # Parameter sets resolved in topological order of their bases
+    # (each set once, after all of its bases), returns name -> set.
+    # Bases which are not defined stay unresolved.
+    param_sets = {}
+    merged_bases = {}
+    for set_name in _sorted_by_bases(sets_data):
+        param_set = ParameterSet(sets_data[set_name])
+        param_set.resolve_base(param_sets, merged_bases)
+        param_sets[set_name] = param_set
+
+    return param_sets
+
+
+def _sorted_by_bases(sets_data: dict) -> list:
+    # Names of parameter sets, every set after its bases (depth-first
+    # search without recursion, base chains may be long).
+    # Cyclic dependency is reported with the chain of the cycle.
+    def bases(set_name: str) -> list:
+        return [
+            base_name
+            for base_name in sets_data[set_name].get("base", [])
+            if base_name in sets_data
+        ]
+
+    sorted_names = []
+    visited = set()
+    for root_name in sets_data:
+        if root_name in visited:
+            continue
+
+        visited.add(root_name)
+        path = [root_name]  # current chain of bases
+        on_path = {root_name}
+        stack = [iter(bases(root_name))]
+        while stack:
+            base_name = next(stack[-1], None)
+            if base_name is None:
+                # All bases of the set are sorted
+                stack.pop()
+                on_path.remove(path[-1])
+                sorted_names.append(path.pop())
+            elif base_name in on_path:
+                chain = path[path.index(base_name) :] + [base_name]
+                print(
+                    '"parameter_sets" could not be resolved '
+                    'because of cyclic "base" dependency: '
+                    + " -> ".join(f'"{name}"' for name in chain)
+                    + "."
+                )
+                exit(1)
+            elif base_name not in visited:
+                visited.add(base_name)
+                path.append(base_name)
+                on_path.add(base_name)
+                stack.append(iter(bases(base_name)))
 
-        return res
+    return sorted_names
 
 
 class TestCase:
@@ -108,6 +180,20 @@ class TestCase:
             if "params" in data
             else ParameterSet()
         )
+        # Equal-time mode - sample count is calibrated to fit the time budget
+        self.time_budget = (
+            data["time_budget"] if "time_budget" in data else None
+        )
+        # Convergence mode - rendered with a ladder of sample counts
+        self.convergence = (
+            data["convergence"] if "convergence" in data else None
+        )
+        # Reference mode - rendered by independent chunks (seeds) merged
+        # into a checkpoint which is extended by following runs
+        self.reference = data["reference"] if "reference" in data else None
+        # Variance mode - rendered with several seeds, their mean
+        # and variance give bias, variance and efficiency of the test case
+        self.variance = data["variance"] if "variance" in data else None
 
     def __str__(self):
         return (
@@ -118,6 +204,69 @@ class TestCase:
     def is_ready(self) -> bool:
         return self.parameter_set.is_ready()
 
+    def derive(self, name: str, parameters: dict) -> "TestCase":
+        # Copy of the (resolved) test case with a different name
+        # and given parameters merged over its own
+        derived = copy.copy(self)
+        derived.name = name
+        derived.parameter_set = copy.copy(self.parameter_set)
+        derived.parameter_set.merge_with(ParameterSet(parameters))
+
+        return derived
+
+
+class TestCaseSweep:
+    # Test cases generated by a sweep of parameters of a template test case
+    # (entry of the configuration without its "sweep"), they are created
+    # one by one when the sweep is iterated and never kept together.
+
+    def __init__(self, data: dict):
+        self.name = data["name"]
+        self.renderer = data["renderer"]
+        self.sweep = data["sweep"]
+        self.template = TestCase(
+            {key: value for key, value in data.items() if key != "sweep"}
+        )
+        self._axes_values = None
+
+    def __len__(self) -> int:
+        return sweep_size(self.sweep)
+
+    def __iter__(self):
+        for values in self._points():
+            yield self.template.derive(
+                point_name(self.name, self.sweep, values),
+                point_parameters(self.sweep, values),
+            )
+
+    def names(self):
+        # Names of generated test cases (without creating them)
+        for values in self._points():
+            yield point_name(self.name, self.sweep, values)
+
+    def _points(self):
+        if self._axes_values is None:
+            self._axes_values = sweep_axes_values(self.sweep)
+        return sweep_points(self.sweep, self._axes_values)
+
+
+def iterate_test_cases(test_cases: list):
+    # Test cases with sweeps expanded (lazily)
+    for test_case in test_cases:
+        if isinstance(test_case, TestCaseSweep):
+            yield from test_case
+        else:
+            yield test_case
+
+
+def test_case_templates(test_cases: list) -> list:
+    # Test cases with templates instead of sweeps (generated test cases
+    # differ only in parameters, they have the same renderer and mode)
+    return [
+        tc.template if isinstance(tc, TestCaseSweep) else tc
+        for tc in test_cases
+    ]
+
 
 def load_test_cases(cfg_mod) -> list:
     # Mandatory attributes
@@ -132,51 +281,26 @@ def load_test_cases(cfg_mod) -> list:
         exit(1)
 
     # Load parameter_sets
+    # Their bases must be resolved before they are applied to test cases
     param_sets = {}
     if hasattr(cfg_mod, "parameter_sets") and isinstance(
         cfg_mod.parameter_sets, dict
     ):
-        # Their bases must be resolved before they are applied to test cases
-        unresolved_param_sets = {}
-        unresolved_names = set()
-
-        # Create corresponding parameter sets (all unresolved)
-        for set_name, set_data in cfg_mod.parameter_sets.items():
-            unresolved_param_sets[set_name] = ParameterSet(set_data)
-            unresolved_names.add(set_name)
-
-        # Until there are no unresolved parameter sets
-        while unresolved_names:
-            any_resolved = False
-
-            # Check every unresolved set
-            for unresolved_name in list(unresolved_names):
-                unresolved_set = unresolved_param_sets[unresolved_name]
-
-                # If its bases are not resolved already
-                if not unresolved_names.intersection(
-                    set(unresolved_set.base_unresolved)
-                ):
-                    # If they are, resolve the set
-                    unresolved_set.resolve_base(param_sets)
-                    param_sets[unresolved_name] = unresolved_set
-                    unresolved_names.remove(unresolved_name)
-                    any_resolved = True
-
-            # If no set was resolved, further iterations wont help
-            # There is a dependency cycle on base clases
-            if not any_resolved:
-                print(
-                    '"parameter_sets" could not be resolved '
-                    ' because of cyclic "base" dependency.'
-                )
-                exit(1)
+        param_sets = resolve_parameter_sets(cfg_mod.parameter_sets)
 
     # Load (and resolve) test cases
+    # (test cases with the same bases share their merged parameters),
+    # sweeps are kept unexpanded with their resolved template
     test_cases = []
+    merged_bases = {}
     for case_data in cfg_mod.test_cases:
-        test_case = TestCase(case_data)
-        test_case.parameter_set.resolve_base(param_sets)
+        if "sweep" in case_data:
+            test_case = TestCaseSweep(case_data)
+            parameter_set = test_case.template.parameter_set
+        else:
+            test_case = TestCase(case_data)
+            parameter_set = test_case.parameter_set
+        parameter_set.resolve_base(param_sets, merged_bases)
         test_cases.append(test_case)
 
     # Check if all test cases are properly loaded and resolved
@@ -189,15 +313,83 @@ def load_test_cases(cfg_mod) -> list:
 def _ready_check_test_cases(test_cases: list):
     # Check if test cases have unique names
     # and if their parameter sets are ready.
+    # Sweeps are checked by their templates and names of generated cases.
+    # Names are kept as short digests (sweeps may generate many of them).
 
     test_case_uq_names = set()
+    duplicate_names = False
     test_failed = False
 
     for test_case in test_cases:
-        if test_case.name in test_case_uq_names:
-            print(f'Test case: "{test_case.name}" is defined multiple times!')
+        case_names = [test_case.name]
+        if isinstance(test_case, TestCaseSweep):
+            problem = check_sweep(test_case.sweep)
+            if problem:
+                test_failed = True
+                case_names = []
+                print(f'Sweep of test case: "{test_case.name}" {problem}!')
+            else:
+                case_names = test_case.names()
+
+        for case_name in case_names:
+            name_digest = hashlib.blake2b(
+                case_name.encode("utf-8"), digest_size=16
+            ).digest()
+            if name_digest in test_case_uq_names:
+                duplicate_names = True
+                print(f'Test case: "{case_name}" is defined multiple times!')
+            test_case_uq_names.add(name_digest)
+
+        if isinstance(test_case, TestCaseSweep):
+            test_case = test_case.template
+
+        if test_case.time_budget is not None and not (
+            isinstance(test_case.time_budget, (int, float))
+            and test_case.time_budget > 0
+        ):
+            test_failed = True
+            print(
+                f'Time budget of test case: "{test_case.name}" '
+                f"must be a positive number of seconds!"
+            )
+
+        if test_case.convergence is not None:
+            problem = check_convergence(test_case.convergence)
+            if test_case.time_budget is not None:
+                problem = "can not be combined with a time budget"
+            if problem:
+                test_failed = True
+                print(
+                    f'Convergence of test case: "{test_case.name}" '
+                    f"{problem}!"
+                )
+
+        if test_case.reference is not None:
+            problem = check_reference(test_case.reference)
+            if (
+                test_case.time_budget is not None
+                or test_case.convergence is not None
+            ):
+                problem = (
+                    "can not be combined with a time budget or convergence"
+                )
+            if problem:
+                test_failed = True
+                print(
+                    f'Reference of test case: "{test_case.name}" '
+                    f"{problem}!"
+                )
 
-        test_case_uq_names.add(test_case.name)
+        if test_case.variance is not None:
+            problem = check_variance(test_case.variance)
+            if (
+                test_case.convergence is not None
+                or test_case.reference is not None
+            ):
+                problem = "can not be combined with convergence or reference"
+            if problem:
+                test_failed = True
+                print(f'Variance of test case: "{test_case.name}" {problem}!')
 
         if not test_case.is_ready():
             test_failed = True
@@ -208,7 +400,7 @@ def _ready_check_test_cases(test_cases: list):
                 f"{test_case}"
             )
 
-    if len(test_case_uq_names) != len(test_cases):
+    if duplicate_names:
         print("Test case names must be unique identifiers!")
         exit(1)
 
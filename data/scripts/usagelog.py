@@ -0,0 +1,67 @@
+import json
+import pathlib
+import threading
+
+import data.scripts.convergence as convergence
+
+
+class UsageLog:
+    # Machine-readable record of resources used for rendering of test cases
+    # of one output directory (wall time, user and system CPU time,
+    # peak RSS, ...). Append-only - each line is a JSON object with scene
+    # and test case names and the usage, a later line of the same scene
+    # and test case (e.g. of a resumed run) replaces an earlier one.
+
+    def __init__(self, file_path: pathlib.Path, append: bool = False):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+        # Usage of jobs skipped by a resumed run is kept
+        self._file = self.file_path.open("a" if append else "w", buffering=1)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, job):
+        if job.usage is None:
+            return
+
+        entry = {"scene": job.scene.name, "case": job.test_case.name}
+        entry.update(job.usage.to_dict())
+        entry["cached"] = job.cached
+        if job.sample_count is not None:
+            entry["sample_count"] = job.sample_count
+        if job.test_case.time_budget is not None:
+            entry["time_budget"] = job.test_case.time_budget
+        if isinstance(job.part, convergence.ConvergenceStep):
+            entry["convergence_case"] = job.part.test_case.name
+            entry["errors"] = job.errors
+
+        with self._lock:
+            self._file.write(json.dumps(entry, sort_keys=True) + "\n")
+
+    def __del__(self):
+        self.close()
+
+
+def load_usages(file_path: pathlib.Path) -> dict:
+    # Usages of an output directory: scene name -> test case name -> usage,
+    # empty if they were not recorded
+    usages = {}
+    try:
+        with file_path.open("r") as f:
+            for line in f:
+                try:
+                    usage = json.loads(line)
+                except ValueError:
+                    # Partially written line (e.g. of an interrupted run)
+                    continue
+                usages.setdefault(usage.pop("scene"), {})[
+                    usage.pop("case")
+                ] = usage
+    except OSError:
+        pass
+
+    return usages
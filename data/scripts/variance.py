@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import pathlib
+import tempfile
+import threading
+
+import data.scripts.exrimage as exrimage
+import data.scripts.metrics as metrics
+
+# Variance test cases - the scene is rendered with several independent
+# seeds of the renderer, per pixel mean and variance of the renderings
+# separate the error of a single rendering (relative MSE compared
+# to the reference) into its variance and squared bias. Efficiency
+# of the test case is 1 / (relMSE * time of a single rendering).
+
+# Images are accumulated by blocks of rows, memory does not depend
+# on their size
+_ACCUMULATION_ROWS = 64
+
+
+def check_variance(variance) -> str:
+    # Returns description of the problem of an invalid specification
+    if not isinstance(variance, dict) or "seeds" not in variance:
+        return 'must be a dictionary with "seeds"'
+
+    if not isinstance(variance["seeds"], int) or variance["seeds"] < 2:
+        return "seeds must be an integer, at least 2"
+
+    seed_parameter = variance.get("seed_parameter")
+    if seed_parameter is not None and not (
+        isinstance(seed_parameter, (list, tuple)) and len(seed_parameter) == 3
+    ):
+        return "seed_parameter must be a list: [element, name, type]"
+
+    return None
+
+
+class SeedGroup:
+    # Jobs rendering seeds of one scene and variance test case,
+    # statistics are computed when the last of them finishes
+
+    def __init__(self, seed_count: int, statistics_path: pathlib.Path):
+        self.seed_count = seed_count
+        self.statistics_path = statistics_path
+        self.jobs = []
+        self._lock = threading.Lock()
+
+    def finish(self, job) -> bool:
+        # True for the job finishing the group (exactly once)
+        with self._lock:
+            self.jobs.append(job)
+            return len(self.jobs) == self.seed_count
+
+
+class VarianceSeed:
+    # Part of a job rendering one of the seeds of the test case
+
+    def __init__(self, test_case, seed: int, group: SeedGroup):
+        self.test_case = test_case
+        self.seed = seed
+        self.group = group
+
+
+def seed_statistics(
+    image_paths: list, reference_path: pathlib.Path, wall_times: list
+) -> dict:
+    # Errors of a single rendering estimated from renderings with different
+    # seeds (averaged over pixels and channels, relative to the reference
+    # as relMSE): relmse = variance + bias2. Images are read together
+    # by blocks of rows, mean and variance of a block are computed
+    # for all seeds at once.
+    import numpy
+
+    seed_count = len(image_paths)
+    width, height = exrimage.read_exr_size(reference_path)
+    for image_path in image_paths:
+        if exrimage.read_exr_size(image_path) != (width, height):
+            raise ValueError(
+                f'Image "{image_path}" and its reference "{reference_path}" '
+                f"differ in size."
+            )
+
+    sums = {"relmse": 0.0, "variance": 0.0, "bias2": 0.0}
+    value_count = 0
+    for reference, *images in zip(
+        exrimage.read_exr_rows(reference_path, _ACCUMULATION_ROWS),
+        *(
+            exrimage.read_exr_rows(image_path, _ACCUMULATION_ROWS)
+            for image_path in image_paths
+        ),
+    ):
+        seeds = numpy.stack(images).astype(numpy.float64)
+        mean = numpy.mean(seeds, axis=0)
+        variance = numpy.var(seeds, axis=0, ddof=1)
+        weights = metrics.relative_weights(reference.astype(numpy.float64))
+
+        sums["relmse"] += numpy.sum(
+            numpy.mean(numpy.square(seeds - reference), axis=0) * weights
+        )
+        sums["variance"] += numpy.sum(variance * weights)
+        # Squared difference of the mean is biased by variance of the mean
+        sums["bias2"] += numpy.sum(
+            (numpy.square(mean - reference) - variance / seed_count) * weights
+        )
+        value_count += reference.size
+
+    statistics = {"seeds": seed_count}
+    for name, value in sums.items():
+        value = float(value / value_count)
+        statistics[name] = value if math.isfinite(value) else None
+    if statistics["bias2"] is not None:
+        # Estimate of a small bias may be negative
+        statistics["bias2"] = max(statistics["bias2"], 0.0)
+
+    statistics["wall_time"] = (
+        sum(wall_times) / seed_count
+        if all(wall_time is not None for wall_time in wall_times)
+        else None
+    )
+    statistics["efficiency"] = (
+        1 / (statistics["relmse"] * statistics["wall_time"])
+        if statistics["relmse"] and statistics["wall_time"]
+        else None
+    )
+
+    return statistics
+
+
+def write_statistics(file_path: pathlib.Path, statistics: dict):
+    # Written atomically, readers never see a partial file
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path_str = tempfile.mkstemp(
+        suffix=".tmp", dir=str(file_path.parent)
+    )
+    with os.fdopen(fd, "w") as f:
+        json.dump(statistics, f, indent=4)
+    os.replace(tmp_path_str, file_path)
+
+
+def load_statistics(variance_dir_path: pathlib.Path) -> dict:
+    # Statistics of an output directory: scene name -> test case name
+    # -> statistics, empty if there are none
+    statistics = {}
+    for file_path in sorted(variance_dir_path.glob("*/*.json")):
+        try:
+            with file_path.open("r") as f:
+                statistics.setdefault(file_path.parent.name, {})[
+                    file_path.stem
+                ] = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    return statistics
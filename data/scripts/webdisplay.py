@@ -1,31 +1,227 @@
+import email.utils
+import functools
+import gzip
+import io
 import os
 import pathlib
+import re
+import threading
+import urllib.parse
 import webbrowser
 
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 
+# Files with version in their URL (?v=..., see WebGenerator) never change,
+# browsers cache them for a year without revalidation
+_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
 
-class NoCacheHTTPRequestHandler(SimpleHTTPRequestHandler):
-    # Based on: https://stackoverflow.com/a/25708957
-    def end_headers(self):
-        self.send_my_headers()
-        SimpleHTTPRequestHandler.end_headers(self)
+# Text assets served compressed (precompressed .gz file if up to date)
+_COMPRESSED_SUFFIXES = {
+    ".html",
+    ".js",
+    ".json",
+    ".map",
+    ".css",
+    ".svg",
+    ".wasm",
+    ".txt",
+}
+# Files compressed on the fly are cached (in memory)
+_COMPRESSED_CACHE_SIZE = 64
 
-    def send_my_headers(self):
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class CachingHTTPRequestHandler(SimpleHTTPRequestHandler):
+    # Serves files with validators (ETag, Last-Modified) answering
+    # conditional requests with 304 Not Modified, versioned files
+    # are cached as immutable. Supports single byte Range requests
+    # and gzip compression of text assets.
+    protocol_version = "HTTP/1.1"
+
+    _compressed_cache = {}  # (path, size, mtime) -> compressed data
+    _compressed_lock = threading.Lock()
+
+    # Remaining length of the requested range
+    _remaining = None
+
+    def send_head(self):
+        self._remaining = None
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            # Directories (index files, listings) and errors
+            return super().send_head()
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}'
+        compress = (
+            os.path.splitext(path)[1].lower() in _COMPRESSED_SUFFIXES
+            and "gzip" in self.headers.get("Accept-Encoding", "")
+            and "Range" not in self.headers
+        )
+        etag += '-gzip"' if compress else '"'
+
+        if self._is_not_modified(etag, stat.st_mtime):
+            self.send_response(304)
+            self._send_cache_headers(etag, stat, path)
+            self.end_headers()
+            return None
+
+        if compress:
+            data = self._compressed(path, stat)
+            self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self._send_cache_headers(etag, stat, path)
+            self.end_headers()
+            return io.BytesIO(data)
+
+        byte_range = self._byte_range(etag, stat.st_size)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{stat.st_size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        f = open(path, "rb")
+        if byte_range is None:
+            self.send_response(200)
+            self.send_header("Content-Length", str(stat.st_size))
+        else:
+            start, end = byte_range
+            f.seek(start)
+            self._remaining = end - start + 1
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{end}/{stat.st_size}"
+            )
+            self.send_header("Content-Length", str(self._remaining))
+        self.send_header("Content-Type", self.guess_type(path))
+        self._send_cache_headers(etag, stat, path)
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        # Only the requested range of the file is sent
+        if self._remaining is None:
+            return super().copyfile(source, outputfile)
+
+        while self._remaining > 0:
+            chunk = source.read(min(self._remaining, 1 << 16))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self._remaining -= len(chunk)
+        self._remaining = None
+
+    def _send_cache_headers(self, etag: str, stat, path: str):
+        query = urllib.parse.urlsplit(self.path).query
+        if "v" in urllib.parse.parse_qs(query):
+            self.send_header(
+                "Cache-Control",
+                f"public, max-age={_IMMUTABLE_MAX_AGE}, immutable",
+            )
+        else:
+            # Unversioned files may change (e.g. regenerated webpage)
+            self.send_header("Cache-Control", "no-cache")
+
+        self.send_header("ETag", etag)
         self.send_header(
-            "Cache-Control", "no-cache, no-store, must-revalidate"
+            "Last-Modified", self.date_time_string(int(stat.st_mtime))
         )
-        self.send_header("Pragma", "no-cache")
-        self.send_header("Expires", "0")
+        self.send_header("Accept-Ranges", "bytes")
+        if os.path.splitext(path)[1].lower() in _COMPRESSED_SUFFIXES:
+            self.send_header("Vary", "Accept-Encoding")
 
+    def _is_not_modified(self, etag: str, mtime: float) -> bool:
+        if "If-None-Match" in self.headers:
+            etags = [
+                tag.strip() for tag in self.headers["If-None-Match"].split(",")
+            ]
+            return etag in etags or "*" in etags
 
-def display_webpage(server_dir_path: pathlib.Path, port=8000):
-    # Change current (shell) directory to the directory of the lteval web
-    os.chdir(server_dir_path)
+        if "If-Modified-Since" in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(
+                    self.headers["If-Modified-Since"]
+                )
+            except (TypeError, ValueError, IndexError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+
+        return False
+
+    def _byte_range(self, etag: str, size: int):
+        # Requested (start, end) of the file, None for the whole file,
+        # False if the range can not be satisfied
+        if "Range" not in self.headers:
+            return None
+        # Range of a changed file is not valid, whole file is sent
+        if self.headers.get("If-Range", etag) != etag:
+            return None
+
+        match = _RANGE_RE.match(self.headers["Range"].strip())
+        if not match or match.group(1) == match.group(2) == "":
+            # Multiple ranges are not supported
+            return None
+
+        start, end = match.groups()
+        if start == "":
+            # Suffix range - last bytes of the file
+            length = int(end)
+            if length == 0:
+                return False
+            return max(0, size - length), size - 1
 
-    # Prepare server with disabled caching
-    # (serves data from the current directory)
-    server = HTTPServer(("localhost", port), SimpleHTTPRequestHandler)
+        start = int(start)
+        end = size - 1 if end == "" else min(int(end), size - 1)
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    def _compressed(self, path: str, stat) -> bytes:
+        # Precompressed file is used if it is not older than the file
+        gz_path = path + ".gz"
+        if (
+            os.path.isfile(gz_path)
+            and os.stat(gz_path).st_mtime_ns >= stat.st_mtime_ns
+        ):
+            with open(gz_path, "rb") as f:
+                return f.read()
+
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        cache = CachingHTTPRequestHandler._compressed_cache
+        with CachingHTTPRequestHandler._compressed_lock:
+            if key in cache:
+                return cache[key]
+
+        with open(path, "rb") as f:
+            data = gzip.compress(f.read(), compresslevel=6)
+
+        with CachingHTTPRequestHandler._compressed_lock:
+            if len(cache) >= _COMPRESSED_CACHE_SIZE:
+                del cache[next(iter(cache))]
+            cache[key] = data
+        return data
+
+
+def display_webpage(server_dir_path: pathlib.Path, port=8000):
+    # Threaded server (files are loaded by the browser in parallel)
+    # serving data from the directory of the lteval web
+    server = ThreadingHTTPServer(
+        ("localhost", port),
+        functools.partial(
+            CachingHTTPRequestHandler, directory=str(server_dir_path)
+        ),
+    )
+    server.daemon_threads = True
 
     # Open webpage
     webbrowser.open("http://localhost:" + str(port) + "/")
@@ -1,15 +1,28 @@
+import hashlib
 import json
+import os
 import pathlib
+import shutil
+import tempfile
 import dominate
 from dominate.tags import *
-from distutils.dir_util import copy_tree
 
 import data.scripts.outputconst as out
+import data.scripts.exrimage as exrimage
 import data.scripts.futils as futils
+import data.scripts.metrics as metrics
+import data.scripts.variance as variance
+from data.scripts.references import ReferenceStore
+from data.scripts.svgplot import loglog_plot
+from data.scripts.usagelog import load_usages
+
+# Version of generated scene pages, pages generated by other versions
+# of the generator are regenerated
+_MANIFEST_VERSION = 1
 
 
 class WebGenerator:
-    def __init__(self, dir_path: pathlib.Path):
+    def __init__(self, dir_path: pathlib.Path, pairwise_errors: bool = False):
         self.dir_path = dir_path.resolve()
         self.scenes_dir_path = (dir_path / out.scenes_dir).resolve()
         self.web_dir_path = (dir_path / out.web_dir).resolve()
@@ -29,6 +42,23 @@ class WebGenerator:
 
         self._cfg_test_cases = []
 
+        # Error images of all pairs of images and references (computed
+        # by the viewer on demand) instead of precomputed error maps
+        # of images compared to their references
+        self.pairwise_errors = pairwise_errors
+
+        # Resources used for rendering of test cases (if recorded)
+        self._usages = load_usages(dir_path / out.metrics_file)
+        self._convergence_plots = {}  # scene name -> plot file names
+        self._metrics = {}  # scene name -> case name -> error metrics
+        # Statistics of variance test cases (if any)
+        self._statistics = variance.load_statistics(
+            dir_path / out.variance_dir
+        )
+
+        # References of test cases (shared by test cases of a renderer)
+        self._references = ReferenceStore(self.dir_path)
+
         # Cfg file is parsed for additional information (e.g. descriptions)
         cfg_path = dir_path / out.cfg_file
         self._cfg_mod = (
@@ -36,13 +66,26 @@ class WebGenerator:
             if cfg_path.exists()
             else None
         )
+        self._cfg_hash = (
+            hashlib.sha1(cfg_path.read_bytes()).hexdigest()
+            if cfg_path.exists()
+            else None
+        )
+
+        # Inputs of scene pages generated by previous runs, only scenes
+        # whose inputs changed are generated again
+        self._manifest_path = self.web_dir_path / out.web_manifest_file
+        self._manifest = self._read_manifest()
 
     def generate_webpage(self):
         self._get_scene_cases()
         self._apply_cfg_file()
         self._create_web_directory()
+        self._create_convergence_plots()
+        self._load_metrics()
         self._create_index_file()
         self._create_scene_files()
+        self._write_manifest()
 
     def _get_scene_cases(self):
         # Scene dirs (names) are sorted by name
@@ -72,6 +115,8 @@ class WebGenerator:
         cfg_config = self._cfg_mod.configuration
         if "description" in cfg_config:
             self._cfg_description = cfg_config["description"]
+        if cfg_config.get("webpage_pairwise_errors"):
+            self.pairwise_errors = True
 
         # Test cases and their description
         self._cfg_test_cases = [
@@ -127,12 +172,22 @@ class WebGenerator:
 
     def _create_web_directory(self):
         # Create web directory and copy JERI files into its subdirectory
-        jeri_web_dir_path = self.web_dir_path / "jeri"
-        jeri_web_dir_path.mkdir(parents=True, exist_ok=True)
+        # (only files which changed since the last copy)
+        data_dir_path = pathlib.Path(__file__).parent.parent
+        jeri_dir_path = data_dir_path / "jeri"
+        for file_path in sorted(jeri_dir_path.rglob("*")):
+            if file_path.is_file():
+                _copy_if_changed(
+                    file_path,
+                    self.web_dir_path
+                    / "jeri"
+                    / file_path.relative_to(jeri_dir_path),
+                )
 
-        copy_tree(
-            str(pathlib.Path(__file__).parent / "../jeri"),
-            str(jeri_web_dir_path),
+        # Viewer loading its data lazily
+        _copy_if_changed(
+            data_dir_path / "web" / "ltevalviewer.js",
+            self.web_dir_path / "ltevalviewer.js",
         )
 
     def _create_index_file(self):
@@ -142,7 +197,9 @@ class WebGenerator:
             meta(charset="utf-8")
             style(
                 "body { font-family: sans-serif; } "
-                "a:link, a:visited { color: #55bada; }"
+                "a:link, a:visited { color: #55bada; } "
+                "td, th { padding: 2px 10px; text-align: right; } "
+                "td:first-child, th:first-child { text-align: left; }"
             )
 
         with doc:
@@ -195,31 +252,307 @@ class WebGenerator:
                                 )
                             )
 
+            if self._usages:
+                h3("Resource usage:")
+                for sc in self._found_scene_cases:
+                    if sc["scene_name"] in self._usages:
+                        self._create_usage_table(
+                            sc["scene_name"], sc["case_names"]
+                        )
+
+            if self._metrics:
+                h3("Errors:")
+                for scene_name, scene_metrics in self._metrics.items():
+                    self._create_metrics_table(scene_name, scene_metrics)
+
+            if self._statistics:
+                h3("Efficiency:")
+                for scene_name, scene_statistics in self._statistics.items():
+                    self._create_statistics_table(scene_name, scene_statistics)
+
+            if self._convergence_plots:
+                h3("Convergence:")
+                for scene_name, plot_names in self._convergence_plots.items():
+                    h4(scene_name)
+                    for plot_name in plot_names:
+                        img(src=f"{out.web_dir}/{plot_name}")
+
         with (self.dir_path / "index.html").open("w") as f:
             f.write(doc.render())
 
+    def _create_convergence_plots(self):
+        # Error (relative MSE) of convergence steps as a function of time
+        # and of number of samples, plotted on log-log axes
+        for scene_name, scene_usages in sorted(self._usages.items()):
+            time_series = {}
+            samples_series = {}
+            for usage in scene_usages.values():
+                if "convergence_case" not in usage or not usage["errors"]:
+                    continue
+
+                case_name = usage["convergence_case"]
+                error = usage["errors"]["relmse"]
+                time_series.setdefault(case_name, []).append(
+                    (usage["wall_time"], error)
+                )
+                samples_series.setdefault(case_name, []).append(
+                    (usage["sample_count"], error)
+                )
+
+            plots = {
+                f"{scene_name}_convergence_time.svg": loglog_plot(
+                    time_series, "Time [s]", "relMSE"
+                ),
+                f"{scene_name}_convergence_samples.svg": loglog_plot(
+                    samples_series, "Samples per pixel", "relMSE"
+                ),
+            }
+            for plot_name, plot in plots.items():
+                if not plot:
+                    continue
+
+                with (self.web_dir_path / plot_name).open("w") as f:
+                    f.write(plot)
+                self._convergence_plots.setdefault(scene_name, []).append(
+                    plot_name
+                )
+
+    def _load_metrics(self):
+        # Error metrics precomputed at render time, computed now for images
+        # rendered without them (if numpy and OpenEXR are available)
+        for sc in self._found_scene_cases:
+            scene_dir_path = self.scenes_dir_path / sc["scene_name"]
+
+            for case_name in sc["case_names"]:
+                image_path = scene_dir_path / (case_name + ".exr")
+                reference_path = self._references.reference_path(
+                    sc["scene_name"], case_name
+                )
+                if not reference_path.is_file():
+                    continue
+
+                case_metrics = metrics.load_metrics(image_path)
+                if exrimage.is_available():
+                    try:
+                        case_metrics = metrics.image_metrics(
+                            image_path, reference_path
+                        )
+                    except Exception as e:
+                        print(
+                            f'Error metrics of "{image_path}" '
+                            f"could not be computed: {e}"
+                        )
+                if case_metrics:
+                    self._metrics.setdefault(sc["scene_name"], {})[
+                        case_name
+                    ] = case_metrics
+
+    def _create_metrics_table(self, scene_name: str, scene_metrics: dict):
+        # Table of errors of test cases of the scene
+        h4(scene_name)
+        with table():
+            with tr():
+                th("Test case")
+                for metric_name in metrics.METRIC_NAMES:
+                    th(metrics.METRIC_TITLES[metric_name])
+
+            for case_name, case_metrics in scene_metrics.items():
+                with tr():
+                    td(case_name)
+                    for metric_name in metrics.METRIC_NAMES:
+                        value = case_metrics.get(metric_name)
+                        td("-" if value is None else f"{value:.4g}")
+
+    def _create_statistics_table(
+        self, scene_name: str, scene_statistics: dict
+    ):
+        # Table of errors of a single rendering of variance test cases
+        # of the scene, estimated from their seeds
+        h4(scene_name)
+        with table():
+            with tr():
+                for header in [
+                    "Test case",
+                    "Seeds",
+                    "Time",
+                    "relMSE",
+                    "Variance",
+                    "Squared bias",
+                    "Efficiency",
+                ]:
+                    th(header)
+
+            for case_name, statistics in scene_statistics.items():
+                with tr():
+                    td(case_name)
+                    td(str(statistics["seeds"]))
+                    td(self._format_usage(statistics["wall_time"], "s"))
+                    for name in ["relmse", "variance", "bias2", "efficiency"]:
+                        value = statistics[name]
+                        td("-" if value is None else f"{value:.4g}")
+
+    def _create_usage_table(self, scene_name: str, case_names: list):
+        # Table of resources used by test cases of the scene
+        scene_usages = self._usages[scene_name]
+
+        h4(scene_name)
+        with table():
+            with tr():
+                for header in [
+                    "Test case",
+                    "Wall time",
+                    "User CPU time",
+                    "System CPU time",
+                    "Peak RSS",
+                    "",
+                ]:
+                    th(header)
+
+            for case_name in case_names:
+                if case_name not in scene_usages:
+                    continue
+                usage = scene_usages[case_name]
+
+                notes = []
+                if usage.get("process_cases", 1) > 1:
+                    notes.append(
+                        f"share of a process of {usage['process_cases']} "
+                        f"cases (by samples)"
+                    )
+                if "time_budget" in usage:
+                    notes.append(
+                        f"time budget {usage['time_budget']} s, "
+                        f"{usage['sample_count']} samples"
+                    )
+                if usage.get("cached"):
+                    notes.append("cached")
+
+                with tr():
+                    td(case_name)
+                    td(self._format_usage(usage.get("wall_time"), "s"))
+                    td(self._format_usage(usage.get("user_time"), "s"))
+                    td(self._format_usage(usage.get("system_time"), "s"))
+                    td(self._format_usage(usage.get("peak_rss"), "B"))
+                    td(", ".join(notes))
+
+    def _format_usage(self, value, unit: str) -> str:
+        if value is None:
+            return "-"
+
+        if unit == "B":
+            return f"{value / 2 ** 20:.1f} MiB"
+
+        return f"{value:.2f} {unit}"
+
     def _create_scene_files(self):
-        jeri_scenes_data = []
+        # Viewer data are split into compact JSON files per scene
+        # and per error metric, loaded only when they are viewed
+        all_scenes_data = {"title": "root", "children": []}
+        previous_scenes = self._manifest["scenes"]
+        self._manifest["scenes"] = {}
 
         for scene in self._found_scene_cases:
             scene_name = scene["scene_name"]
             case_names = scene["case_names"]
+            scene_data_url = self._jeri_data_url(scene_name, "scene")
+            scene_inputs = self._scene_inputs(scene_name, case_names)
+            self._manifest["scenes"][scene_name] = scene_inputs
+
+            # Scene files are kept if inputs of the scene did not change
+            jeri_data = None
+            if (
+                previous_scenes.get(scene_name) == scene_inputs
+                and (self.web_dir_path / (scene_name + ".html")).is_file()
+            ):
+                jeri_data = self._read_jeri_data(scene_data_url)
+
+            if jeri_data is None:
+                # Create JERI data files of the scene
+                jeri_data = self._create_jeri_scene_data(
+                    scene_name, case_names
+                )
+                self._create_jeri_data_files(scene_name, jeri_data)
 
-            # Create html page with a single scene
-            self._create_scene_html_file(scene_name)
+                # Create html page with a single scene
+                self._create_scene_html_file(scene_name, scene_data_url)
 
-            # Create JERI data file script for the webpage
-            jeri_data = self._create_jeri_scene_data(scene_name, case_names)
-            jeri_scenes_data.append({"name": scene_name, "data": jeri_data})
-            self._create_jeri_data_file(scene_name, jeri_data)
+            all_scenes_data["children"].append(
+                self._create_jeri_placeholder(
+                    scene_name, scene_data_url, jeri_data
+                )
+            )
 
         # Create html page with all scenes
-        self._create_scene_html_file("all_scenes")
-        self._create_jeri_data_file(
-            "all_scenes", self._create_jeri_all_scenes_data(jeri_scenes_data)
+        all_scenes_data_url = self._jeri_data_url("all_scenes")
+        self._write_jeri_data(all_scenes_data_url, all_scenes_data)
+        self._create_scene_html_file("all_scenes", all_scenes_data_url)
+
+        # Files of scenes which are no longer in the results
+        for scene_name in previous_scenes.keys() - self._manifest["scenes"]:
+            self._remove_scene_files(scene_name)
+
+    def _scene_inputs(self, scene_name: str, case_names: list) -> str:
+        # Hash of everything the scene files are generated from - images
+        # and references (names, sizes, modification times), the cfg file
+        # and settings of the generator
+        inputs = {
+            "cfg": self._cfg_hash,
+            "pairwise_errors": self.pairwise_errors,
+            "error_maps": exrimage.is_available(),
+            "cases": [],
+        }
+        for case_name in case_names:
+            image_path = (
+                self.scenes_dir_path / scene_name / (case_name + ".exr")
+            )
+            reference_path = self._references.reference_path(
+                scene_name, case_name
+            )
+            inputs["cases"].append(
+                [
+                    case_name,
+                    _file_signature(image_path),
+                    os.path.relpath(reference_path, self.dir_path),
+                    _file_signature(reference_path),
+                ]
+            )
+
+        return hashlib.sha1(
+            json.dumps(inputs, sort_keys=True).encode()
+        ).hexdigest()
+
+    def _remove_scene_files(self, scene_name: str):
+        html_path = self.web_dir_path / (scene_name + ".html")
+        if html_path.is_file():
+            html_path.unlink()
+        for dir_path in (
+            self.web_dir_path / out.web_data_dir / scene_name,
+            self.web_dir_path / out.error_maps_dir / scene_name,
+        ):
+            shutil.rmtree(dir_path, ignore_errors=True)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with self._manifest_path.open("r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+
+        if not manifest or manifest.get("version") != _MANIFEST_VERSION:
+            return {"version": _MANIFEST_VERSION, "scenes": {}}
+        return manifest
+
+    def _write_manifest(self):
+        # Written atomically (and last), interrupted generation
+        # is completed by the next run
+        fd, tmp_path_str = tempfile.mkstemp(
+            suffix=".tmp", dir=str(self.web_dir_path)
         )
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._manifest, f, indent=4, sort_keys=True)
+        os.replace(tmp_path_str, self._manifest_path)
 
-    def _create_scene_html_file(self, name):
+    def _create_scene_html_file(self, name: str, data_url: str):
         doc = dominate.document(title=name)
 
         with doc.head:
@@ -258,37 +591,30 @@ class WebGenerator:
                 )
             )
             script(src="jeri/jeri.js")
+            script(src="ltevalviewer.js")
 
-            # This script will contain JERI viewer data specification
-            script(src=name + "_jeri_data.js")
+            # Viewer loads its data (JERI data specification) lazily
+            script(
+                "renderLtevalViewer(document.getElementById('root'), "
+                f"'{data_url}');"
+            )
 
         with (self.web_dir_path / (name + ".html")).open("w") as f:
             f.write(doc.render())
 
-    def _create_jeri_all_scenes_data(self, jeri_scenes_data: list) -> dict:
-        jeri_all_data = {"title": "root", "children": []}
-
-        for scene_data in jeri_scenes_data:
-            jeri_data = scene_data["data"]
-            jeri_data["title"] = scene_data["name"]
-            jeri_all_data["children"].append(jeri_data)
-
-        return jeri_all_data
-
     def _create_jeri_scene_data(
         self, scene_name: str, case_names: list
     ) -> dict:
         case_exr = {
-            cn: "../scenes/" + scene_name + "/" + cn + ".exr"
+            cn: self._file_url(
+                self.scenes_dir_path / scene_name / (cn + ".exr")
+            )
             for cn in case_names
         }
+        # References shared by test cases are loaded (and cached)
+        # by the browser only once
         case_ref_exr = {
-            cn: "../scenes/"
-            + scene_name
-            + "/"
-            + cn
-            + out.refimg_stem_suffix
-            + ".exr"
+            cn: self._file_url(self._references.reference_path(scene_name, cn))
             for cn in case_names
         }
 
@@ -314,12 +640,79 @@ class WebGenerator:
         jeri_data["children"].append(references)
 
         # Error metrics
-        jeri_data["children"].extend(
-            self._create_jeri_error_images(case_names, case_exr, case_ref_exr)
-        )
+        if self.pairwise_errors:
+            jeri_data["children"].extend(
+                self._create_jeri_error_images(
+                    case_names, case_exr, case_ref_exr
+                )
+            )
+        else:
+            jeri_data["children"].extend(
+                self._create_jeri_error_maps(
+                    scene_name, case_names, case_exr, case_ref_exr
+                )
+            )
 
         return jeri_data
 
+    def _create_jeri_error_maps(
+        self,
+        scene_name: str,
+        case_names: list,
+        case_exr: dict,
+        case_ref_exr: dict,
+    ) -> list:
+        # Errors of images compared to their references, precomputed
+        # error maps are used if possible (numpy and OpenEXR available),
+        # otherwise the viewer computes them
+        scene_dir_path = self.scenes_dir_path / scene_name
+        maps_dir_path = self.web_dir_path / out.error_maps_dir / scene_name
+
+        case_maps = {}
+        for case_name in case_names:
+            image_path = scene_dir_path / (case_name + ".exr")
+            reference_path = self._references.reference_path(
+                scene_name, case_name
+            )
+            if not reference_path.is_file() or not exrimage.is_available():
+                continue
+
+            try:
+                case_maps[case_name] = metrics.write_error_maps(
+                    image_path, reference_path, maps_dir_path
+                )
+            except Exception as e:
+                print(
+                    f'Error maps of "{image_path}" could not be computed: {e}'
+                )
+
+        errors = []
+        for map_name in metrics.ERROR_MAP_NAMES:
+            error_metric = metrics.METRIC_TITLES[map_name]
+            error = {"title": error_metric, "children": []}
+
+            for case_name in case_names:
+                if case_name in case_maps:
+                    map_path = case_maps[case_name][map_name]
+                    error["children"].append(
+                        {
+                            "title": case_name,
+                            "image": self._file_url(map_path),
+                        }
+                    )
+                else:
+                    error["children"].append(
+                        self._create_jeri_error_image(
+                            case_name,
+                            case_exr[case_name],
+                            case_ref_exr[case_name],
+                            error_metric,
+                        )
+                    )
+
+            errors.append(error)
+        return errors
+
     def _create_jeri_error_images(
         self, case_names: list, case_exr: dict, case_ref_exr: dict
     ) -> list:
@@ -400,12 +793,91 @@ class WebGenerator:
             },
         }
 
-    def _create_jeri_data_file(self, name: str, jeri_data: dict):
-        jeri_data_content = (
-            f"const data = {json.dumps(jeri_data, indent=4)}"
-            f"\nJeri.renderViewer(document.getElementById('root'), data);"
+    def _create_jeri_data_files(self, scene_name: str, jeri_data: dict):
+        # Images and references of the scene are in the scene file,
+        # errors (metrics) are in their own files.
+        # Returns URL of the scene file.
+        scene_data = {"title": jeri_data["title"], "children": []}
+
+        for branch in jeri_data["children"]:
+            if branch["title"] in ("Img", "Reference"):
+                scene_data["children"].append(branch)
+                continue
+
+            branch_url = self._jeri_data_url(scene_name, branch["title"])
+            self._write_jeri_data(branch_url, branch)
+            scene_data["children"].append(
+                self._create_jeri_placeholder(
+                    branch["title"], branch_url, jeri_data
+                )
+            )
+
+        scene_data_url = self._jeri_data_url(scene_name, "scene")
+        self._write_jeri_data(scene_data_url, scene_data)
+        return scene_data_url
+
+    def _create_jeri_placeholder(
+        self, title: str, url: str, jeri_data: dict
+    ) -> dict:
+        # Branch of the viewer data loaded from the URL when it is viewed,
+        # the first image of the scene is shown until it is loaded
+        first_image = jeri_data["children"][0]["children"]
+        return {
+            "title": title,
+            "url": url,
+            "children": [
+                {"title": "loading", "image": image["image"]}
+                for image in first_image[:1]
+            ],
+        }
+
+    def _file_url(self, file_path: pathlib.Path) -> str:
+        # URL of the file relative to the web directory, versioned by size
+        # and modification time of the file so that the browser can cache
+        # it as immutable (suffix of the file is repeated at the end,
+        # JERI derives type of the image from it)
+        url = pathlib.Path(
+            os.path.relpath(file_path, self.web_dir_path)
+        ).as_posix()
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return url
+
+        return (
+            f"{url}?v={stat.st_size:x}-{stat.st_mtime_ns:x}{file_path.suffix}"
         )
 
-        jeri_data_path = self.web_dir_path / (name + "_jeri_data.js")
-        with (jeri_data_path).open("w") as f:
-            f.write(jeri_data_content)
+    def _jeri_data_url(self, *names) -> str:
+        # URL of the data file relative to the web directory
+        return "/".join([out.web_data_dir, *names]) + ".json"
+
+    def _read_jeri_data(self, url: str) -> dict:
+        try:
+            with (self.web_dir_path / url).open("r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_jeri_data(self, url: str, jeri_data: dict):
+        jeri_data_path = self.web_dir_path / url
+        jeri_data_path.parent.mkdir(parents=True, exist_ok=True)
+        with jeri_data_path.open("w") as f:
+            json.dump(jeri_data, f, separators=(",", ":"))
+
+
+def _file_signature(file_path: pathlib.Path) -> list:
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _copy_if_changed(src_path: pathlib.Path, dst_path: pathlib.Path):
+    # Copy keeps modification time of the source, unchanged files
+    # are not copied again
+    if _file_signature(src_path) == _file_signature(dst_path):
+        return
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(src_path, dst_path)
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import pathlib
+import queue
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from data.scripts.coordinator import HEARTBEAT_INTERVAL
+from data.scripts.scheduler import SceneCaseJob
+from data.scripts.tcase import TestCase
+
+# Idle workers ask the coordinator for new jobs in this interval (seconds)
+_POLL_INTERVAL = 1.0
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        "Worker of the light transport evaluation framework."
+    )
+
+    parser.add_argument(
+        "server",
+        type=str,
+        help=(
+            "Address of the coordinator - lteval.py run with --distribute "
+            "(e.g. http://192.168.0.10:8765)."
+        ),
+    )
+
+    parser.add_argument(
+        "-n",
+        "--n",
+        "--name",
+        dest="name",
+        type=str,
+        default="",
+        help="Name of the worker (default: host name and process ID).",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help=(
+            "Jobs - number of scene and test case combinations "
+            "rendered by the worker at the same time (default 1)."
+        ),
+    )
+
+    parser.add_argument(
+        "-c",
+        "--c",
+        dest="clear",
+        type=str,
+        choices=["n", "y", "fy"],
+        default="y",
+        help="Clear - same as of lteval.py.",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--s",
+        "--scratch",
+        dest="scratch",
+        type=str,
+        default="",
+        help="Scratch - same as of lteval.py.",
+    )
+
+    parser.add_argument(
+        "-nc",
+        "--nc",
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="No cache - same as of lteval.py.",
+    )
+
+    return parser
+
+
+class Worker:
+    # Pulls jobs from the coordinator, renders them locally (by a Scheduler
+    # using its render_batch) and uploads results back to the coordinator.
+    # Jobs are claimed by a thread of their own, at most job_count claimed
+    # jobs are rendered (or waiting for rendering) at once.
+
+    def __init__(self, server_url: str, name: str = "", job_count: int = 1):
+        if "://" not in server_url:
+            server_url = "http://" + server_url
+        self.server_url = server_url.rstrip("/")
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+
+        # Slot is taken by a claimed job until its result is sent
+        self._slots = threading.Semaphore(max(1, job_count))
+
+    def fetch_configuration(self) -> bytes:
+        with urllib.request.urlopen(self.server_url + "/cfg") as response:
+            return response.read()
+
+    def claimed_jobs(
+        self, scenes: list, renderers: dict, output_dir_path: pathlib.Path
+    ):
+        # Jobs claimed from the coordinator (created from their definitions
+        # one by one, rendered into the output directory), ends when
+        # the coordinator has no more jobs or is not running
+        claimed = queue.Queue()
+        threading.Thread(
+            target=self._claim_jobs,
+            args=(
+                {scene.name: scene for scene in scenes},
+                renderers,
+                output_dir_path,
+                claimed,
+            ),
+            daemon=True,
+        ).start()
+
+        while True:
+            job = claimed.get()
+            if job is None:
+                return
+            yield job
+
+    def _claim_jobs(
+        self,
+        scenes: dict,
+        renderers: dict,
+        output_dir_path: pathlib.Path,
+        claimed: queue.Queue,
+    ):
+        # Claimed jobs are put into the queue, None ends it
+        while True:
+            self._slots.acquire()
+            try:
+                status, claim = self._post("/claim", {})
+            except (urllib.error.URLError, ConnectionError) as e:
+                print(f"Coordinator is not available: {e}")
+                claimed.put(None)
+                return
+
+            if status == 410:
+                claimed.put(None)
+                return
+            if status != 200:
+                self._slots.release()
+                time.sleep(_POLL_INTERVAL)
+                continue
+
+            scene = scenes.get(claim["scene"])
+            renderer = renderers.get(claim["renderer"])
+            if scene is None or renderer is None:
+                # Configuration of the coordinator is the same,
+                # only scenes or renderers may be missing
+                self._slots.release()
+                self._post(
+                    f"/jobs/{claim['id']}/finish",
+                    {
+                        "error": f'scene: "{claim["scene"]}", test case: '
+                        f'"{claim["case"]}" is not available on the worker'
+                    },
+                )
+                continue
+
+            job = SceneCaseJob(
+                scene,
+                TestCase(
+                    {
+                        "name": claim["case"],
+                        "renderer": claim["renderer"],
+                        "params": claim["params"],
+                        "time_budget": claim["time_budget"],
+                    }
+                ),
+                renderer,
+                output_dir_path,
+            )
+            job.sample_count = claim["sample_count"]
+            job.remote_id = claim["id"]
+            claimed.put(job)
+
+    def render_batch(self, batch: list, render_batch):
+        # Render callable of the Scheduler - renders the batch locally
+        # while reporting heartbeats, then sends results to the coordinator
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._send_heartbeats, args=(batch, stop), daemon=True
+        )
+        heartbeat.start()
+
+        try:
+            render_batch(batch)
+        except Exception as e:
+            for job in batch:
+                if job.error is None:
+                    job.error = e
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        sys.stdout.flush()
+        for job in batch:
+            self._send_result(job)
+            self._slots.release()
+
+    def _send_heartbeats(self, batch: list, stop: threading.Event):
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            for job in batch:
+                try:
+                    self._post(f"/jobs/{job.remote_id}/heartbeat", {})
+                except (urllib.error.URLError, ConnectionError):
+                    pass
+
+    def _send_result(self, job):
+        try:
+            if job.error is None and job.result_path.is_file():
+                with job.result_path.open("rb") as f:
+                    request = urllib.request.Request(
+                        f"{self.server_url}/jobs/{job.remote_id}/result?"
+                        + urllib.parse.urlencode({"worker": self.name}),
+                        data=f,
+                        method="PUT",
+                        headers={
+                            "Content-Length": str(
+                                job.result_path.stat().st_size
+                            )
+                        },
+                    )
+                    self._open(request)
+
+            self._post(
+                f"/jobs/{job.remote_id}/finish",
+                {
+                    "error": None if job.error is None else str(job.error),
+                    "cached": job.cached,
+                    "usage": job.usage.to_dict() if job.usage else None,
+                    "sample_count": job.sample_count,
+                    "log": (
+                        job.log_path.read_text(errors="replace")
+                        if job.log_path.is_file()
+                        else ""
+                    ),
+                },
+            )
+        except (urllib.error.URLError, ConnectionError, OSError) as e:
+            # Coordinator hands out the job again (to another worker)
+            print(f"Result of {job} could not be sent: {e}")
+
+    def _post(self, path: str, data: dict) -> tuple:
+        # Returns HTTP status and the decoded response (if any)
+        request = urllib.request.Request(
+            self.server_url + path,
+            data=json.dumps({**data, "worker": self.name}).encode(),
+            method="POST",
+            headers={"Content-Type": "application/json"},
+        )
+        return self._open(request)
+
+    def _open(self, request: urllib.request.Request) -> tuple:
+        try:
+            with urllib.request.urlopen(request) as response:
+                body = response.read()
+                return response.status, json.loads(body) if body else None
+        except urllib.error.HTTPError as e:
+            # Lost leases, finished runs
+            return e.code, None
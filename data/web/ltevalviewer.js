@@ -0,0 +1,70 @@
+// JERI viewer with lazily loaded data.
+// Branches of the data tree which have an "url" are placeholders,
+// their children are fetched (compact JSON) when they are selected
+// in the viewer, the viewer is then rendered again with the loaded data.
+function renderLtevalViewer(element, dataUrl) {
+    var data = null;
+    var viewer = null;
+    var requested = {};
+
+    function render() {
+        viewer = Jeri.renderViewer(element, data);
+
+        // Selection of the viewer is checked after every update
+        if (!viewer.ltevalHooked) {
+            var componentDidUpdate = viewer.componentDidUpdate;
+            viewer.componentDidUpdate = function () {
+                componentDidUpdate.apply(this, arguments);
+                loadSelectedBranch();
+            };
+            viewer.ltevalHooked = true;
+        }
+        loadSelectedBranch();
+    }
+
+    function loadSelectedBranch() {
+        // First placeholder on the path of the selection is loaded
+        var node = data;
+        var selection = viewer.state.selection;
+        for (var i = 0; i < selection.length && node.children; i++) {
+            var child = node.children.find(function (c) {
+                return c.title === selection[i];
+            });
+            if (!child) {
+                return;
+            }
+            if (child.url) {
+                loadBranch(child);
+                return;
+            }
+            node = child;
+        }
+    }
+
+    function loadBranch(branch) {
+        if (requested[branch.url]) {
+            return;
+        }
+        requested[branch.url] = true;
+
+        fetchJson(branch.url).then(function (loaded) {
+            branch.children = loaded.children;
+            delete branch.url;
+            render();
+        });
+    }
+
+    function fetchJson(url) {
+        return fetch(url).then(function (response) {
+            if (!response.ok) {
+                throw new Error("Loading of " + url + " failed.");
+            }
+            return response.json();
+        });
+    }
+
+    fetchJson(dataUrl).then(function (loaded) {
+        data = loaded;
+        render();
+    });
+}
@@ -7,6 +7,8 @@ import data.scripts.scene as scene
 import data.scripts.tcase as tcase
 import data.scripts.webgen as webgen
 import data.scripts.webdisplay as webdisplay
+from data.scripts.coordinator import Coordinator, DEFAULT_DISPATCHED_JOBS
+from data.scripts.scheduler import Scheduler
 
 if __name__ == "__main__":
     # Parse arguments
@@ -17,23 +19,53 @@ if __name__ == "__main__":
         lteutils.clear_scenes_directory()
         exit(0)
 
+    # Resumed run continues in its output directory and by default
+    # uses configuration file which was copied into it.
+    resumed_dir_path = (
+        lteutils.get_resumed_output_dir(args.resume) if args.resume else None
+    )
+    if resumed_dir_path and not args.cfg:
+        args.cfg = str(resumed_dir_path / out.cfg_file)
+    if not args.cfg:
+        print("Configuration file must be specified!")
+        exit(1)
+
     # Load configuration
     cfg_path = pathlib.Path(args.cfg).resolve()
     cfg_mod = lteutils.load_configuration_module(cfg_path)
 
     # Output directory name - use name specified in the configuration
     # or fallback to the name of the configuration file.
-    output_dir_path = lteutils.create_output_dir(cfg_mod, cfg_path)
+    output_dir_path = resumed_dir_path or lteutils.create_output_dir(
+        cfg_mod, cfg_path
+    )
 
     # Copy configuration file to the output directory
-    shutil.copy(str(cfg_path), str(output_dir_path / out.cfg_file))
+    if cfg_path != output_dir_path / out.cfg_file:
+        shutil.copy(str(cfg_path), str(output_dir_path / out.cfg_file))
 
     # Create logger (future print() statements are handled by it)
     # Sends print to the stdout and logging file
-    logger = lteutils.create_logger(output_dir_path)
+    logger = lteutils.create_logger(output_dir_path, bool(resumed_dir_path))
+
+    # Journal of finished jobs, makes it possible to resume the run
+    journal = lteutils.create_journal(output_dir_path, bool(resumed_dir_path))
+
+    # Resources used for rendering of test cases (metrics.jsonl)
+    usage_log = lteutils.create_usage_log(
+        output_dir_path, bool(resumed_dir_path)
+    )
+
+    # Reference images shared by test cases (references.json)
+    references = lteutils.create_reference_store(output_dir_path)
 
     # Load renderers
     renderers = lteutils.load_renderers(cfg_mod)
+    lteutils.write_renderers_file(renderers, output_dir_path)
+
+    # Files generated for rendering are isolated in a per-run directory
+    scratch_dir = lteutils.create_scratch_dir(args.scratch)
+    lteutils.set_renderers_scratch_dir(renderers, scratch_dir)
 
     # Load scenes
     scenes = scene.load_scenes_from_cfg(cfg_mod)
@@ -44,26 +76,79 @@ if __name__ == "__main__":
     # Check if scene files of the defined renderers exist
     lteutils.check_renderers_scene_files(scenes, renderers)
 
+    # Results of unchanged scenes and test cases are reused
+    # (by workers when the rendering is distributed)
+    cache = (
+        None
+        if args.no_cache or args.distribute
+        else lteutils.create_render_cache(cfg_mod)
+    )
+
+    # Distributed rendering - jobs are handed out to workers
+    coordinator = None
+    if args.distribute:
+        coordinator = Coordinator(args.distribute, cfg_path)
+    if args.jobs is None:
+        args.jobs = DEFAULT_DISPATCHED_JOBS if coordinator else 1
+
+    # Live dashboard of the run
+    dashboard = (
+        lteutils.create_dashboard(output_dir_path, args.live)
+        if args.live is not None
+        else None
+    )
+
     # Render test cases
-    lteutils.render_scene_cases(
-        scenes,
-        renderers,
-        test_cases,
-        output_dir_path / out.scenes_dir,
-        args.eof,
-        args.clear,
+    scheduler = Scheduler(
+        args.jobs,
+        eof=args.eof,
+        clear=args.clear,
+        logger=logger,
+        cache=cache,
+        journal=journal,
+        batch=args.batch,
+        usage_log=usage_log,
+        render_batch=coordinator.render_batch if coordinator else None,
+        references=references,
+        dashboard=dashboard,
+        install_references=args.install_references,
     )
+    try:
+        lteutils.render_scene_cases(
+            scenes,
+            renderers,
+            test_cases,
+            output_dir_path,
+            scheduler,
+            lteutils.get_checkpoint_dir(cfg_mod),
+        )
+    finally:
+        if coordinator:
+            coordinator.close()
+        scratch_dir.remove_unused(keep=args.clear == "n")
+
+    # Indexing of the results (if the database is configured)
+    lteutils.ingest_results(cfg_mod, output_dir_path)
 
     # Webpage generation
+    webpage_path = None
     if (
         "webpage_generate" in cfg_mod.configuration
         and cfg_mod.configuration["webpage_generate"]
     ):
         webgen.WebGenerator(output_dir_path).generate_webpage()
+        webpage_path = output_dir_path / "index.html"
 
-        # And its display
-        if (
-            "webpage_display" in cfg_mod.configuration
-            and cfg_mod.configuration["webpage_display"]
-        ):
+    if dashboard:
+        dashboard.run_finished(webpage_path)
+
+    # And its display (by the dashboard if it is running)
+    if webpage_path and cfg_mod.configuration.get("webpage_display"):
+        if dashboard:
+            print(f"Webpage is at: {dashboard.url}index.html")
+            dashboard.serve_forever()
+        else:
             webdisplay.display_webpage(output_dir_path)
+
+    if dashboard:
+        dashboard.close()
@@ -0,0 +1,226 @@
+import argparse
+import pathlib
+
+import data.scripts.lteutils as lteutils
+from data.scripts.resultsdb import export_results, find_output_dirs
+
+_DEFAULT_COLUMNS = "run,started,scene,test_case,wall_time,relmse,ssim"
+_DEFAULT_DIFF_COLUMNS = "wall_time,relmse,ssim"
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser("lteval results database tool.")
+    parser.add_argument(
+        "--db",
+        dest="db",
+        type=str,
+        default="",
+        help=(
+            "Database file, relative to the lteval directory "
+            "(default: results/lteval.sqlite)."
+        ),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser(
+        "ingest",
+        help=(
+            "Index output directories (or directories containing them, "
+            "e.g. results). Unchanged directories are skipped."
+        ),
+    )
+    ingest_parser.add_argument("dirs", type=str, nargs="+")
+    ingest_parser.add_argument(
+        "-f",
+        "--f",
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Index even unchanged output directories again.",
+    )
+
+    commands.add_parser("runs", help="List indexed runs.")
+
+    # Filters of results
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--run", type=str, help="Run ID, name or path.")
+    filters.add_argument("-s", "--scene", type=str, help="Scene name.")
+    filters.add_argument(
+        "-t", "--test-case", dest="test_case", type=str, help="Test case."
+    )
+    filters.add_argument(
+        "-r", "--renderer", type=str, help="Renderer name or type."
+    )
+    filters.add_argument(
+        "-p",
+        "--parameter",
+        type=str,
+        help=(
+            "Text contained in resolved parameters of the test case, "
+            "e.g. bdpt."
+        ),
+    )
+    filters.add_argument(
+        "--steps",
+        action="store_true",
+        help="Include steps of convergence test cases.",
+    )
+
+    list_parser = commands.add_parser(
+        "list", parents=[filters], help="List results (oldest runs first)."
+    )
+    list_parser.add_argument(
+        "-c",
+        "--columns",
+        type=str,
+        default=_DEFAULT_COLUMNS,
+        help=f"Listed columns (default: {_DEFAULT_COLUMNS}).",
+    )
+
+    diff_parser = commands.add_parser(
+        "diff", help="Compare results of scenes and test cases of two runs."
+    )
+    diff_parser.add_argument("run_a", type=str)
+    diff_parser.add_argument("run_b", type=str)
+    diff_parser.add_argument(
+        "-c",
+        "--columns",
+        type=str,
+        default=_DEFAULT_DIFF_COLUMNS,
+        help=f"Compared columns (default: {_DEFAULT_DIFF_COLUMNS}).",
+    )
+
+    export_parser = commands.add_parser(
+        "export",
+        parents=[filters],
+        help="Export results into a CSV or Parquet (.parquet) file.",
+    )
+    export_parser.add_argument("file", type=str)
+
+    return parser
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def _print_table(columns: list, rows: list):
+    widths = [
+        max([len(c)] + [len(row[i]) for row in rows])
+        for i, c in enumerate(columns)
+    ]
+    for row in [columns] + rows:
+        print(
+            "  ".join(
+                value.ljust(width) for value, width in zip(row, widths)
+            ).rstrip()
+        )
+
+
+def _ingest(results_db, args):
+    for dir_str in args.dirs:
+        dir_path = pathlib.Path(dir_str).resolve()
+        if not dir_path.is_dir():
+            print(f'"{dir_path}" is not a directory or does not exist!')
+            exit(1)
+
+        for output_dir_path in find_output_dirs(dir_path):
+            if results_db.ingest(output_dir_path, args.force):
+                print(f'Indexed: "{output_dir_path}"')
+            else:
+                print(f'Unchanged: "{output_dir_path}"')
+
+
+def _list_runs(results_db, args):
+    columns = ["id", "name", "started", "result_count", "description"]
+    _print_table(
+        columns,
+        [
+            [_format_value(run[c]) for c in columns]
+            for run in results_db.runs()
+        ],
+    )
+
+
+def _filtered_results(results_db, args) -> list:
+    return results_db.results(
+        args.run,
+        args.scene,
+        args.test_case,
+        args.renderer,
+        args.parameter,
+        args.steps,
+    )
+
+
+def _list_results(results_db, args):
+    columns = args.columns.split(",")
+    results = _filtered_results(results_db, args)
+    if results and not set(columns) <= results[0].keys():
+        print(f"Unknown columns, available: {', '.join(results[0])}")
+        exit(1)
+
+    _print_table(
+        columns,
+        [[_format_value(r[c]) for c in columns] for r in results],
+    )
+
+
+def _diff_runs(results_db, args):
+    columns = args.columns.split(",")
+    rows = []
+    for (scene, test_case), a, b in results_db.diff(args.run_a, args.run_b):
+        row = [scene, test_case]
+        for c in columns:
+            value_a = a[c] if a else None
+            value_b = b[c] if b else None
+            change = ""
+            if isinstance(value_a, float) and isinstance(value_b, float):
+                if value_a:
+                    change = f" ({(value_b - value_a) / value_a:+.1%})"
+            row.append(
+                f"{_format_value(value_a)} -> {_format_value(value_b)}"
+                + change
+            )
+
+        # Test cases whose definition changed between the runs
+        row.append(
+            "parameters differ"
+            if a and b and a["parameters"] != b["parameters"]
+            else ""
+        )
+        rows.append(row)
+
+    _print_table(["scene", "test_case"] + columns + [""], rows)
+
+
+def _export_results(results_db, args):
+    file_path = pathlib.Path(args.file).resolve()
+    results = _filtered_results(results_db, args)
+
+    try:
+        export_results(results, file_path)
+    except ImportError:
+        print("Export into Parquet files requires pyarrow package!")
+        exit(1)
+    print(f'{len(results)} results exported into "{file_path}".')
+
+
+if __name__ == "__main__":
+    args = _create_parser().parse_args()
+
+    results_db = lteutils.create_results_database(args.db)
+    try:
+        {
+            "ingest": _ingest,
+            "runs": _list_runs,
+            "list": _list_results,
+            "diff": _diff_runs,
+            "export": _export_results,
+        }[args.command](results_db, args)
+    finally:
+        results_db.close()
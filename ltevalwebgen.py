@@ -30,6 +30,20 @@ def _create_parser() -> argparse.ArgumentParser:
         ),
     )
 
+    parser.add_argument(
+        "-p",
+        "--p",
+        "--pairwise",
+        action="store_true",
+        dest="pairwise",
+        help=(
+            "Error images of all pairs of test cases and references "
+            "(computed by the viewer on demand, slow with many test cases) "
+            "instead of precomputed errors of test cases "
+            "compared to their references."
+        ),
+    )
+
     return parser
 
 
@@ -41,7 +55,7 @@ if __name__ == "__main__":
         print(f'"{str(dir_path)}" is not a directory or does not exist!')
         exit(1)
 
-    webgen.WebGenerator(dir_path).generate_webpage()
+    webgen.WebGenerator(dir_path, args.pairwise).generate_webpage()
 
     if args.display:
         webdisplay.display_webpage(dir_path)
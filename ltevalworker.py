@@ -0,0 +1,60 @@
+import pathlib
+import shutil
+import tempfile
+
+import data.scripts.lteutils as lteutils
+import data.scripts.outputconst as out
+import data.scripts.scene as scene
+from data.scripts.scheduler import Scheduler
+from data.scripts.worker import Worker, create_parser
+
+if __name__ == "__main__":
+    # Parse arguments
+    args = create_parser().parse_args()
+    worker = Worker(args.server, args.name, args.jobs)
+
+    # Configuration file of the coordinator
+    try:
+        cfg = worker.fetch_configuration()
+    except Exception as e:
+        print(f'Coordinator at "{worker.server_url}" is not available: {e}')
+        exit(1)
+
+    # Results and logs are rendered into a working directory first,
+    # then they are sent to the coordinator
+    work_dir_path = pathlib.Path(tempfile.mkdtemp(prefix="lteval-worker-"))
+    cfg_path = work_dir_path / out.cfg_file
+    cfg_path.write_bytes(cfg)
+    cfg_mod = lteutils.load_configuration_module(cfg_path)
+
+    logger = lteutils.create_logger(work_dir_path)
+    print(f'Worker: "{worker.name}" of coordinator at "{worker.server_url}"')
+
+    # Load renderers and scenes the same way lteval.py does, test cases
+    # of jobs are defined by the coordinator
+    renderers = lteutils.load_renderers(cfg_mod)
+    scratch_dir = lteutils.create_scratch_dir(args.scratch)
+    lteutils.set_renderers_scratch_dir(renderers, scratch_dir)
+    scenes = scene.load_scenes_from_cfg(cfg_mod)
+    lteutils.check_renderers_scene_files(scenes, renderers)
+
+    cache = None if args.no_cache else lteutils.create_render_cache(cfg_mod)
+
+    # Render claimed jobs until the coordinator has no more of them, jobs
+    # of scenes or renderers not available on the worker are reported
+    # to the coordinator as failed
+    try:
+        failed_jobs = Scheduler(
+            args.jobs,
+            eof=False,
+            clear=args.clear,
+            logger=logger,
+            cache=cache,
+            render_batch=worker.render_batch,
+            post_process=False,
+        ).run(worker.claimed_jobs(scenes, renderers, work_dir_path))
+        print(f"Worker finished, {len(failed_jobs)} jobs failed.")
+    finally:
+        scratch_dir.remove_unused(keep=args.clear == "n")
+        logger.close()
+        shutil.rmtree(str(work_dir_path), ignore_errors=True)
@@ -0,0 +1,18 @@
+import pathlib
+import sys
+
+import pytest
+
+# Tests import the framework the same way the scripts of the repository do
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1]))
+
+from data.scripts.scene import Scene  # noqa: E402
+
+
+@pytest.fixture
+def scenes(tmp_path):
+    scenes = []
+    for name in ("first", "second"):
+        (tmp_path / "scenes" / name).mkdir(parents=True)
+        scenes.append(Scene(name, tmp_path / "scenes" / name))
+    return scenes
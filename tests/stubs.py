@@ -0,0 +1,115 @@
+import pathlib
+
+from data.scripts.renderers.abstractrenderer import AbstractRenderer
+from data.scripts.scene import Scene
+from data.scripts.supervisor import ProcessUsage
+from data.scripts.tcase import TestCase
+
+MITSUBA_SETTINGS = """<?xml version="1.0" encoding="utf-8"?>
+<scene version="0.5.0">
+    <sensor type="perspective">
+        <sampler type="independent">
+            <integer name="sampleCount" value="1"/>
+        </sampler>
+        <film type="hdrfilm"/>
+    </sensor>
+</scene>
+"""
+
+PBRT_SETTINGS = """Sampler "random" "integer pixelsamples" [1]
+Film "image"
+"""
+
+
+def without_process(renderer_class, failing=(), return_code=0):
+    # Renderer whose result images are copies of its scene files (those
+    # given on the command line), scene files of test cases named
+    # in failing are not rendered and the process returns return_code
+    class Renderer(renderer_class):
+        async def _run(self, arguments: list) -> ProcessUsage:
+            for argument in arguments:
+                scene_case_path = pathlib.Path(argument)
+                if scene_case_path.suffix != self.scene_suffix or any(
+                    scene_case_path.stem == "__lteval_" + name
+                    for name in failing
+                ):
+                    continue
+                scene_case_path.with_suffix(".exr").write_bytes(
+                    scene_case_path.read_bytes()
+                )
+            return ProcessUsage(return_code, 0.0)
+
+    return Renderer
+
+
+class StubRenderer(AbstractRenderer):
+    # Renderer without a renderer process - scene files of test cases are
+    # their parameters, "rendered" results are copies of the scene files.
+    # Test cases named in fail_prepare fail to be prepared, prepared
+    # and rendered test cases are recorded unless record is disabled.
+    supports_batch = True
+    sample_count_parameter = ("sampler", "sampleCount", "integer")
+    seed_parameter = ("sampler", "seed", "integer")
+
+    def __init__(
+        self,
+        executable_path=None,
+        options=None,
+        fail_prepare=(),
+        record=True,
+    ):
+        self.scene_type = "stub"
+        self.scene_suffix = ".stub"
+        self.options = options
+        self.fail_prepare = set(fail_prepare)
+        self.record = record
+        self.prepared = []
+        self.rendered = []
+
+    def scene_files_exist(self, scene: Scene) -> bool:
+        return True
+
+    def prepare_scene_case(self, scene: Scene, test_case: TestCase):
+        if test_case.name in self.fail_prepare:
+            raise RuntimeError(f'"{test_case.name}" can not be prepared')
+
+        scene_case_path = self._scene_case_path(scene, test_case)
+        scene_case_path.parent.mkdir(parents=True, exist_ok=True)
+        scene_case_path.write_text(repr(test_case.parameter_set.parameters))
+        if self.record:
+            self.prepared.append((scene.name, test_case.name))
+
+    def render_scene_case(
+        self, scene: Scene, test_case: TestCase, output_dir_path: pathlib.Path
+    ) -> ProcessUsage:
+        if self.record:
+            self.rendered.append((scene.name, test_case.name))
+        (output_dir_path / (test_case.name + ".exr")).write_bytes(
+            self._scene_case_path(scene, test_case).read_bytes()
+        )
+        return ProcessUsage(0, 0.0)
+
+    def clear_scene_case(self, scene: Scene, test_case: TestCase):
+        self._scene_case_path(scene, test_case).unlink(missing_ok=True)
+
+    def clear_scene(self, scene: Scene):
+        pass
+
+    def _scene_case_path(self, scene: Scene, test_case: TestCase):
+        return scene.path / self.scene_type / ("__lteval_" + test_case.name)
+
+
+def make_test_case(name: str, sample_count: int = 4, **data) -> TestCase:
+    return TestCase(
+        {
+            "name": name,
+            "renderer": "stub",
+            "params": {
+                "sampler": [
+                    ["type", "", "independent"],
+                    ["sampleCount", "integer", sample_count],
+                ]
+            },
+            **data,
+        }
+    )
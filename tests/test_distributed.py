@@ -0,0 +1,77 @@
+import collections
+import threading
+
+from data.scripts.coordinator import Coordinator
+from data.scripts.scheduler import Scheduler, SceneCaseJob
+from data.scripts.worker import Worker
+from stubs import StubRenderer, make_test_case
+
+_CASES = [make_test_case(f"case{i}", sample_count=i + 1) for i in range(6)]
+
+
+def _jobs(scenes, renderer, output_dir_path) -> list:
+    return [
+        SceneCaseJob(scene, test_case, renderer, output_dir_path)
+        for scene in scenes
+        for test_case in _CASES
+    ]
+
+
+def _run_worker(coordinator: Coordinator, name: str, renderer, scenes, path):
+    worker = Worker(coordinator.url, name, 2)
+    Scheduler(
+        2,
+        eof=False,
+        clear="n",
+        render_batch=worker.render_batch,
+        post_process=False,
+    ).run(worker.claimed_jobs(scenes, {"stub": renderer}, path))
+
+
+def test_workers_render_every_job_once(tmp_path, scenes):
+    cfg_path = tmp_path / "cfg.py"
+    cfg_path.write_text("")
+    coordinator = Coordinator("127.0.0.1:0", cfg_path)
+    jobs = _jobs(scenes, StubRenderer(), tmp_path / "coordinator")
+
+    renderers = [StubRenderer(), StubRenderer()]
+    workers = [
+        threading.Thread(
+            target=_run_worker,
+            args=(
+                coordinator,
+                f"worker{i}",
+                renderer,
+                scenes,
+                tmp_path / f"worker{i}",
+            ),
+        )
+        for i, renderer in enumerate(renderers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        failed_jobs = Scheduler(
+            4, eof=False, render_batch=coordinator.render_batch
+        ).run(jobs)
+    finally:
+        coordinator.close()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert not worker.is_alive()
+
+    assert failed_jobs == []
+    rendered = collections.Counter(
+        rendered for renderer in renderers for rendered in renderer.rendered
+    )
+    assert rendered == collections.Counter(
+        (job.scene.name, job.test_case.name) for job in jobs
+    )
+    assert all(count == 1 for count in rendered.values())
+    for job in jobs:
+        # Results uploaded by workers are the results of the coordinator
+        sample_count = _CASES.index(job.test_case) + 1
+        assert f"'sampleCount', 'integer', {sample_count})" in (
+            job.result_path.read_text()
+        )
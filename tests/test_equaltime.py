@@ -0,0 +1,78 @@
+import pytest
+
+import data.scripts.equaltime as equaltime
+import data.scripts.tcase as tcase
+from data.scripts.renderers.mitsuba_0_5 import Mitsuba_0_5
+from data.scripts.renderers.pbrt_3 import Pbrt_3
+from data.scripts.scheduler import Scheduler, SceneCaseJob
+from stubs import MITSUBA_SETTINGS, PBRT_SETTINGS, without_process
+
+# Sample counts "calibrated" for scenes
+_SAMPLE_COUNTS = {"first": 16, "second": 64}
+
+
+@pytest.mark.parametrize(
+    "renderer_class, settings, params, written_count",
+    [
+        (
+            Mitsuba_0_5,
+            MITSUBA_SETTINGS,
+            {"sampler": [["type", "", "independent"]]},
+            '<integer name="sampleCount" value="{}"/>',
+        ),
+        (
+            Pbrt_3,
+            PBRT_SETTINGS,
+            {"Sampler": [["type", "", "random"]]},
+            '"integer pixelsamples" [{}]',
+        ),
+    ],
+    ids=["mitsuba_0_5", "pbrt_3"],
+)
+def test_sample_count_is_calibrated_per_scene(
+    tmp_path,
+    scenes,
+    monkeypatch,
+    renderer_class,
+    settings,
+    params,
+    written_count,
+):
+    renderer = without_process(renderer_class)()
+    for scene in scenes:
+        scene_dir_path = scene.path / renderer.scene_type
+        scene_dir_path.mkdir()
+        (scene_dir_path / ("settings" + renderer.scene_suffix)).write_text(
+            settings
+        )
+
+    monkeypatch.setattr(
+        equaltime,
+        "calibrate_sample_count",
+        lambda renderer, scene, test_case: _SAMPLE_COUNTS[scene.name],
+    )
+
+    test_case = tcase.TestCase(
+        {
+            "name": "equal_time",
+            "renderer": "r",
+            "params": params,
+            "time_budget": 10,
+        }
+    )
+    jobs = [
+        SceneCaseJob(scene, test_case, renderer, tmp_path / "output")
+        for scene in scenes
+    ]
+
+    assert Scheduler(clear="n").run(jobs) == []
+    # Prepared test cases are not kept after their jobs
+    assert not renderer._test_cases
+
+    for job in jobs:
+        sample_count = _SAMPLE_COUNTS[job.scene.name]
+        assert job.sample_count == sample_count
+        # Result is a copy of the written scene file
+        assert written_count.format(sample_count) in (
+            job.result_path.read_text()
+        )
@@ -0,0 +1,39 @@
+import os
+
+import data.scripts.refbuild as refbuild
+from stubs import StubRenderer, make_test_case
+
+
+def _reference_case():
+    return make_test_case(
+        "reference", reference={"chunks": 2, "chunk_samples": 4}
+    )
+
+
+def test_definition_depends_on_renderer_scene_files(scenes):
+    scene = scenes[0]
+    renderer = StubRenderer()
+    scene_dir_path = scene.path / renderer.scene_type
+    scene_dir_path.mkdir()
+    settings_path = scene_dir_path / "settings.stub"
+    settings_path.write_text("settings")
+    definition = refbuild.reference_definition(
+        scene, _reference_case(), renderer
+    )
+
+    # Files of other renderers, generated files and the reference
+    (scene.path / "other").mkdir()
+    (scene.path / "other" / "settings.other").write_text("other")
+    (scene_dir_path / "__lteval_reference").write_text("generated")
+    (scene_dir_path / "reference.exr").write_text("reference")
+    # Only the modification time changes
+    os.utime(settings_path, ns=(0, 0))
+
+    assert definition == refbuild.reference_definition(
+        scene, _reference_case(), renderer
+    )
+
+    settings_path.write_text("changed")
+    assert definition != refbuild.reference_definition(
+        scene, _reference_case(), renderer
+    )
@@ -0,0 +1,62 @@
+import os
+
+from data.scripts.rendercache import RenderCache
+
+_IMAGE_SIZE = 16
+
+
+def _image(path, content=b"x"):
+    path.write_bytes(content * _IMAGE_SIZE)
+    return path
+
+
+def _key(name):
+    return name * 32
+
+
+def test_fetch_keeps_modification_time_of_linked_results(tmp_path):
+    cache = RenderCache(tmp_path / "cache", 4 * _IMAGE_SIZE)
+    cache.store(_key("a"), _image(tmp_path / "a.exr"))
+
+    first_path = tmp_path / "first.exr"
+    assert cache.fetch(_key("a"), first_path)
+    os.utime(first_path, (1, 1))
+
+    # Another output directory reusing the same cached image
+    assert cache.fetch(_key("a"), tmp_path / "second.exr")
+    assert first_path.stat().st_mtime == 1
+
+
+def test_least_recently_fetched_image_is_evicted(tmp_path):
+    cache_path = tmp_path / "cache"
+    cache = RenderCache(cache_path, 2 * _IMAGE_SIZE)
+    for name in ("a", "b"):
+        cache.store(_key(name), _image(tmp_path / (name + ".exr")))
+
+    # Last uses are loaded from the disk by a new cache
+    os.utime(cache._entry_path(_key("a")).with_suffix(".used"), (1, 1))
+    os.utime(cache._entry_path(_key("b")).with_suffix(".used"), (2, 2))
+    cache = RenderCache(cache_path, 2 * _IMAGE_SIZE)
+
+    assert cache.fetch(_key("a"), tmp_path / "fetched.exr")
+    cache.store(_key("c"), _image(tmp_path / "c.exr"))
+
+    assert cache.fetch(_key("a"), tmp_path / "fetched.exr")
+    assert not cache.fetch(_key("b"), tmp_path / "fetched.exr")
+    assert not cache._entry_path(_key("b")).with_suffix(".used").exists()
+
+
+def test_image_evicted_during_fetch_is_a_miss(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path / "cache", 4 * _IMAGE_SIZE)
+    cache.store(_key("a"), _image(tmp_path / "a.exr"))
+    entry_path = cache._entry_path(_key("a"))
+
+    # Another lteval process sharing the cache evicts the image
+    def link(src_path, dst_path):
+        entry_path.unlink()
+        raise FileNotFoundError(src_path)
+
+    monkeypatch.setattr(os, "link", link)
+
+    assert not cache.fetch(_key("a"), tmp_path / "fetched.exr")
+    assert entry_path not in cache._load_entries()
@@ -0,0 +1,72 @@
+import pytest
+
+import data.scripts.tcase as tcase
+from data.scripts.renderers.mitsuba_0_5 import Mitsuba_0_5
+from data.scripts.renderers.pbrt_3 import Pbrt_3
+from data.scripts.scheduler import Scheduler, SceneCaseJob
+from stubs import MITSUBA_SETTINGS, PBRT_SETTINGS, without_process
+
+_RENDERERS = pytest.mark.parametrize(
+    "renderer_class, settings, params",
+    [
+        (
+            Mitsuba_0_5,
+            MITSUBA_SETTINGS,
+            {"sampler": [["type", "", "independent"]]},
+        ),
+        (Pbrt_3, PBRT_SETTINGS, {"Sampler": [["type", "", "random"]]}),
+    ],
+    ids=["mitsuba_0_5", "pbrt_3"],
+)
+
+
+def _jobs(tmp_path, scene, renderer, settings, params, names) -> list:
+    scene_dir_path = scene.path / renderer.scene_type
+    scene_dir_path.mkdir()
+    (scene_dir_path / ("settings" + renderer.scene_suffix)).write_text(
+        settings
+    )
+
+    return [
+        SceneCaseJob(
+            scene,
+            tcase.TestCase({"name": name, "renderer": "r", "params": params}),
+            renderer,
+            tmp_path / "output",
+        )
+        for name in names
+    ]
+
+
+@_RENDERERS
+def test_failed_case_of_batch_fails_only_its_job(
+    tmp_path, scenes, renderer_class, settings, params
+):
+    # Process of the batch fails, results of other cases were rendered
+    renderer = without_process(
+        renderer_class, failing=["broken"], return_code=1
+    )()
+    jobs = _jobs(
+        tmp_path,
+        scenes[0],
+        renderer,
+        settings,
+        params,
+        ["first", "broken", "last"],
+    )
+
+    assert Scheduler(eof=False, batch=True).run(jobs) == [jobs[1]]
+    assert jobs[0].result_path.is_file() and jobs[2].result_path.is_file()
+    assert jobs[0].usage.return_code == 1
+
+
+@_RENDERERS
+def test_failed_process_of_single_case_fails_its_job(
+    tmp_path, scenes, renderer_class, settings, params
+):
+    renderer = without_process(renderer_class, return_code=3)()
+    jobs = _jobs(tmp_path, scenes[0], renderer, settings, params, ["only"])
+
+    assert Scheduler(eof=False).run(jobs) == jobs
+    assert "exited with return code 3" in str(jobs[0].error)
+    assert not jobs[0].result_path.is_file()
@@ -0,0 +1,69 @@
+import pytest
+
+from data.scripts.scheduler import Scheduler, SceneCaseJob
+from data.scripts.supervisor import ProcessUsage
+from stubs import StubRenderer, make_test_case
+
+
+def test_prepare_error_fails_only_its_job(tmp_path, scenes):
+    renderer = StubRenderer(fail_prepare=["broken"])
+    jobs = [
+        SceneCaseJob(scenes[0], make_test_case(name), renderer, tmp_path)
+        for name in ("first", "broken", "last")
+    ]
+
+    failed_jobs = Scheduler(eof=False, batch=True).run(jobs)
+
+    assert failed_jobs == [jobs[1]]
+    assert "can not be prepared" in str(jobs[1].error)
+    assert jobs[0].result_path.is_file() and jobs[0].error is None
+    assert jobs[2].result_path.is_file() and jobs[2].error is None
+
+
+def test_batch_error_fails_only_jobs_without_result(tmp_path, scenes):
+    renderer = StubRenderer()
+    jobs = [
+        SceneCaseJob(scenes[0], make_test_case(name), renderer, tmp_path)
+        for name in ("rendered", "unrendered")
+    ]
+
+    def render_batch(batch, render_local):
+        render_local(batch[:1])
+        raise RuntimeError("connection lost")
+
+    failed_jobs = Scheduler(
+        eof=False, batch=True, render_batch=render_batch
+    ).run(jobs)
+
+    assert failed_jobs == [jobs[1]]
+    assert jobs[0].error is None
+    assert str(jobs[1].error) == "connection lost"
+
+
+class _SharedProcessRenderer(StubRenderer):
+    # Batch is rendered by one process using 10 s
+    def render_scene_cases(self, scene, test_cases, output_dir_path):
+        for test_case in test_cases:
+            self.render_scene_case(scene, test_case, output_dir_path)
+        usage = ProcessUsage(0, 10.0, 8.0, 2.0, 1024, len(test_cases))
+        return [], {test_case.name: usage for test_case in test_cases}
+
+
+def test_batch_usage_is_shared_by_sample_counts(tmp_path, scenes):
+    renderer = _SharedProcessRenderer()
+    jobs = [
+        SceneCaseJob(
+            scenes[0], make_test_case(name, sample_count), renderer, tmp_path
+        )
+        for name, sample_count in (("low", 2), ("high", 8))
+    ]
+
+    assert Scheduler(batch=True).run(jobs) == []
+
+    low, high = (job.usage for job in jobs)
+    assert (low.wall_time, low.user_time, low.system_time) == pytest.approx(
+        (2.0, 1.6, 0.4)
+    )
+    assert (high.wall_time, high.user_time) == pytest.approx((8.0, 6.4))
+    assert low.peak_rss == high.peak_rss == 1024
+    assert jobs[1].wall_time == pytest.approx(4 * jobs[0].wall_time)
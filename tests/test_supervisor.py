@@ -0,0 +1,49 @@
+import asyncio
+import io
+import sys
+import time
+
+from data.scripts.supervisor import get_supervisor
+
+
+def _run_python(code: str) -> tuple:
+    output = io.StringIO()
+    usage = get_supervisor().run([sys.executable, "-c", code], output)
+    return usage, output.getvalue()
+
+
+def test_return_code_is_reported():
+    usage, _ = _run_python("import sys; sys.exit(3)")
+    assert usage.return_code == 3
+
+
+def test_blank_lines_are_kept():
+    code = (
+        "import sys, time\n"
+        "print('first', flush=True)\n"
+        "time.sleep(0.1)\n"
+        "print('\\n\\nsecond', flush=True)\n"
+    )
+    _, text = _run_python(code)
+    assert text.splitlines() == ["first", "", "", "second"]
+
+
+def test_processes_are_awaited_without_threads():
+    # Four processes sleeping 0.5 s end together on the single loop
+    supervisor = get_supervisor()
+    code = "import time; time.sleep(0.5)"
+
+    async def run_all():
+        return await asyncio.gather(
+            *(
+                supervisor.run_async(
+                    [sys.executable, "-c", code], io.StringIO()
+                )
+                for _ in range(4)
+            )
+        )
+
+    start_time = time.perf_counter()
+    usages = supervisor.call(run_all())
+    assert time.perf_counter() - start_time < 1.5
+    assert [usage.return_code for usage in usages] == [0] * 4
@@ -0,0 +1,171 @@
+import tracemalloc
+import types
+
+import pytest
+
+import data.scripts.lteutils as lteutils
+import data.scripts.tcase as tcase
+from data.scripts.journal import Journal
+from data.scripts.scheduler import Scheduler
+from data.scripts.usagelog import UsageLog
+from stubs import StubRenderer
+
+
+def _sweep_case(case_name: str, axes: list, **sweep) -> dict:
+    return {
+        "name": case_name,
+        "renderer": "stub",
+        "params": {"sampler": [["type", "", "independent"]]},
+        "sweep": {"axes": axes, **sweep},
+    }
+
+
+def _load(*cases_data) -> list:
+    return tcase.load_test_cases(
+        types.SimpleNamespace(test_cases=list(cases_data))
+    )
+
+
+def _parameters(test_case) -> dict:
+    return {
+        param[0]: param[2]
+        for param in test_case.parameter_set.parameters["sampler"]
+    }
+
+
+def test_product_sweep_expands_to_all_combinations():
+    (sweep,) = _load(
+        _sweep_case(
+            "s",
+            [
+                ["sampler", "maxDepth", "integer", range(1, 3)],
+                ["sampler", "sampleCount", "integer", [4, 16]],
+            ],
+        )
+    )
+
+    cases = list(tcase.iterate_test_cases([sweep]))
+    assert [case.name for case in cases] == [
+        "s_maxDepth1_sampleCount4",
+        "s_maxDepth1_sampleCount16",
+        "s_maxDepth2_sampleCount4",
+        "s_maxDepth2_sampleCount16",
+    ]
+    assert list(sweep.names()) == [case.name for case in cases]
+    assert len(sweep) == 4
+    assert _parameters(cases[1]) == {
+        "type": "independent",
+        "maxDepth": 1,
+        "sampleCount": 16,
+    }
+
+
+def test_zip_sweep_pairs_values_by_position():
+    (sweep,) = _load(
+        _sweep_case(
+            "s",
+            [
+                ["sampler", "maxDepth", "integer", [1, 2, 3]],
+                ["sampler", "sampleCount", "integer", [4, 16, 64]],
+            ],
+            mode="zip",
+            name="depth{maxDepth}_spp{1}",
+        )
+    )
+
+    cases = list(tcase.iterate_test_cases([sweep]))
+    assert [case.name for case in cases] == [
+        "depth1_spp4",
+        "depth2_spp16",
+        "depth3_spp64",
+    ]
+    assert _parameters(cases[2])["sampleCount"] == 64
+
+
+@pytest.mark.parametrize(
+    "cases_data",
+    [
+        # Two sweeps generating the same names
+        [
+            _sweep_case("S", [["sampler", "maxDepth", "integer", [1, 2]]]),
+            _sweep_case("S", [["sampler", "maxDepth", "integer", [2, 3]]]),
+        ],
+        # Names of one sweep collide ("x1" + "11" and "x11" + "1")
+        [
+            _sweep_case(
+                "x",
+                [
+                    ["sampler", "a", "integer", [1, 11]],
+                    ["sampler", "b", "integer", [1, 11]],
+                ],
+                name="x{a}{b}",
+            )
+        ],
+        # Generated name of a test case which is not generated
+        [
+            {"name": "S_maxDepth2", "renderer": "stub"},
+            _sweep_case("S", [["sampler", "maxDepth", "integer", [1, 2]]]),
+        ],
+    ],
+    ids=["sweeps", "within_sweep", "plain_case"],
+)
+def test_generated_name_collisions_are_rejected(cases_data, capsys):
+    with pytest.raises(SystemExit):
+        _load(*cases_data)
+
+    assert "is defined multiple times" in capsys.readouterr().out
+
+
+def _retained_memory(scene, output_dir_path, axis_size: int) -> int:
+    # Memory allocated by the framework and kept after the run of a sweep
+    # of axis_size x axis_size points (values of its axes are kept)
+    sweep = tcase.TestCaseSweep(
+        {
+            "name": "sweep",
+            "renderer": "stub",
+            "params": {"sampler": [["type", "", "independent"]]},
+            "sweep": {
+                "axes": [
+                    ["sampler", "seed", "integer", range(axis_size)],
+                    ["sampler", "sampleCount", "integer", range(axis_size)],
+                ]
+            },
+        }
+    )
+    output_dir_path.mkdir()
+
+    # Scheduler, its journal and usage log and the renderer are alive
+    # when the memory is measured
+    renderer = StubRenderer(record=False)
+    scheduler = Scheduler(
+        4,
+        eof=False,
+        journal=Journal(output_dir_path / "journal.jsonl"),
+        usage_log=UsageLog(output_dir_path / "metrics.jsonl"),
+    )
+    tracemalloc.start()
+    try:
+        failed_jobs = scheduler.run(
+            lteutils.create_scene_case_jobs(
+                [scene], {"stub": renderer}, [sweep], output_dir_path
+            )
+        )
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    assert failed_jobs == []
+    return sum(
+        stat.size
+        for stat in snapshot.filter_traces(
+            [tracemalloc.Filter(True, "*/data/scripts/*")]
+        ).statistics("filename")
+    )
+
+
+def test_sweep_memory_does_not_grow_with_its_size(tmp_path, scenes):
+    small = _retained_memory(scenes[0], tmp_path / "small", 10)
+    large = _retained_memory(scenes[0], tmp_path / "large", 32)
+
+    # Jobs, their test cases and records of them are not kept
+    assert large < small + 16 * 1024